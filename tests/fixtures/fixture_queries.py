@@ -0,0 +1,27 @@
+import pytest
+from core.queries import budget_exceeded
+
+
+@pytest.fixture(autouse=True)
+def query_budget(settings):
+    """Тест падает, если вью Yatube превысила бюджет запросов к БД."""
+    settings.QUERY_BUDGET_ENABLED = True
+    reports = []
+
+    def collect(sender, report, **kwargs):
+        reports.append(report)
+
+    budget_exceeded.connect(collect, weak=False)
+    yield reports
+    budget_exceeded.disconnect(collect)
+    over_budget = [report for report in reports if report['over_budget']]
+    if over_budget:
+        pytest.fail('\n'.join(
+            f'{report["path"]} ({report["view"]}): {report["queries"]} '
+            f'запросов при бюджете {report["budget"]}'
+            + ''.join(
+                f'\n  N+1 x{count} в {origin}: {sql}'
+                for count, origin, sql in report['repeated']
+            )
+            for report in over_budget
+        ))
@@ -0,0 +1,158 @@
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Avg, Count, Max, Sum
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import ProfileRecord, SlowQuery
+from .profiling import PROFILE_MODES, make_token
+
+
+@admin.register(ProfileRecord)
+class ProfileRecordAdmin(admin.ModelAdmin):
+    """Последние профили запросов со ссылками на файлы."""
+
+    list_display = (
+        'created',
+        'path',
+        'view',
+        'mode',
+        'duration',
+        'user',
+        'download',
+    )
+    list_filter = ('mode', 'view')
+    search_fields = ('path',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def download(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse('admin:core_profilerecord_download', args=(obj.pk,)),
+            obj.file,
+        )
+
+    download.short_description = 'Файл'
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_profilerecord_download',
+            ),
+            *super().get_urls(),
+        ]
+
+    def download_view(self, request, pk):
+        """Файл профиля: pstats для cProfile, свернутые стеки для sample."""
+        record = self.get_object(request, pk)
+        if record is None or not self.has_view_permission(request, record):
+            raise Http404
+        try:
+            file = open(record.file_path, 'rb')
+        except FileNotFoundError:
+            raise Http404
+        return FileResponse(file, as_attachment=True, filename=record.file)
+
+    def changelist_view(self, request, extra_context=None):
+        """Список профилей и токены для заголовка X-Profile."""
+        extra_context = {
+            **(extra_context or {}),
+            'profile_tokens': {
+                mode: make_token(request.user, mode)
+                for mode in PROFILE_MODES
+            },
+        }
+        return super().changelist_view(request, extra_context)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Медленные запросы и сводка по формам запросов."""
+
+    list_display = (
+        'created',
+        'view',
+        'duration',
+        'shape_preview',
+        'origin',
+    )
+    list_filter = ('view',)
+    search_fields = ('shape', 'fingerprint')
+    readonly_fields = (
+        'created',
+        'view',
+        'fingerprint',
+        'shape',
+        'sql',
+        'params',
+        'duration',
+        'plan',
+        'origin',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def shape_preview(self, obj):
+        return obj.shape[:120]
+
+    shape_preview.short_description = 'Форма запроса'
+
+    def get_urls(self):
+        return [
+            path(
+                'grouped/',
+                self.admin_site.admin_view(self.grouped_view),
+                name='core_slowquery_grouped',
+            ),
+            *super().get_urls(),
+        ]
+
+    def grouped_view(self, request):
+        """Формы запросов по суммарному времени: что деградирует первым."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        groups = list(SlowQuery.objects.values('fingerprint').annotate(
+            count=Count('id'),
+            total_duration=Sum('duration'),
+            avg_duration=Avg('duration'),
+            max_duration=Max('duration'),
+            last_seen=Max('created'),
+        ).order_by('-total_duration'))
+        shapes = dict(SlowQuery.objects.filter(
+            pk__in=SlowQuery.objects.values('fingerprint').annotate(
+                last=Max('pk'),
+            ).values('last'),
+        ).values_list('fingerprint', 'shape'))
+        views = {}
+        for key, view in SlowQuery.objects.values_list(
+            'fingerprint', 'view',
+        ).order_by().distinct():
+            views.setdefault(key, []).append(view)
+        for group in groups:
+            group['shape'] = shapes.get(group['fingerprint'], '')
+            group['views'] = ', '.join(sorted(filter(
+                None, views.get(group['fingerprint'], ()),
+            )))
+        return TemplateResponse(
+            request,
+            'admin/core/slowquery/grouped.html',
+            {
+                **self.admin_site.each_context(request),
+                'opts': self.model._meta,
+                'title': 'Медленные запросы по формам',
+                'groups': groups,
+            },
+        )
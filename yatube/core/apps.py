@@ -1,7 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     """Приложение Core."""
 
     name = 'core'
+
+    def ready(self):
+        from .sqlite import apply_pragmas
+
+        connection_created.connect(apply_pragmas)
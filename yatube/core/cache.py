@@ -0,0 +1,59 @@
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+from .metrics import metrics
+from .tracing import CLIENT, span
+
+CACHE_PAGE_PREFIX = 'views.decorators.cache.'
+
+
+def key_family(key):
+    """Вид ключа для метрик: cache_page.<prefix>, sorl-thumbnail и т.п."""
+    if key.startswith(CACHE_PAGE_PREFIX):
+        return '.'.join(key.split('.')[3:5])
+    for separator in ('||', ':', '.'):
+        key = key.split(separator, 1)[0]
+    return key
+
+
+def cache_span(operation, key):
+    return span(f'cache.{operation}', CLIENT, {'cache.key': key_family(key)})
+
+
+class InstrumentedCacheMixin:
+    """Считает попадания и промахи чтений кеша по видам ключей.
+
+    Чтения и записи попадают в трейс запроса спанами cache.*.
+    """
+
+    def count(self, key, hit):
+        metrics.inc(
+            'yatube_cache_requests_total',
+            key=key_family(key),
+            result='hit' if hit else 'miss',
+        )
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        with cache_span('get', key) as current:
+            value = super().get(key, sentinel, version)
+            if current is not None:
+                current.attributes['cache.hit'] = value is not sentinel
+        self.count(key, value is not sentinel)
+        return default if value is sentinel else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with cache_span('set', key):
+            return super().set(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with cache_span('add', key):
+            return super().add(key, value, timeout, version)
+
+    def delete(self, key, version=None):
+        with cache_span('delete', key):
+            return super().delete(key, version)
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """LocMemCache с метриками попаданий (get_many идет через get)."""
@@ -0,0 +1,154 @@
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+# Границы корзин гистограмм, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по имени маршрута и статусу ответа.',
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса по имени маршрута.',
+    ),
+    'yatube_request_db_seconds': (
+        'histogram', 'Время запросов к БД за запрос по имени маршрута.',
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Чтения кеша по виду ключа: hit или miss.',
+    ),
+    'yatube_thumbnail_seconds': (
+        'histogram', 'Время создания миниатюр sorl.',
+    ),
+    'yatube_template_renders_total': (
+        'counter', 'Рендеры шаблонов, включая include и extends.',
+    ),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время рендеринга шаблона за запрос.',
+    ),
+}
+
+
+class Metrics:
+    """Счетчики и гистограммы процесса.
+
+    Каждый процесс (воркер) раз в METRICS_FLUSH_INTERVAL секунд
+    сохраняет свои значения в METRICS_DIR/<pid>.json, а /metrics
+    складывает файлы всех воркеров: внешний сервис не нужен.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.flushed = 0.0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Корзины, затем +Inf, сумма и число наблюдений.
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 3)
+            histogram[bisect_left(BUCKETS, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [
+                    [name, dict(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, dict(labels), list(values)]
+                    for (name, labels), values in self.histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        """Сохраняет значения процесса, не чаще раза в интервал."""
+        now = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(f'{path}.tmp', path)
+
+
+metrics = Metrics()
+
+
+def collect():
+    """Сумма значений всех воркеров из METRICS_DIR."""
+    metrics.flush(force=True)
+    counters, histograms = {}, {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        try:
+            with open(path) as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(sorted(labels.items())))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            total = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+
+    return counters, histograms
+
+
+def format_labels(labels, **extra):
+    labels = (*labels, *extra.items())
+    if not labels:
+        return ''
+    values = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return f'{{{values}}}'
+
+
+def render():
+    """Значения метрик в текстовом формате Prometheus."""
+    counters, histograms = collect()
+    lines = []
+    for metric, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), values in sorted(histograms.items()):
+            if name != metric:
+                continue
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), values):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{format_labels(labels, le=bound)} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_sum{format_labels(labels)} {values[-2]}')
+            lines.append(f'{name}_count{format_labels(labels)} {values[-1]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,418 @@
+import json
+import logging
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import metrics
+from .models import ProfileRecord, SlowQuery
+from .profiling import (PROFILE_HEADER, PROFILE_PARAM, check_token,
+                        run_profiled)
+from .queries import (QueryRecorder, SlowQueryCollector, budget_exceeded,
+                      fingerprint, normalize_sql)
+from .routers import pin_to_primary
+from .template_timing import start_timing, stop_timing
+from .tracing import (SERVER, add_span, current_trace, end_trace, span,
+                      start_trace, trace_query)
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('core.slow_queries')
+
+PIN_COOKIE = 'primary_until'
+PIN_VIEWS = {
+    'posts:post_create',
+    'posts:post_edit',
+    'posts:add_comment',
+    'posts:profile_follow',
+    'posts:profile_unfollow',
+    'posts:follow_bulk',
+}
+
+
+def after_stream(response, wrapper, finish):
+    """Вызывает finish после ответа, для потокового - после его тела.
+
+    Тело StreamingHttpResponse (SSE, выгрузки) читается уже после выхода
+    из middleware, поэтому на время чтения wrapper снова ставится
+    execute_wrapper на все соединения: иначе запросы тела не видны.
+    """
+    if not response.streaming:
+        finish()
+        return
+    content = response.streaming_content
+
+    def stream():
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(wrapper))
+                yield from content
+        finally:
+            finish()
+
+    response.streaming_content = stream()
+
+
+class ReadYourWritesMiddleware:
+    """Закрепляет пользователя за основной базой после записи.
+
+    После запросов к PIN_VIEWS и любых небезопасных методов чтения
+    пользователя REPLICA_PIN_SECONDS секунд идут в основную базу, а не
+    на реплики, которые могут отставать.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(PIN_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        request.writes_primary = request.method not in (
+            'GET', 'HEAD', 'OPTIONS',
+        )
+        pin_to_primary(request.writes_primary or pinned_until > time.time())
+        try:
+            response = self.get_response(request)
+        finally:
+            pin_to_primary(False)
+        if request.writes_primary and settings.REPLICA_DATABASES:
+            response.set_cookie(
+                PIN_COOKIE,
+                str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+            )
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match.view_name in PIN_VIEWS:
+            request.writes_primary = True
+            pin_to_primary()
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы к БД и их время, ищет повторы (N+1).
+
+    Бюджет вью берется из settings.QUERY_BUDGETS по имени маршрута,
+    иначе QUERY_BUDGET_DEFAULT. Превышение бюджета и повторяющиеся
+    формы запросов пишутся в лог с шаблоном или строкой-источником и
+    отправляются сигналом budget_exceeded. Заголовки X-Query-* потокового
+    ответа считают запросы до тела, бюджет проверяется после тела.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_BUDGET_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request.query_budget = settings.QUERY_BUDGET_DEFAULT
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        response['X-Query-Count'] = recorder.queries
+        response['X-Query-Time'] = f'{recorder.time * 1000:.1f}'
+        after_stream(
+            response, recorder, lambda: self.check(request, recorder),
+        )
+
+        return response
+
+    def check(self, request, recorder):
+        repeated = recorder.repeated()
+        if recorder.queries > request.query_budget or repeated:
+            self.report(request, recorder, repeated)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = settings.QUERY_BUDGETS.get(
+            request.resolver_match.view_name,
+            settings.QUERY_BUDGET_DEFAULT,
+        )
+
+    def report(self, request, recorder, repeated):
+        report = {
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'queries': recorder.queries,
+            'time': recorder.time,
+            'budget': request.query_budget,
+            'over_budget': recorder.queries > request.query_budget,
+            'repeated': repeated,
+        }
+        logger.warning(
+            '%s: %s запросов (бюджет %s), %.1f мс',
+            request.path, recorder.queries, request.query_budget,
+            recorder.time * 1000,
+        )
+        for count, origin, sql in repeated:
+            logger.warning('N+1 x%s в %s: %s', count, origin, sql)
+        budget_exceeded.send(sender=self.__class__, report=report)
+
+
+class SlowQueryMiddleware:
+    """Журнал запросов к БД дольше SLOW_QUERY_THRESHOLD мс.
+
+    Запрос, параметры, маршрут и план EXPLAIN пишутся строкой JSON в
+    файл с ротацией (логгер core.slow_queries) и в модель SlowQuery для
+    админки. Middleware стоит первым, чтобы сохранение записей не
+    попадало в счетчики остальных.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = SlowQueryCollector()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+
+        def finish():
+            if collector.entries:
+                self.save(request, collector.entries)
+
+        after_stream(response, collector, finish)
+
+        return response
+
+    def save(self, request, entries):
+        view = getattr(request.resolver_match, 'view_name', '') or ''
+        records = []
+        for entry in entries:
+            shape = normalize_sql(entry['sql'])
+            params = json.dumps(
+                entry['params'], default=str, ensure_ascii=False,
+            )
+            slow_query_logger.info(json.dumps({
+                'path': request.path,
+                'view': view,
+                'duration': round(entry['duration'], 3),
+                'sql': entry['sql'],
+                'params': params,
+                'plan': entry['plan'],
+                'origin': entry['origin'],
+            }, ensure_ascii=False))
+            records.append(SlowQuery(
+                view=view,
+                fingerprint=fingerprint(shape),
+                shape=shape,
+                sql=entry['sql'],
+                params=params,
+                duration=entry['duration'],
+                plan=entry['plan'],
+                origin=entry['origin'] or '',
+            ))
+        SlowQuery.objects.bulk_create(records)
+        SlowQuery.trim()
+
+
+class MetricsMiddleware:
+    """Время ответа и время БД по имени маршрута для /metrics.
+
+    Для потокового ответа время считается до конца тела.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db_time = [0.0]
+
+        def timed(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db_time[0] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timed))
+            response = self.get_response(request)
+
+        def finish():
+            duration = time.perf_counter() - started
+            match = getattr(request, 'resolver_match', None)
+            view = match.view_name if match else 'unresolved'
+            metrics.inc(
+                'yatube_requests_total', view=view,
+                status=response.status_code,
+            )
+            metrics.observe(
+                'yatube_request_duration_seconds', duration, view=view,
+            )
+            metrics.observe('yatube_request_db_seconds', db_time[0], view=view)
+            metrics.flush()
+
+        after_stream(response, timed, finish)
+
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирование запроса сотрудника по подписанному токену.
+
+    Токен (core.profiling.make_token) передается заголовком X-Profile
+    или параметром ?_profile=. Без токена middleware только проверяет
+    его наличие. Профиль сохраняется в PROFILE_DIR, запись о нем видна
+    в админке, id записи возвращается заголовком X-Profile-Id.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = (
+            request.META.get(PROFILE_HEADER)
+            or request.GET.get(PROFILE_PARAM)
+        )
+        mode = token and check_token(token, request.user)
+        if not mode:
+            return self.get_response(request)
+        started = time.perf_counter()
+        response, path = run_profiled(self.get_response, request, mode)
+        match = getattr(request, 'resolver_match', None)
+        record = ProfileRecord.objects.create(
+            path=request.get_full_path()[:500],
+            view=match.view_name if match else '',
+            mode=mode,
+            duration=time.perf_counter() - started,
+            user=request.user,
+            file=os.path.basename(path),
+        )
+        ProfileRecord.trim()
+        response['X-Profile-Id'] = record.pk
+
+        return response
+
+
+class TemplateTimingMiddleware:
+    """Время и число рендеров каждого шаблона за запрос.
+
+    Шаблоны должны загружаться через core.template_timing. Значения
+    идут в /metrics, а при DEBUG или TEMPLATE_TIMING_HEADER - еще и в
+    заголовок X-Template-Timing в формате Server-Timing.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TEMPLATE_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start_timing()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = stop_timing()
+        for name, (count, duration) in timings.items():
+            metrics.inc('yatube_template_renders_total', count, template=name)
+            metrics.observe(
+                'yatube_template_render_seconds', duration, template=name,
+            )
+        if timings and (settings.DEBUG or settings.TEMPLATE_TIMING_HEADER):
+            response['X-Template-Timing'] = ', '.join(
+                f'"{name}";dur={duration * 1000:.2f};count={count}'
+                for name, (count, duration) in sorted(
+                    timings.items(), key=lambda item: -item[1][1],
+                )
+            )
+
+        return response
+
+
+class TracingMiddleware:
+    """Трейс запроса со спанами БД, кеша, шаблонов и миниатюр.
+
+    В выборку попадает доля TRACING_SAMPLE_RATE запросов и запросы с
+    заголовком traceparent (флаг sampled). Трейс пишется строкой OTLP/JSON
+    в TRACING_FILE, его id отдается заголовком X-Trace-Id. Стоит первым в
+    MIDDLEWARE, а TracingViewMiddleware - последним: между ними остается
+    время остальных middleware. Корневой спан потокового ответа
+    закрывается после тела, запросы тела - его дочерние спаны.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRACING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = start_trace(request.META.get('HTTP_TRACEPARENT'))
+        if trace is None:
+            return self.get_response(request)
+        try:
+            with ExitStack() as stack:
+                root = stack.enter_context(span(request.method, SERVER, {
+                    'http.method': request.method,
+                    'http.target': request.get_full_path(),
+                }))
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(trace_query),
+                    )
+                response = self.get_response(request)
+                view = getattr(request.resolver_match, 'view_name', None)
+                if view:
+                    root.name = f'{request.method} {view}'
+                    root.attributes['http.route'] = view
+                root.attributes['http.status_code'] = response.status_code
+                if trace.view_end:
+                    add_span(
+                        'middleware.response', trace.view_end, time.time_ns(),
+                    )
+        except BaseException:
+            end_trace()
+            raise
+        response['X-Trace-Id'] = trace.trace_id
+        if response.streaming:
+            # Трейс остается у потока до конца тела, корневой спан
+            # снова открыт, чтобы запросы тела попали внутрь него.
+            trace.stack.append(root)
+
+        def finish():
+            if root in trace.stack:
+                trace.close(root)
+            end_trace()
+
+        after_stream(response, trace_query, finish)
+
+        return response
+
+
+class TracingViewMiddleware:
+    """Спан вью с рендерингом ответа и спан middleware до вью."""
+
+    def __init__(self, get_response):
+        if not settings.TRACING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace = current_trace()
+        if trace is None:
+            return self.get_response(request)
+        add_span('middleware.request', trace.spans[0].start, time.time_ns())
+        with span('view') as view:
+            response = self.get_response(request)
+            name = getattr(request.resolver_match, 'view_name', None)
+            if name:
+                view.name = f'view {name}'
+        trace.view_end = view.end
+
+        return response
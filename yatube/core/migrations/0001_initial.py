@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('path', models.CharField(max_length=500, verbose_name='Адрес')),
+                ('view', models.CharField(blank=True, max_length=200, verbose_name='Маршрут')),
+                ('mode', models.CharField(max_length=20, verbose_name='Режим')),
+                ('duration', models.FloatField(verbose_name='Время, с')),
+                ('file', models.CharField(max_length=200, verbose_name='Файл')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ('-created', '-pk'),
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('view', models.CharField(blank=True, db_index=True, max_length=200, verbose_name='Маршрут')),
+                ('fingerprint', models.CharField(db_index=True, max_length=40, verbose_name='Ключ формы')),
+                ('shape', models.TextField(verbose_name='Форма запроса')),
+                ('sql', models.TextField(verbose_name='SQL')),
+                ('params', models.TextField(blank=True, verbose_name='Параметры')),
+                ('duration', models.FloatField(verbose_name='Время, мс')),
+                ('plan', models.TextField(blank=True, verbose_name='План')),
+                ('origin', models.CharField(blank=True, max_length=300, verbose_name='Источник')),
+            ],
+            options={
+                'verbose_name': 'Медленный запрос',
+                'verbose_name_plural': 'Медленные запросы',
+                'ordering': ('-created', '-pk'),
+            },
+        ),
+    ]
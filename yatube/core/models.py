@@ -0,0 +1,126 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class ProfileRecord(models.Model):
+    """Профиль запроса, снятый по подписанному заголовку X-Profile."""
+
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата',
+    )
+    path = models.CharField(
+        max_length=500,
+        verbose_name='Адрес',
+    )
+    view = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Маршрут',
+    )
+    mode = models.CharField(
+        max_length=20,
+        verbose_name='Режим',
+    )
+    duration = models.FloatField(
+        verbose_name='Время, с',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+    file = models.CharField(
+        max_length=200,
+        verbose_name='Файл',
+    )
+
+    class Meta:
+        ordering = ('-created', '-pk')
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.path} ({self.mode})'
+
+    @property
+    def file_path(self):
+        return os.path.join(settings.PROFILE_DIR, self.file)
+
+    def delete(self, *args, **kwargs):
+        """Удаляет запись вместе с файлом профиля."""
+        try:
+            os.remove(self.file_path)
+        except FileNotFoundError:
+            pass
+        return super().delete(*args, **kwargs)
+
+    @classmethod
+    def trim(cls):
+        """Удаляет профили сверх PROFILE_MAX_FILES, начиная со старых."""
+        for record in cls.objects.all()[settings.PROFILE_MAX_FILES:]:
+            record.delete()
+
+
+class SlowQuery(models.Model):
+    """Запрос к БД дольше SLOW_QUERY_THRESHOLD с планом выполнения."""
+
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата',
+    )
+    view = models.CharField(
+        max_length=200,
+        blank=True,
+        db_index=True,
+        verbose_name='Маршрут',
+    )
+    fingerprint = models.CharField(
+        max_length=40,
+        db_index=True,
+        verbose_name='Ключ формы',
+    )
+    shape = models.TextField(
+        verbose_name='Форма запроса',
+    )
+    sql = models.TextField(
+        verbose_name='SQL',
+    )
+    params = models.TextField(
+        blank=True,
+        verbose_name='Параметры',
+    )
+    duration = models.FloatField(
+        verbose_name='Время, мс',
+    )
+    plan = models.TextField(
+        blank=True,
+        verbose_name='План',
+    )
+    origin = models.CharField(
+        max_length=300,
+        blank=True,
+        verbose_name='Источник',
+    )
+
+    class Meta:
+        ordering = ('-created', '-pk')
+        verbose_name = 'Медленный запрос'
+        verbose_name_plural = 'Медленные запросы'
+
+    def __str__(self):
+        return f'{self.shape[:80]} ({self.duration:.1f} мс)'
+
+    @classmethod
+    def trim(cls):
+        """Удаляет записи сверх SLOW_QUERY_MAX_RECORDS, начиная со старых."""
+        limit = settings.SLOW_QUERY_MAX_RECORDS
+        border = cls.objects.order_by('-pk').values('pk')[limit:limit + 1]
+        cls.objects.filter(pk__lte=models.Subquery(border)).delete()
@@ -0,0 +1,113 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+PROFILE_MODES = {
+    'cprofile': 'prof',
+    'sample': 'collapsed',
+}
+TOKEN_SALT = 'core.profiling'
+
+
+def make_token(user, mode):
+    """Подписанный токен профилирования для сотрудника user."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(f'{user.pk}:{mode}')
+
+
+def check_token(token, user):
+    """Режим профилирования из токена или None, если токен не подходит."""
+    if not user.is_authenticated or not user.is_staff:
+        return None
+    try:
+        value = signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILE_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        return None
+    user_id, _, mode = value.partition(':')
+    if user_id != str(user.pk) or mode not in PROFILE_MODES:
+        return None
+    return mode
+
+
+class Sampler(threading.Thread):
+    """Сэмплирующий профайлер: снимки стека потока раз в interval.
+
+    Результат - свернутые стеки (collapsed stacks) для flamegraph.pl
+    или speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f'{code.co_name} '
+                    f'({os.path.basename(code.co_filename)}:'
+                    f'{code.co_firstlineno})'
+                )
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        )
+
+
+def profile_path(mode):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = (
+        f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        f'.{PROFILE_MODES[mode]}'
+    )
+    return os.path.join(settings.PROFILE_DIR, name)
+
+
+def run_profiled(get_response, request, mode):
+    """Выполняет запрос под профайлером, возвращает ответ и файл."""
+    path = profile_path(mode)
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+        profiler.dump_stats(path)
+    else:
+        sampler = Sampler(
+            threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL,
+        )
+        sampler.start()
+        try:
+            response = get_response(request)
+        finally:
+            sampler.stop()
+        with open(path, 'w') as file:
+            file.write(sampler.collapsed())
+
+    return response, path
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.dispatch import Signal
+
+# Отправляется, когда запрос превысил бюджет или повторял один запрос.
+budget_exceeded = Signal(providing_args=['report'])
+
+SQL_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalize_sql(sql):
+    """Форма запроса без значений: одинакова для запросов N+1."""
+    for pattern, replacement in SQL_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def query_origin():
+    """Шаблон и строка или строка кода проекта, выполнившая запрос."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        node = frame.f_locals.get('self')
+        if code.co_name == 'render_annotated' and hasattr(node, 'origin'):
+            return f'{node.origin.template_name}:{node.token.lineno}'
+        filename = code.co_filename
+        if (filename.startswith(str(settings.BASE_DIR))
+                and filename != __file__):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{path}:{frame.f_lineno}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """Обертка execute_wrapper: число, время и формы запросов.
+
+    Источник запроса ищется по стеку только для формы, повторившейся
+    QUERY_REPEAT_THRESHOLD раз, чтобы не замедлять обычные запросы.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        self.queries = 0
+        self.time = 0.0
+        self.shapes = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.queries += 1
+            shape = normalize_sql(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == self.threshold:
+                self.origins[shape] = query_origin()
+
+    def repeated(self):
+        """Формы запросов N+1: (число повторов, источник, SQL)."""
+        return [
+            (self.shapes[shape], origin, shape)
+            for shape, origin in self.origins.items()
+        ]
+
+
+def fingerprint(shape):
+    """Короткий ключ формы запроса для группировки."""
+    return hashlib.sha1(shape.encode()).hexdigest()
+
+
+def explain(connection, sql, params):
+    """План запроса SELECT или пустая строка.
+
+    Курсор берется у бэкенда напрямую, мимо execute_wrapper: EXPLAIN не
+    попадает ни в счетчики запросов, ни снова в журнал медленных.
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    prefix = (
+        'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    )
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(prefix + sql, params)
+        rows = cursor.fetchall()
+    except Exception as error:
+        return f'EXPLAIN не выполнен: {error}'
+    finally:
+        cursor.close()
+    if connection.vendor == 'sqlite':
+        return '\n'.join(str(row[-1]) for row in rows)
+    return '\n'.join(' | '.join(map(str, row)) for row in rows)
+
+
+class SlowQueryCollector:
+    """Обертка execute_wrapper: запросы дольше SLOW_QUERY_THRESHOLD мс.
+
+    Для каждого медленного запроса сразу снимается план, пока данные
+    те же, что видел запрос; записи сохраняет SlowQueryMiddleware.
+    """
+
+    def __init__(self, threshold=None):
+        if threshold is None:
+            threshold = settings.SLOW_QUERY_THRESHOLD
+        self.threshold = threshold / 1000
+        self.entries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.entries.append({
+                    'sql': sql,
+                    'params': params,
+                    'duration': duration * 1000,
+                    'plan': '' if many else explain(
+                        context['connection'], sql, params,
+                    ),
+                    'origin': query_origin(),
+                })
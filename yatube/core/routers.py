@@ -0,0 +1,43 @@
+import random
+import threading
+
+from django.conf import settings
+
+_state = threading.local()
+
+
+def pin_to_primary(pinned=True):
+    """Направляет чтения текущего потока на основную базу."""
+    _state.pinned = pinned
+
+
+def is_pinned():
+    return getattr(_state, 'pinned', False)
+
+
+class ReplicaRouter:
+    """Чтение с реплик, запись в основную базу.
+
+    Реплики перечислены в settings.REPLICA_DATABASES. Пока поток закреплен
+    за основной базой (pin_to_primary), чтения тоже идут в default, чтобы
+    пользователь видел собственные изменения.
+    """
+
+    def db_for_read(self, model, **hints):
+        if is_pinned() or not settings.REPLICA_DATABASES:
+            return 'default'
+        return random.choice(settings.REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.REPLICA_DATABASES}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
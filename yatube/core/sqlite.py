@@ -0,0 +1,10 @@
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Применяет settings.SQLITE_PRAGMAS к новому соединению SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from django.template import Template, TemplateDoesNotExist
+from django.template.loaders import cached
+from django.template.loaders.base import Loader as BaseLoader
+
+from .tracing import span
+
+_state = threading.local()
+
+
+def start_timing():
+    """Начинает сбор времени рендеринга шаблонов в текущем потоке."""
+    _state.timings = {}
+
+
+def stop_timing():
+    """Заканчивает сбор: {шаблон: [число рендеров, время, с]}."""
+    timings = getattr(_state, 'timings', None)
+    _state.timings = None
+    return timings or {}
+
+
+class TimedTemplate(Template):
+    """Шаблон, суммирующий время своих рендеров за запрос.
+
+    Время включает вложенные include и родительские шаблоны extends
+    (с их блоками), так что у posts/includes/post.html видно и число
+    вставок на странице, и их общее время. Каждый рендер также попадает
+    в трейс запроса спаном template.render.
+    """
+
+    def _render(self, context):
+        with span('template.render', attributes={'template.name': self.name}):
+            return self._timed_render(context)
+
+    def _timed_render(self, context):
+        timings = getattr(_state, 'timings', None)
+        if timings is None:
+            return super()._render(context)
+        started = time.perf_counter()
+        try:
+            return super()._render(context)
+        finally:
+            timing = timings.setdefault(self.name, [0, 0.0])
+            timing[0] += 1
+            timing[1] += time.perf_counter() - started
+
+
+class TimedLoaderMixin(BaseLoader):
+    """BaseLoader.get_template, создающий TimedTemplate."""
+
+    def get_template(self, template_name, skip=None):
+        tried = []
+        for origin in self.get_template_sources(template_name):
+            if skip is not None and origin in skip:
+                tried.append((origin, 'Skipped'))
+                continue
+            try:
+                contents = self.get_contents(origin)
+            except TemplateDoesNotExist:
+                tried.append((origin, 'Source does not exist'))
+                continue
+            return TimedTemplate(
+                contents, origin, origin.template_name, self.engine,
+            )
+        raise TemplateDoesNotExist(template_name, tried=tried)
+
+
+class Loader(TimedLoaderMixin):
+    """Загрузчик поверх loaders без кеша, для DEBUG."""
+
+    def __init__(self, engine, loaders):
+        self.loaders = engine.get_template_loaders(loaders)
+        super().__init__(engine)
+
+    def get_contents(self, origin):
+        return origin.loader.get_contents(origin)
+
+    def get_template_sources(self, template_name):
+        for loader in self.loaders:
+            yield from loader.get_template_sources(template_name)
+
+
+class CachedLoader(cached.Loader, TimedLoaderMixin):
+    """cached.Loader, чьи шаблоны замеряют время рендеринга."""
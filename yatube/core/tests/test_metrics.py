@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..cache import key_family
+
+METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_DIR=METRICS_DIR)
+class MetricsTest(TestCase):
+    """Эндпоинт /metrics и сбор метрик."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def metrics(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def value(self, text, line):
+        for row in text.splitlines():
+            if row.startswith(line + ' '):
+                return float(row.rsplit(' ', 1)[1])
+        return 0
+
+    def test_view_latency_and_cache_page(self):
+        """Запросы главной считаются, второй отдается из cache_page."""
+        before = self.metrics()
+        for _ in range(2):
+            Client().get(reverse('posts:index'))
+        text = self.metrics()
+        requests = 'yatube_requests_total{status="200",view="posts:index"}'
+        hits = ('yatube_cache_requests_total'
+                '{key="cache_page.index_page",result="hit"}')
+        self.assertEqual(
+            self.value(text, requests) - self.value(before, requests), 2,
+        )
+        self.assertGreaterEqual(
+            self.value(text, hits) - self.value(before, hits), 1,
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"}',
+            text,
+        )
+        self.assertIn('yatube_request_db_seconds_count', text)
+
+    def test_workers_aggregated(self):
+        """Значения из файлов других воркеров складываются."""
+        with open(os.path.join(METRICS_DIR, '0.json'), 'w') as file:
+            json.dump({
+                'counters': [[
+                    'yatube_requests_total',
+                    {'view': 'other', 'status': 500},
+                    3,
+                ]],
+                'histograms': [],
+            }, file)
+        self.assertEqual(self.value(
+            self.metrics(),
+            'yatube_requests_total{status="500",view="other"}',
+        ), 3)
+
+    def test_key_family(self):
+        """Ключи кеша группируются по виду."""
+        self.assertEqual(
+            key_family('views.decorators.cache.cache_page.index_page.GET.x'),
+            'cache_page.index_page',
+        )
+        self.assertEqual(key_family('sorl-thumbnail||image||abc'),
+                         'sorl-thumbnail')
+        self.assertEqual(key_family('trending_posts'), 'trending_posts')
@@ -0,0 +1,86 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import ProfileRecord
+from ..profiling import make_token
+
+User = get_user_model()
+PROFILE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(PROFILE_DIR=PROFILE_DIR)
+class ProfilingMiddlewareTest(TestCase):
+    """Профилирование запросов по подписанному токену."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(PROFILE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.staff = User.objects.create_superuser(
+            username='staff', email='staff@yatube.ru', password='staff',
+        )
+        self.user = User.objects.create_user(username='user')
+        self.client.force_login(self.staff)
+
+    def get(self, client, token):
+        return client.get(reverse('posts:index'), HTTP_X_PROFILE=token)
+
+    def test_cprofile_saved_and_listed(self):
+        """Профиль cProfile сохраняется в pstats и виден в админке."""
+        response = self.get(self.client, make_token(self.staff, 'cprofile'))
+        record = ProfileRecord.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(record.view, 'posts:index')
+        self.assertTrue(pstats.Stats(record.file_path).total_calls)
+        response = self.client.get(
+            reverse('admin:core_profilerecord_changelist')
+        )
+        self.assertContains(response, record.file)
+        # Подпись токена зависит от секунды, сверяется только значение.
+        self.assertContains(response, f'{self.staff.pk}:sample:')
+        response = self.client.get(
+            reverse('admin:core_profilerecord_download', args=(record.pk,))
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_sampler_writes_collapsed_stacks(self):
+        """Сэмплирующий профайлер пишет файл свернутых стеков."""
+        response = self.client.get(
+            reverse('posts:index'),
+            {'_profile': make_token(self.staff, 'sample')},
+        )
+        record = ProfileRecord.objects.get(pk=response['X-Profile-Id'])
+        self.assertTrue(record.file.endswith('.collapsed'))
+        self.assertTrue(os.path.exists(record.file_path))
+
+    def test_token_checked(self):
+        """Без сотрудника или с чужим токеном профиль не снимается."""
+        client = Client()
+        client.force_login(self.user)
+        for client, token in (
+            (client, make_token(self.user, 'cprofile')),
+            (self.client, make_token(self.user, 'cprofile')),
+            (self.client, 'cprofile'),
+        ):
+            self.assertNotIn('X-Profile-Id', self.get(client, token))
+        self.assertFalse(ProfileRecord.objects.exists())
+
+    @override_settings(PROFILE_MAX_FILES=2)
+    def test_directory_bounded(self):
+        """Хранятся только последние PROFILE_MAX_FILES профилей."""
+        token = make_token(self.staff, 'cprofile')
+        paths = []
+        for _ in range(3):
+            response = self.get(self.client, token)
+            paths.append(ProfileRecord.objects.get(
+                pk=response['X-Profile-Id'],
+            ).file_path)
+        self.assertEqual(ProfileRecord.objects.count(), 2)
+        self.assertFalse(os.path.exists(paths[0]))
@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.template import Context, Engine
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from posts.pubsub import broker, publish_post
+
+from ..middleware import QueryBudgetMiddleware
+from ..queries import budget_exceeded, normalize_sql
+
+User = get_user_model()
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True)
+class QueryBudgetMiddlewareTest(TestCase):
+    """Подсчет запросов и поиск N+1 в QueryBudgetMiddleware."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='текст')
+        for i in range(6):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(username=f'reader_{i}'),
+                text='комментарий',
+            )
+        self.reports = []
+        budget_exceeded.connect(self.collect)
+        self.addCleanup(budget_exceeded.disconnect, self.collect)
+
+    def collect(self, sender, report, **kwargs):
+        self.reports.append(report)
+
+    def test_normalize_sql(self):
+        """Значения и списки IN не влияют на форму запроса."""
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s, %s)  LIMIT 21'),
+            normalize_sql("SELECT * FROM t WHERE id IN (1) LIMIT 'x'"),
+        )
+
+    def test_query_count_header(self):
+        """Число запросов отдается заголовком, бюджет не превышен."""
+        response = Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        self.assertLessEqual(int(response['X-Query-Count']), 8)
+        self.assertEqual(self.reports, [])
+
+    @override_settings(QUERY_BUDGETS={'posts:post_detail': 1})
+    def test_over_budget_reported(self):
+        """Превышение бюджета вью отправляется сигналом."""
+        with self.assertLogs('core.middleware', 'WARNING'):
+            Client().get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+            )
+        report, = self.reports
+        self.assertTrue(report['over_budget'])
+        self.assertEqual(report['view'], 'posts:post_detail')
+
+    @override_settings(QUERY_BUDGETS={'posts:feed_events': 0})
+    def test_streaming_body_counted(self):
+        """Запросы тела потокового ответа учитываются после его отдачи."""
+        since = broker.last
+        publish_post(self.post)
+        response = Client().get(reverse('posts:feed_events'), {
+            'since': since, 'timeout': 0.1, 'fragments': 1,
+        })
+        self.assertEqual(self.reports, [])
+        with self.assertLogs('core.middleware', 'WARNING'):
+            b''.join(response.streaming_content)
+        report, = self.reports
+        self.assertGreaterEqual(report['queries'], 1)
+
+    def test_repeated_queries_traced_to_template(self):
+        """N+1 в шаблоне пишется в лог с шаблоном и строкой."""
+        template = Engine(loaders=[(
+            'django.template.loaders.locmem.Loader',
+            {'comments.html': (
+                '{% for comment in comments %}\n'
+                '{{ comment.author.username }}{% endfor %}'
+            )},
+        )]).get_template('comments.html')
+
+        def view(request):
+            return HttpResponse(template.render(Context({
+                'comments': Comment.objects.all(),
+            })))
+
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            QueryBudgetMiddleware(view)(RequestFactory().get('/'))
+        (count, origin, _), = self.reports[0]['repeated']
+        self.assertEqual(count, 6)
+        self.assertEqual(origin, 'comments.html:2')
+        self.assertIn('N+1 x6 в comments.html:2', logs.output[-1])
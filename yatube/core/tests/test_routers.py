@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..middleware import PIN_COOKIE
+from ..routers import ReplicaRouter, pin_to_primary
+
+User = get_user_model()
+
+
+@override_settings(REPLICA_DATABASES=['replica_0', 'replica_1'])
+class ReplicaRouterTest(TestCase):
+    """Маршрутизация чтений на реплики."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.addCleanup(pin_to_primary, False)
+
+    def test_reads_go_to_replicas_writes_to_primary(self):
+        """Чтения уходят на реплики, записи - в основную базу."""
+        self.assertIn(
+            self.router.db_for_read(Post), ('replica_0', 'replica_1'),
+        )
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_pinned_reads_go_to_primary(self):
+        """Закрепленные чтения идут в основную базу."""
+        pin_to_primary()
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        """Миграции не применяются к репликам."""
+        self.assertFalse(self.router.allow_migrate('replica_0', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+@override_settings(REPLICA_DATABASES=['default'])
+class ReadYourWritesMiddlewareTest(TestCase):
+    """Закрепление пользователя за основной базой после записи.
+
+    Роль реплики играет основная тестовая база: проверяется только
+    выставление cookie.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_write_view_sets_pin_cookie(self):
+        """После создания записи выставляется cookie закрепления."""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'), {'text': 'текст'},
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_read_view_does_not_set_pin_cookie(self):
+        """Чтение ленты не закрепляет пользователя."""
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
@@ -0,0 +1,79 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..models import SlowQuery
+from ..queries import explain
+
+User = get_user_model()
+
+
+@override_settings(SLOW_QUERY_ENABLED=True, SLOW_QUERY_THRESHOLD=0)
+class SlowQueryMiddlewareTest(TestCase):
+    """Журнал медленных запросов с планами EXPLAIN."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='текст')
+
+    def get_post(self):
+        return Client().get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+
+    def test_queries_logged_with_plan(self):
+        """Запрос пишется в файл и в модель с маршрутом и планом."""
+        with self.assertLogs('core.slow_queries', 'INFO') as logs:
+            self.get_post()
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['view'], 'posts:post_detail')
+        record = SlowQuery.objects.filter(
+            sql__contains='"posts_post"', view='posts:post_detail',
+        ).first()
+        self.assertIsNotNone(record)
+        self.assertIn(str(self.post.id), record.params)
+        self.assertTrue(record.plan)
+        self.assertEqual(len(record.fingerprint), 40)
+
+    def test_explain_skips_writes(self):
+        """План снимается только для SELECT."""
+        self.assertEqual(
+            explain(connection, 'DELETE FROM posts_post WHERE id = %s', [1]),
+            '',
+        )
+        self.assertIn(
+            'posts_post',
+            explain(connection, 'SELECT * FROM posts_post WHERE id = %s', [1]),
+        )
+
+    @override_settings(SLOW_QUERY_MAX_RECORDS=3)
+    def test_records_bounded(self):
+        """Хранится не больше SLOW_QUERY_MAX_RECORDS записей."""
+        with self.assertLogs('core.slow_queries', 'INFO'):
+            self.get_post()
+        self.assertEqual(SlowQuery.objects.count(), 3)
+
+    def test_admin_grouped_by_shape(self):
+        """Админка сводит повторы одной формы запроса в строку."""
+        with self.assertLogs('core.slow_queries', 'INFO'):
+            self.get_post()
+            self.get_post()
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='admin',
+        )
+        client = Client()
+        client.force_login(admin)
+        with override_settings(SLOW_QUERY_ENABLED=False):
+            response = client.get(reverse('admin:core_slowquery_grouped'))
+        groups = response.context['groups']
+        self.assertEqual(
+            sum(group['count'] for group in groups),
+            SlowQuery.objects.count(),
+        )
+        self.assertTrue(all(group['count'] >= 2 for group in groups))
+        self.assertEqual(groups[0]['views'], 'posts:post_detail')
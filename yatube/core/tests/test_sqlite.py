@@ -0,0 +1,14 @@
+from django.db import connection
+from django.test import TestCase
+
+
+class SqlitePragmasTest(TestCase):
+    """Профиль соединений SQLite."""
+
+    def test_pragmas_applied_to_connection(self):
+        """Новое соединение получает pragma из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
@@ -0,0 +1,54 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..metrics import metrics
+
+User = get_user_model()
+
+
+class TemplateTimingTest(TestCase):
+    """Время рендеринга шаблонов за запрос."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        for i in range(3):
+            Post.objects.create(author=author, text=f'пост {i}')
+
+    def timings(self, response):
+        return {
+            name: int(count)
+            for name, count in re.findall(
+                r'"([^"]+)";dur=[\d.]+;count=(\d+)',
+                response['X-Template-Timing'],
+            )
+        }
+
+    @override_settings(TEMPLATE_TIMING_HEADER=True)
+    def test_header_counts_includes(self):
+        """Заголовок содержит каждый шаблон и число его рендеров."""
+        timings = self.timings(self.client.get(reverse('posts:index')))
+        self.assertEqual(timings['posts/index.html'], 1)
+        self.assertEqual(timings['posts/includes/post.html'], 3)
+        self.assertEqual(timings['base.html'], 1)
+
+    def test_header_only_in_debug(self):
+        """Без DEBUG и TEMPLATE_TIMING_HEADER заголовка нет."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('X-Template-Timing', response)
+
+    def test_metrics_recorded(self):
+        """Число рендеров шаблона попадает в метрики."""
+        key = (
+            'yatube_template_renders_total',
+            (('template', 'posts/includes/post.html'),),
+        )
+        before = metrics.counters.get(key, 0)
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(metrics.counters[key] - before, 3)
@@ -0,0 +1,39 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from sorl.thumbnail import default
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from ..thumbnails import CacheKVStore
+
+
+class CacheKVStoreTest(TestCase):
+    """Хранилище метаданных миниатюр в кеше."""
+
+    def setUp(self):
+        cache.clear()
+        self.store = CacheKVStore()
+        self.store._set_raw(add_prefix('a', 'image'), 'картинка')
+        self.store._set_raw(add_prefix('a', 'thumbnails'), '["b"]')
+        self.store._set_raw(add_prefix('b', 'image'), 'миниатюра')
+
+    def test_keys_listed(self):
+        """Записанные ключи перечисляются по виду."""
+        self.assertCountEqual(self.store._find_keys('image'), ['a', 'b'])
+        self.assertEqual(list(self.store._find_keys('thumbnails')), ['a'])
+        self.store._delete('b')
+        self.assertEqual(list(self.store._find_keys('image')), ['a'])
+
+    def test_expired_keys_dropped(self):
+        """Вытесненные из кеша записи пропадают из списка."""
+        cache.delete(add_prefix('b', 'image'))
+        self.assertEqual(list(self.store._find_keys('image')), ['a'])
+
+    def test_thumbnail_clear(self):
+        """Команда thumbnail clear удаляет все записи хранилища."""
+        self.assertIsInstance(default.kvstore, CacheKVStore)
+        call_command('thumbnail', 'clear', stdout=StringIO())
+        self.assertIsNone(self.store._get_raw(add_prefix('a', 'image')))
+        self.assertEqual(list(self.store._find_keys('image')), [])
@@ -0,0 +1,83 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..tracing import SERVER, end_trace, span, start_trace
+
+User = get_user_model()
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+
+
+@override_settings(TRACING_ENABLED=True, TRACING_SAMPLE_RATE=1)
+class TracingMiddlewareTest(TestCase):
+    """Трейсы запросов в формате OTLP/JSON."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='текст')
+
+    def get_spans(self, **headers):
+        with self.assertLogs('core.tracing', 'INFO') as logs:
+            response = Client().get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+                **headers,
+            )
+        data = json.loads(logs.records[-1].getMessage())
+        spans = data['resourceSpans'][0]['scopeSpans'][0]['spans']
+        return response, spans
+
+    def test_request_spans(self):
+        """В трейсе есть корень, вью, запросы к БД и рендеры шаблонов."""
+        response, spans = self.get_spans()
+        root = spans[0]
+        self.assertEqual(root['name'], 'GET posts:post_detail')
+        self.assertEqual(root['kind'], SERVER)
+        self.assertEqual(response['X-Trace-Id'], root['traceId'])
+        names = {item['name'] for item in spans}
+        self.assertLessEqual(
+            {'view posts:post_detail', 'middleware.request',
+             'middleware.response', 'SELECT', 'template.render'},
+            names,
+        )
+        ids = {item['spanId'] for item in spans}
+        for item in spans[1:]:
+            self.assertIn(item['parentSpanId'], ids)
+            self.assertLessEqual(
+                int(root['startTimeUnixNano']),
+                int(item['startTimeUnixNano']),
+            )
+
+    def test_traceparent_continues_trace(self):
+        """traceparent с флагом sampled задает trace_id и родителя."""
+        with override_settings(TRACING_SAMPLE_RATE=0):
+            _, spans = self.get_spans(
+                HTTP_TRACEPARENT=f'00-{TRACE_ID}-00f067aa0ba902b7-01',
+            )
+        self.assertEqual(spans[0]['traceId'], TRACE_ID)
+        self.assertEqual(spans[0]['parentSpanId'], '00f067aa0ba902b7')
+
+    @override_settings(TRACING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """Вне выборки трейс не пишется и заголовка нет."""
+        with self.assertNoLogs('core.tracing', 'INFO'):
+            response = Client().get(reverse('posts:index'))
+        self.assertFalse(response.has_header('X-Trace-Id'))
+
+    def test_cache_spans_and_limit(self):
+        """Кеш дает спаны cache.*, лишние спаны отбрасываются."""
+        start_trace(f'00-{TRACE_ID}-00f067aa0ba902b7-01')
+        with self.settings(TRACING_MAX_SPANS=2), span('root'):
+            cache.set('trace-key', 1)
+            cache.get('trace-key')
+            cache.get('trace-key')
+        with self.assertLogs('core.tracing', 'INFO'):
+            trace = end_trace()
+        self.assertEqual(
+            [item.name for item in trace.spans], ['root', 'cache.set'],
+        )
+        self.assertEqual(trace.spans[0].attributes['tracing.dropped_spans'], 2)
@@ -0,0 +1,79 @@
+import time
+
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.base import KVStoreBase
+
+from .metrics import metrics
+from .tracing import span
+
+
+class CacheKVStore(KVStoreBase):
+    """Хранилище метаданных миниатюр sorl только в кеше, без БД.
+
+    Стандартный cached_db при холодном кеше делает по запросу к БД на
+    каждую картинку ленты. Потеря записи в кеше безопасна: sorl
+    проверяет, что файл миниатюры уже существует, и не создает его
+    заново.
+
+    Кеш не умеет перечислять ключи, поэтому хранилище ведет их список
+    под INDEX_KEY: по нему работают команды thumbnail cleanup, clear и
+    clear_delete_referenced. Список меняется только при создании и
+    удалении записей, то есть при создании миниатюр, а не на каждом
+    показе.
+    """
+
+    INDEX_KEY = 'sorl-thumbnail-index'
+
+    @property
+    def cache(self):
+        try:
+            return caches[settings.THUMBNAIL_CACHE]
+        except InvalidCacheBackendError:
+            return cache
+
+    def _get_raw(self, key):
+        return self.cache.get(key)
+
+    def _set_raw(self, key, value):
+        self.cache.set(key, value, settings.THUMBNAIL_CACHE_TIMEOUT)
+        index = self.cache.get(self.INDEX_KEY) or set()
+        if key not in index:
+            self.cache.set(self.INDEX_KEY, index | {key}, None)
+
+    def _delete_raw(self, *keys):
+        self.cache.delete_many(keys)
+        index = self.cache.get(self.INDEX_KEY) or set()
+        if index & set(keys):
+            self.cache.set(self.INDEX_KEY, index - set(keys), None)
+
+    def _find_keys_raw(self, prefix):
+        index = self.cache.get(self.INDEX_KEY) or set()
+        # Истекшие по таймауту записи выпадают из списка.
+        alive = set(self.cache.get_many(index))
+        if alive != index:
+            self.cache.set(self.INDEX_KEY, alive, None)
+        return [key for key in alive if key.startswith(prefix)]
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, замеряющий время создания миниатюр для /metrics.
+
+    Поиск и создание миниатюр попадают в трейс запроса.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        attributes = {'thumbnail.geometry': geometry_string}
+        with span('thumbnail', attributes=attributes):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _create_thumbnail(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with span('thumbnail.create'):
+                return super()._create_thumbnail(*args, **kwargs)
+        finally:
+            metrics.observe(
+                'yatube_thumbnail_seconds', time.perf_counter() - started,
+            )
@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+# Виды спанов OTLP.
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+
+# Заголовок W3C traceparent: версия-trace_id-span_id-флаги.
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+MAX_STATEMENT_LENGTH = 2000
+
+
+class Span:
+    """Отрезок работы внутри трейса."""
+
+    __slots__ = (
+        'name', 'kind', 'span_id', 'parent_id', 'attributes', 'start', 'end',
+        'error',
+    )
+
+    def __init__(self, name, kind, parent_id, attributes, start=None):
+        self.name = name
+        self.kind = kind
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = start or time.time_ns()
+        self.end = None
+        self.error = None
+
+    def to_otlp(self, trace_id):
+        data = {
+            'traceId': trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end),
+            'attributes': otlp_attributes(self.attributes),
+        }
+        if self.parent_id:
+            data['parentSpanId'] = self.parent_id
+        if self.error:
+            data['status'] = {'code': STATUS_ERROR, 'message': self.error}
+        return data
+
+
+class Trace:
+    """Спаны одного запроса; число спанов ограничено TRACING_MAX_SPANS."""
+
+    def __init__(self, trace_id, parent_id=None):
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.spans = []
+        self.stack = []
+        self.dropped = 0
+        # Конец спана вью: с него считается middleware.response.
+        self.view_end = None
+
+    def open(self, name, kind, attributes, start=None):
+        parent_id = self.stack[-1].span_id if self.stack else self.parent_id
+        current = Span(name, kind, parent_id, attributes, start)
+        if len(self.spans) < settings.TRACING_MAX_SPANS:
+            self.spans.append(current)
+        else:
+            self.dropped += 1
+        self.stack.append(current)
+        return current
+
+    def close(self, current, end=None):
+        current.end = end or time.time_ns()
+        self.stack.remove(current)
+
+
+def current_trace():
+    return getattr(_state, 'trace', None)
+
+
+def start_trace(traceparent=None):
+    """Решает, попадет ли запрос в выборку, и начинает трейс.
+
+    В выборку попадает доля TRACING_SAMPLE_RATE запросов и все запросы с
+    traceparent, где стоит флаг sampled; trace_id и родитель при этом
+    берутся из заголовка.
+    """
+    _state.trace = None
+    trace_id = parent_id = None
+    sampled = random.random() < settings.TRACING_SAMPLE_RATE
+    match = TRACEPARENT.match(traceparent or '')
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        sampled = sampled or bool(int(flags, 16) & 1)
+    if not sampled:
+        return None
+    _state.trace = Trace(trace_id or os.urandom(16).hex(), parent_id)
+    return _state.trace
+
+
+def end_trace():
+    """Заканчивает трейс текущего потока и выгружает его."""
+    trace = current_trace()
+    _state.trace = None
+    if trace is not None:
+        export(trace)
+    return trace
+
+
+class span:
+    """Спан вокруг блока кода; без активного трейса ничего не делает.
+
+    Класс, а не contextmanager: вызывается на каждом запросе к БД,
+    кешу и рендере шаблона, и должен стоить как можно меньше.
+    """
+
+    __slots__ = ('name', 'kind', 'attributes', 'trace', 'current')
+
+    def __init__(self, name, kind=INTERNAL, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.trace = None
+        self.current = None
+
+    def __enter__(self):
+        self.trace = getattr(_state, 'trace', None)
+        if self.trace is not None:
+            self.current = self.trace.open(
+                self.name, self.kind, self.attributes or {},
+            )
+        return self.current
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.current is not None:
+            if exc_value is not None:
+                self.current.error = repr(exc_value)
+            self.trace.close(self.current)
+
+
+def add_span(name, start, end, attributes=None):
+    """Уже завершенный спан с известными границами."""
+    trace = current_trace()
+    if trace is not None:
+        trace.close(trace.open(name, INTERNAL, attributes or {}, start), end)
+
+
+def trace_query(execute, sql, params, many, context):
+    """Обертка execute_wrapper: спан на каждый запрос к БД."""
+    if getattr(_state, 'trace', None) is None:
+        return execute(sql, params, many, context)
+    connection = context['connection']
+    operation = sql.split(None, 1)[0].upper() if sql else 'SQL'
+    with span(operation, CLIENT, {
+        'db.system': connection.vendor,
+        'db.name': connection.alias,
+        'db.statement': sql[:MAX_STATEMENT_LENGTH],
+    }):
+        return execute(sql, params, many, context)
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_attributes(attributes):
+    return [
+        {'key': key, 'value': otlp_value(value)}
+        for key, value in attributes.items()
+    ]
+
+
+def to_otlp(trace):
+    """Трейс в формате OTLP/JSON (ExportTraceServiceRequest)."""
+    if trace.dropped and trace.spans:
+        trace.spans[0].attributes['tracing.dropped_spans'] = trace.dropped
+    spans = [current.to_otlp(trace.trace_id) for current in trace.spans]
+    return {'resourceSpans': [{
+        'resource': {'attributes': otlp_attributes({
+            'service.name': settings.TRACING_SERVICE_NAME,
+            'process.pid': os.getpid(),
+        })},
+        'scopeSpans': [{
+            'scope': {'name': __name__},
+            'spans': spans,
+        }],
+    }]}
+
+
+def export(trace):
+    """Строка OTLP/JSON в файл TRACING_FILE через логгер core.tracing.
+
+    Формат совпадает с файловым экспортером OpenTelemetry Collector:
+    такой файл читает collector с приемником otlpjsonfile.
+    """
+    logger.info(json.dumps(to_otlp(trace), ensure_ascii=False))
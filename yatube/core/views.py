@@ -1,5 +1,8 @@
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from .metrics import render as render_metrics
+
 
 def page_not_found(request, exception):
     """Отображение страницы ошибки 404."""
@@ -26,3 +29,11 @@ def permission_denied(request, exception):
 def server_error(request):
     """Отображение страницы ошибки 500."""
     return render(request, 'core/500.html', status=500)
+
+
+def metrics(request):
+    """Метрики всех воркеров в текстовом формате Prometheus."""
+    return HttpResponse(
+        render_metrics(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -1,10 +1,123 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import ValidationError
+from django.http import QueryDict
 
-from .models import Comment, Group, Post
+from .archive import invalidate_cold_counts
+from .deletion import schedule_deletion
+from .models import ArchivedPost, Comment, DeletionTask, Group, Post
+from .sharding import is_sharded, per_shard
+from .utils import (bulk_delete_chunked, bulk_update_chunked,
+                    invalidate_feed_cache, write_db)
+
+
+class PostActionForm(ActionForm):
+    """Форма действий над записями с выбором новой группы."""
+
+    group = forms.ModelChoiceField(
+        queryset=Group.objects.all(),
+        required=False,
+        label='Группа',
+        empty_label='-без группы-',
+    )
+
+
+def report_progress(modeladmin, request, rows, chunks, action):
+    """Сообщение администратору о результате массового действия."""
+    invalidate_feed_cache()
+    modeladmin.message_user(
+        request,
+        f'{action}: {rows} строк, порций: {chunks}.',
+    )
+
+
+User = get_user_model()
+
+
+class ScheduledDeletionMixin:
+    """Удаление объекта задачей в фоне вместо синхронного каскада.
+
+    Страница подтверждения не собирает связанные объекты: для автора с
+    тысячами записей это само по себе долгий запрос. Права на удаление
+    проверяются по моделям из cascade_models, без загрузки объектов.
+    """
+
+    cascade_models = ()
+
+    def get_deleted_objects(self, objs, request):
+        perms_needed = set()
+        for model in self.cascade_models:
+            model_admin = self.admin_site._registry.get(model)
+            if model_admin and not model_admin.has_delete_permission(request):
+                perms_needed.add(model._meta.verbose_name)
+        return [str(obj) for obj in objs], {}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            schedule_deletion(obj)
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """Выбор шарда, из которого показываются объекты."""
+
+    title = 'шард'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in settings.POST_SHARDS]
+
+    def choices(self, changelist):
+        # Варианта "Все" нет: список читается из одной базы.
+        current = self.value() or settings.POST_SHARDS[0]
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias},
+                ),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # База выбирается в ShardedAdminMixin.get_queryset.
+        return queryset
+
+
+class ShardedAdminMixin:
+    """Записи и комментарии из шарда, выбранного фильтром списка.
+
+    Шард берется из ?shard= списка или из сохраненных фильтров на
+    страницах объекта, поэтому изменение, удаление и действия идут в ту
+    же базу, из которой объекты показаны.
+    """
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if is_sharded():
+            return (ShardListFilter, *list_filter)
+        return list_filter
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not is_sharded():
+            return queryset
+        alias = request.GET.get('shard') or QueryDict(
+            request.GET.get('_changelist_filters', ''),
+        ).get('shard')
+        if alias in settings.POST_SHARDS:
+            return queryset.using(alias)
+        return queryset
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ShardedAdminMixin, admin.ModelAdmin):
     """Отображение раздела Post в админ-зоне."""
 
     list_display = (
@@ -18,10 +131,57 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    action_form = PostActionForm
+    actions = (
+        'reassign_group',
+        'delete_by_author',
+        'purge_comments',
+    )
+
+    def reassign_group(self, request, queryset):
+        """Перенос выбранных записей в группу из формы действия."""
+        try:
+            group = self.action_form.base_fields['group'].clean(
+                request.POST.get('group'),
+            )
+        except ValidationError as error:
+            self.message_user(request, ' '.join(error), messages.ERROR)
+            return
+        rows, chunks = bulk_update_chunked(
+            queryset,
+            group_id=group and group.pk,
+        )
+        report_progress(self, request, rows, chunks, 'Перенесено записей')
+
+    reassign_group.short_description = 'Перенести в выбранную группу'
+
+    def delete_by_author(self, request, queryset):
+        """Удаление всех записей авторов выбранных записей."""
+        authors = set(queryset.values_list('author_id', flat=True))
+        rows = chunks = 0
+        for posts in per_shard(Post.objects.filter(author_id__in=authors)):
+            deleted, deleted_chunks = bulk_delete_chunked(posts)
+            rows += deleted
+            chunks += deleted_chunks
+        report_progress(self, request, rows, chunks, 'Удалено записей')
+
+    delete_by_author.short_description = 'Удалить все записи этих авторов'
+
+    def purge_comments(self, request, queryset):
+        """Удаление всех комментариев к выбранным записям."""
+        # Комментарии лежат в шарде своих записей.
+        rows, chunks = bulk_delete_chunked(
+            Comment.objects.using(write_db(queryset)).filter(
+                post__in=queryset.values('pk'),
+            )
+        )
+        report_progress(self, request, rows, chunks, 'Удалено комментариев')
+
+    purge_comments.short_description = 'Удалить комментарии к записям'
 
 
 @admin.register(Group)
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(ScheduledDeletionMixin, admin.ModelAdmin):
     """Отображение раздела Group в админ-зоне."""
 
     list_display = (
@@ -35,7 +195,7 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentsAdmin(admin.ModelAdmin):
+class CommentsAdmin(ShardedAdminMixin, admin.ModelAdmin):
     """Отображение комментариев в админ-зоне."""
 
     list_display = (
@@ -47,3 +207,71 @@ class CommentsAdmin(admin.ModelAdmin):
     )
     search_fields = ('text',)
     list_filter = ('created',)
+    actions = ('delete_by_author',)
+
+    def delete_by_author(self, request, queryset):
+        """Удаление всех комментариев авторов выбранных комментариев."""
+        authors = set(queryset.values_list('author_id', flat=True))
+        rows = chunks = 0
+        for comments in per_shard(
+            Comment.objects.filter(author_id__in=authors)
+        ):
+            deleted, deleted_chunks = bulk_delete_chunked(comments)
+            rows += deleted
+            chunks += deleted_chunks
+        report_progress(self, request, rows, chunks, 'Удалено комментариев')
+
+    delete_by_author.short_description = (
+        'Удалить все комментарии этих авторов'
+    )
+
+
+@admin.register(ArchivedPost)
+class ArchivedPostAdmin(admin.ModelAdmin):
+    """Отображение архивных записей в админ-зоне."""
+
+    list_display = (
+        'pk',
+        'text',
+        'pub_date',
+        'author',
+        'group',
+    )
+    search_fields = ('text',)
+    list_filter = ('pub_date',)
+    empty_value_display = '-пусто-'
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_cold_counts()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_cold_counts()
+
+
+@admin.register(DeletionTask)
+class DeletionTaskAdmin(admin.ModelAdmin):
+    """Ход фонового удаления пользователей и групп."""
+
+    list_display = (
+        'pk',
+        'target',
+        'object_id',
+        'status',
+        'created',
+        'finished',
+        'rows',
+    )
+    list_filter = ('target', 'status')
+    empty_value_display = '-пусто-'
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class YatubeUserAdmin(ScheduledDeletionMixin, UserAdmin):
+    """Пользователи с фоновым удалением содержимого."""
+
+    cascade_models = (Post, Comment)
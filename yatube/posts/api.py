@@ -0,0 +1,255 @@
+import base64
+import json
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+
+from .archive import HotColdList, get_post_or_archived
+from .constants import API_MAX_LIMIT, API_MULTI_GET_LIMIT, POSTS_PER_PAGE
+from .models import ArchivedPost, Group, Post
+from .sharding import is_sharded, per_shard, sharded_posts
+
+User = get_user_model()
+
+# Поля ответа и lookup для values_list.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+class ApiError(Exception):
+    """Ошибка запроса к API, отдается клиенту со статусом 400."""
+
+
+def api_view(view):
+    """Переводит ApiError в ответ 400, а Http404 - в JSON с 404.
+
+    Без этого get_object_or_404 отдавал бы клиенту API HTML-страницу.
+    """
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        except Http404:
+            return JsonResponse({'error': 'Не найдено.'}, status=404)
+
+    wrapper.__doc__ = view.__doc__
+    return wrapper
+
+
+def json_response(data):
+    return JsonResponse(
+        data,
+        encoder=DjangoJSONEncoder,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def selected_fields(request, fields):
+    """Поля из параметра ?fields=, по умолчанию все."""
+    names = request.GET.get('fields')
+    if not names:
+        return tuple(fields)
+    names = tuple(name.strip() for name in names.split(',') if name.strip())
+    unknown = set(names) - set(fields)
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(sorted(unknown))}.')
+    return names
+
+
+def lookups(fields, names):
+    return tuple(fields[name] for name in names)
+
+
+def post_row(post, names):
+    """Строка как из values_list по POST_FIELDS для загруженной записи."""
+    values = {
+        'id': post.id,
+        'text': post.text,
+        'pub_date': post.pub_date,
+        'author': post.author.username,
+        'group': post.group and post.group.slug,
+        'image': post.image.name,
+    }
+    return tuple(values[name] for name in names)
+
+
+def to_dicts(rows, names):
+    """Словари из строк values_list без создания объектов моделей."""
+    rows = [dict(zip(names, row)) for row in rows]
+    if 'image' in names:
+        for row in rows:
+            row['image'] = row['image'] and settings.MEDIA_URL + row['image']
+    return rows
+
+
+def encode_cursor(pub_date, pk):
+    value = json.dumps([pub_date.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(value).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        pub_date, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        pub_date, pk = parse_datetime(pub_date), int(pk)
+    except (ValueError, TypeError):
+        raise ApiError('Некорректный курсор.')
+    if pub_date is None:
+        raise ApiError('Некорректный курсор.')
+    return pub_date, pk
+
+
+def paginated_posts(request, hot, cold):
+    """Страница постов с пагинацией по курсору (pub_date, id).
+
+    Как и в HTML-лентах, за горячими записями идут архивные, горячие
+    сливаются со всех шардов.
+    """
+    names = selected_fields(request, POST_FIELDS)
+    try:
+        limit = int(request.GET.get('limit', POSTS_PER_PAGE))
+    except ValueError:
+        raise ApiError('Некорректный limit.')
+    if not 0 < limit <= API_MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {API_MAX_LIMIT}.')
+    cursor = request.GET.get('cursor')
+    after = Q()
+    if cursor:
+        pub_date, pk = decode_cursor(cursor)
+        after = Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+    hot, cold = (
+        queryset.filter(after).order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id', *lookups(POST_FIELDS, names),
+        )
+        for queryset in (hot, cold)
+    )
+    rows = HotColdList(
+        sharded_posts(hot, key=itemgetter(0, 1)), cold,
+    ).first(limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1][:2])
+    results = to_dicts((row[2:] for row in rows), names)
+
+    return json_response({'results': results, 'next': next_cursor})
+
+
+@api_view
+def index(request):
+    """Последние записи."""
+    return paginated_posts(
+        request, Post.objects.all(), ArchivedPost.objects.all(),
+    )
+
+
+@api_view
+def group_posts(request, slug):
+    """Записи группы."""
+    group = get_object_or_404(Group.objects.only('id'), slug=slug)
+    return paginated_posts(
+        request, Post.objects.filter(group_id=group.pk),
+        group.archived_posts.all(),
+    )
+
+
+@api_view
+def profile(request, username):
+    """Записи пользователя."""
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    return paginated_posts(
+        request, Post.objects.filter(author_id=author.pk),
+        author.archived_posts.all(),
+    )
+
+
+@api_view
+def follow_index(request):
+    """Записи авторов, на которых подписан пользователь."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход.'}, status=401)
+    if is_sharded():
+        # Подписки лежат в default, посты - в шардах авторов.
+        posts = Post.objects.filter(author_id__in=list(
+            request.user.follower.values_list('author_id', flat=True),
+        ))
+    else:
+        posts = Post.objects.filter(author__following__user=request.user)
+    return paginated_posts(
+        request,
+        posts,
+        ArchivedPost.objects.filter(author__following__user=request.user),
+    )
+
+
+@api_view
+def posts_batch(request):
+    """Записи по списку ?ids= в порядке запроса, одним запросом к БД.
+
+    Как и in_bulk, строки выбираются одним запросом по id__in и
+    раскладываются по словарю, но без создания объектов моделей. Не
+    найденные id ищутся в следующих шардах, затем в архиве.
+    """
+    try:
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk]
+    except ValueError:
+        raise ApiError('ids - список целых чисел через запятую.')
+    ids = list(dict.fromkeys(ids))
+    if not 0 < len(ids) <= API_MULTI_GET_LIMIT:
+        raise ApiError(f'Нужно от 1 до {API_MULTI_GET_LIMIT} id.')
+    names = selected_fields(request, POST_FIELDS)
+    rows = []
+    missing = set(ids)
+    for queryset in (*per_shard(Post.objects.all()), ArchivedPost.objects):
+        if not missing:
+            break
+        chunk = list(queryset.filter(id__in=missing).values_list(
+            'id', *lookups(POST_FIELDS, names),
+        ))
+        rows.extend(chunk)
+        missing -= {row[0] for row in chunk}
+    found = dict(zip(
+        (row[0] for row in rows),
+        to_dicts((row[1:] for row in rows), names),
+    ))
+
+    return json_response({
+        'results': [found[pk] for pk in ids if pk in found],
+        'missing': [pk for pk in ids if pk not in found],
+    })
+
+
+@api_view
+def post_detail(request, post_id):
+    """Запись с комментариями, при промахе - из архива."""
+    names = selected_fields(request, POST_FIELDS)
+    post = get_post_or_archived(
+        Post.objects.select_related('author', 'group'), post_id,
+    )
+    comments = to_dicts(
+        post.comments.values_list(*lookups(COMMENT_FIELDS, COMMENT_FIELDS)),
+        tuple(COMMENT_FIELDS),
+    )
+
+    return json_response({
+        'post': to_dicts([post_row(post, names)], names)[0],
+        'comments': comments,
+    })
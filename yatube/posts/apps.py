@@ -6,3 +6,9 @@ class PostsConfig(AppConfig):
 
     name = 'posts'
     verbose_name = 'Записи'
+
+    def ready(self):
+        from .sharding import connect_signals, is_sharded
+
+        if is_sharded():
+            connect_signals()
@@ -0,0 +1,163 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from .constants import (ARCHIVE_AFTER_DAYS, ARCHIVE_COUNT_CACHE_TIME,
+                        BULK_CHUNK_SIZE)
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+from .sharding import get_post_or_404
+from .utils import bump_cache_version, cache_version, chunked_pks
+
+logger = logging.getLogger(__name__)
+
+POST_COLUMNS = (
+    'id', 'text', 'text_html', 'excerpt', 'pub_date', 'author_id', 'group_id',
+    'image',
+)
+COMMENT_COLUMNS = ('id', 'post_id', 'author_id', 'text', 'created')
+COUNT_VERSION_KEY = 'archive_count_version'
+
+
+def archive_cutoff(days=ARCHIVE_AFTER_DAYS):
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_chunk(alias, chunk):
+    """Переносит порцию записей шарда и комментарии к ним в архив.
+
+    Сначала фиксируется вставка в архив, затем удаление из шарда: сбой
+    между ними оставляет записи в обоих местах, а не теряет их, и
+    повторный запуск безопасен благодаря ignore_conflicts.
+    """
+    posts = Post.objects.using(alias).filter(pk__in=chunk)
+    comments = Comment.objects.using(alias).filter(post_id__in=chunk)
+    with transaction.atomic(using='default'):
+        ArchivedPost.objects.bulk_create(
+            (ArchivedPost(**dict(zip(POST_COLUMNS, row)))
+             for row in posts.values_list(*POST_COLUMNS)),
+            ignore_conflicts=True,
+        )
+        moved = ArchivedComment.objects.bulk_create(
+            (ArchivedComment(**dict(zip(COMMENT_COLUMNS, row)))
+             for row in comments.values_list(*COMMENT_COLUMNS)),
+            ignore_conflicts=True,
+        )
+    with transaction.atomic(using=alias):
+        posts.delete()
+
+    return len(moved)
+
+
+def archive_posts(before, chunk_size=BULK_CHUNK_SIZE):
+    """Переносит записи старше before в холодные таблицы.
+
+    Каждая порция переносится в своей транзакции, так что прерванный
+    перенос можно просто запустить повторно. Возвращает число
+    перенесенных записей и комментариев.
+    """
+    posts = comments = 0
+    for alias in settings.POST_SHARDS:
+        old_posts = Post.objects.using(alias).filter(pub_date__lt=before)
+        for chunk in chunked_pks(old_posts, chunk_size):
+            comments += archive_chunk(alias, chunk)
+            posts += len(chunk)
+            invalidate_cold_counts()
+            logger.info('В архив перенесено %s записей', posts)
+
+    return posts, comments
+
+
+def cold_count_key(name):
+    """Ключ кеша числа архивных записей ленты name.
+
+    В ключ входит версия: invalidate_cold_counts() без имени меняет ее и
+    тем самым сбрасывает счетчики всех лент сразу.
+    """
+    return f'archive_count:{cache_version(COUNT_VERSION_KEY)}:{name}'
+
+
+def invalidate_cold_counts(name=None):
+    """Сбрасывает число архивных записей ленты name или всех лент.
+
+    Все ленты сбрасываются при архивации и удалении архивных записей,
+    лента подписок пользователя - при подписке и отписке.
+    """
+    if name is None:
+        bump_cache_version(COUNT_VERSION_KEY)
+    else:
+        cache.delete(cold_count_key(name))
+
+
+class HotColdList:
+    """Горячие записи, за ними архивные, для Paginator.
+
+    Архивные записи всегда старше горячих, поэтому ленту можно склеить
+    без сортировки; к архиву обращаются только страницы за концом
+    горячих записей. Число архивных записей кешируется под именем
+    count_key, если оно задано; сбрасывает его invalidate_cold_counts().
+    """
+
+    def __init__(self, hot, cold, count_key=None):
+        self.hot = hot
+        self.cold = cold
+        self.count_key = count_key
+        self._hot_count = None
+
+    def hot_count(self):
+        if self._hot_count is None:
+            self._hot_count = self.hot.count()
+        return self._hot_count
+
+    def cold_count(self):
+        if self.count_key is None:
+            return self.cold.count()
+        key = cold_count_key(self.count_key)
+        count = cache.get(key)
+        if count is None:
+            count = self.cold.count()
+            cache.set(key, count, ARCHIVE_COUNT_CACHE_TIME)
+        return count
+
+    def count(self):
+        return self.hot_count() + self.cold_count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        hot_count = self.hot_count()
+        posts = []
+        if start < hot_count:
+            posts.extend(self.hot[start:min(stop, hot_count)])
+        if stop > hot_count:
+            posts.extend(
+                self.cold[max(start - hot_count, 0):stop - hot_count]
+            )
+        return posts
+
+    def first(self, count):
+        """Первые count записей без подсчета строк, для пагинации курсором."""
+        posts = list(self.hot[:count])
+        if len(posts) < count:
+            posts.extend(self.cold[:count - len(posts)])
+        return posts
+
+
+def get_post_or_archived(queryset, post_id):
+    """Пост по id из горячих таблиц, при промахе - из архива."""
+    try:
+        return get_post_or_404(queryset, post_id)
+    except Http404:
+        return get_object_or_404(
+            ArchivedPost.objects.select_related('author', 'group'),
+            id=post_id,
+        )
@@ -0,0 +1,133 @@
+import platform
+import statistics
+import timeit
+
+import django
+from django.contrib.auth import get_user_model
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.utils import timezone
+
+from core.context_processors.year import year
+from core.templatetags.user_filters import addclass
+
+from .constants import POSTS_PER_PAGE
+from .forms import CommentForm, PostForm
+from .models import Group, Post
+from .utils import divider_per_page
+
+User = get_user_model()
+
+# Имя -> функция подготовки, возвращающая замеряемый вызов без аргументов.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def sample_posts(count=POSTS_PER_PAGE):
+    """Несохраненные записи: замеры не зависят от базы."""
+    author = User(id=1, username='author', first_name='Лев',
+                  last_name='Толстой')
+    group = Group(id=1, title='группа', slug='group')
+    now = timezone.now()
+    return [
+        Post(
+            id=number, author=author, pub_date=now,
+            group=group if number % 2 else None,
+            text='Строка записи\n' * 5,
+        ).prerender()
+        for number in range(1, count + 1)
+    ]
+
+
+@benchmark('divider_per_page')
+def bench_divider_per_page():
+    request = RequestFactory().get('/', {'page': 3})
+    post_list = list(range(1000))
+    return lambda: divider_per_page(request, post_list)
+
+
+@benchmark('post_template')
+def bench_post_template():
+    template = get_template('posts/includes/post.html')
+    posts = sample_posts()
+
+    def render():
+        for post in posts:
+            template.render({'post': post})
+    return render
+
+
+@benchmark('post_form')
+def bench_post_form():
+    data = {'text': 'Текст записи'}
+    return lambda: PostForm(data).is_valid()
+
+
+@benchmark('comment_form')
+def bench_comment_form():
+    data = {'text': 'Текст комментария'}
+    return lambda: CommentForm(data).is_valid()
+
+
+@benchmark('addclass')
+def bench_addclass():
+    field = CommentForm()['text']
+    return lambda: addclass(field, 'form-control')
+
+
+@benchmark('year')
+def bench_year():
+    request = RequestFactory().get('/')
+    return lambda: year(request)
+
+
+def measure(func, repeat, number=None):
+    """Время одного вызова в микросекундах: минимум и медиана повторов.
+
+    Без number число вызовов в повторе подбирается timeit.autorange,
+    чтобы повтор длился не меньше 0.2 с.
+    """
+    timer = timeit.Timer(func)
+    if number is None:
+        number = timer.autorange()[0]
+    times = [
+        total / number * 1e6 for total in timer.repeat(repeat, number)
+    ]
+    return {
+        'min_us': round(min(times), 3),
+        'median_us': round(statistics.median(times), 3),
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+def run_benchmarks(names, repeat, number=None):
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'benchmarks': {
+            name: measure(BENCHMARKS[name](), repeat, number)
+            for name in names
+        },
+    }
+
+
+def compare(result, baseline, tolerance):
+    """Замедления относительно базового прогона по минимальному времени."""
+    regressions = []
+    for name, current in result['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if not previous:
+            continue
+        old, new = previous['min_us'], current['min_us']
+        if old and new > old * (1 + tolerance):
+            regressions.append(
+                f'{name}: {old} -> {new} мкс (+{(new / old - 1):.0%})'
+            )
+    return regressions
@@ -1,3 +1,67 @@
+from datetime import datetime, timezone
+
 POSTS_PER_PAGE = 10
 CHARS_PER_STR_VIEW = 15
+POST_EXCERPT_CHARS = 30
 CACHE_TIME_INDEX_PAGE = 20
+BULK_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+WRITE_BEHIND_INTERVAL = 0.005
+WRITE_BEHIND_MAX_BATCH = 200
+WRITE_BEHIND_TIMEOUT = 5
+BULK_FOLLOW_LIMIT = 100
+RECOMMENDATIONS_TOP_K = 20
+RECOMMENDATIONS_SHOWN = 5
+RECOMMENDATIONS_BATCH_SIZE = 1000
+RECOMMENDATIONS_MAX_FANOUT = 30
+RECOMMENDATIONS_COFOLLOW_SAMPLE = 10
+RECOMMENDATIONS_FOF_WEIGHT = 1.0
+RECOMMENDATIONS_COFOLLOW_WEIGHT = 0.5
+TRENDING_EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+TRENDING_HALF_LIFE = 6 * 60 * 60
+TRENDING_POST_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 1.0
+TRENDING_FOLLOW_WEIGHT = 2.0
+TRENDING_POSTS_COUNT = 10
+TRENDING_GROUPS_COUNT = 5
+TRENDING_CACHE_TIME = 5
+API_MAX_LIMIT = 100
+FEED_EVENTS_HISTORY = 1000
+FEED_EVENTS_TIMEOUT = 30
+FEED_EVENTS_KEEPALIVE = 10
+FEED_EVENTS_MAX_STREAMS = 20
+FEED_EVENTS_BUSY_RETRY = 30
+API_MULTI_GET_LIMIT = 100
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_COUNT_CACHE_TIME = 60 * 60
+DELETION_CHUNK_SIZE = 200
+DELETION_CHUNK_PAUSE = 0.01
+# Задача без новых порций дольше этого срока считается брошенной.
+DELETION_STALE_AFTER = 10 * 60
+SEED_USERS = 200_000
+SEED_GROUPS = 500
+SEED_POSTS = 2_000_000
+SEED_COMMENTS_PER_POST = 3
+SEED_FOLLOWS_PER_USER = 20
+SEED_DAYS = 730
+SEED_CHUNK_SIZE = 5000
+# Порций в работе и в ожидании записи на один процесс seed_yatube.
+SEED_PENDING_PER_WORKER = 2
+SEED_POWER_LAW_EXPONENT = 1.0
+LOADTEST_MIX = {
+    'index': 30,
+    'group_posts': 10,
+    'profile': 15,
+    'post_detail': 20,
+    'follow_index': 10,
+    'post_create': 3,
+    'add_comment': 7,
+    'follow': 5,
+}
+LOADTEST_SAMPLE_SIZE = 1000
+LOADTEST_TOLERANCE = 0.2
+
+# Микробенчмарки: число повторов замера и допустимое замедление.
+BENCHMARK_REPEAT = 5
+BENCHMARK_TOLERANCE = 0.15
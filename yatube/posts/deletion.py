@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.routers import pin_to_primary
+
+from .archive import invalidate_cold_counts
+from .constants import (DELETION_CHUNK_PAUSE, DELETION_CHUNK_SIZE,
+                        DELETION_STALE_AFTER)
+from .models import (ArchivedComment, ArchivedPost, Comment, DeletionTask,
+                     Follow, Group, Post, Recommendation)
+from .utils import (bulk_delete_chunked, bulk_update_chunked,
+                    invalidate_feed_cache, write_db)
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def user_content(user_id):
+    """Содержимое пользователя в порядке удаления: сначала зависимое."""
+    for alias in settings.POST_SHARDS:
+        yield Comment.objects.using(alias).filter(author_id=user_id)
+        yield Comment.objects.using(alias).filter(post__author_id=user_id)
+        yield Post.objects.using(alias).filter(author_id=user_id)
+    yield ArchivedComment.objects.filter(author_id=user_id)
+    yield ArchivedComment.objects.filter(post__author_id=user_id)
+    yield ArchivedPost.objects.filter(author_id=user_id)
+    yield Follow.objects.filter(user_id=user_id)
+    yield Follow.objects.filter(author_id=user_id)
+    yield Recommendation.objects.filter(user_id=user_id)
+    yield Recommendation.objects.filter(author_id=user_id)
+
+
+def group_posts(group_id):
+    """Записи группы, которые нужно отвязать от нее перед удалением."""
+    for alias in settings.POST_SHARDS:
+        yield Post.objects.using(alias).filter(group_id=group_id)
+    yield ArchivedPost.objects.filter(group_id=group_id)
+
+
+def schedule_deletion(obj):
+    """Ставит пользователя или группу в очередь на удаление.
+
+    Пользователь сразу становится неактивным и не может войти, его
+    содержимое удаляется позже порциями.
+    """
+    if isinstance(obj, Group):
+        target = DeletionTask.GROUP
+    else:
+        target = DeletionTask.USER
+        User.objects.filter(pk=obj.pk).update(is_active=False)
+    task, _ = DeletionTask.objects.get_or_create(
+        target=target, object_id=obj.pk,
+    )
+    if settings.DELETION_IN_BACKGROUND:
+        transaction.on_commit(deleter.wake)
+
+    return task
+
+
+def claim_task(task):
+    """Захватывает задачу одним UPDATE; True, если захватил этот вызов.
+
+    Так cron с process_deletions и фоновый поток не выполняют одну
+    задачу одновременно. Задачу, у которой дольше DELETION_STALE_AFTER
+    не было порций, можно захватить снова: ее исполнитель упал.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=DELETION_STALE_AFTER)
+    claimed = DeletionTask.objects.filter(pk=task.pk).filter(
+        Q(status=DeletionTask.PENDING)
+        | Q(status=DeletionTask.RUNNING, heartbeat__lt=stale)
+    ).update(status=DeletionTask.RUNNING, heartbeat=now)
+    return claimed == 1
+
+
+def run_task(task, chunk_size=DELETION_CHUNK_SIZE,
+             pause=DELETION_CHUNK_PAUSE):
+    """Удаляет объект задачи порциями по chunk_size строк.
+
+    Каждая порция - отдельная короткая транзакция; после нее
+    обновляются счетчик задачи и кеш лент, а поток уступает базу другим
+    писателям на pause секунд. Сам объект удаляется последним, когда
+    каскаду уже нечего загружать. Задачу, захваченную другим
+    исполнителем, функция пропускает и возвращает False.
+    """
+    if not claim_task(task):
+        return False
+
+    def progress(rows):
+        task.rows += rows
+        task.heartbeat = timezone.now()
+        task.save(update_fields=['rows', 'heartbeat'])
+        # Порция могла удалить записи лент, архивные записи или подписки.
+        invalidate_feed_cache()
+        invalidate_cold_counts()
+        time.sleep(pause)
+
+    if task.target == DeletionTask.GROUP:
+        model = Group
+        for queryset in group_posts(task.object_id):
+            bulk_update_chunked(
+                queryset, chunk_size, progress=progress, group_id=None,
+            )
+    else:
+        model = User
+        for queryset in user_content(task.object_id):
+            bulk_delete_chunked(queryset, chunk_size, progress=progress)
+    queryset = model.objects.filter(pk=task.object_id)
+    for obj in queryset.using(write_db(queryset)):
+        obj.delete()
+    invalidate_feed_cache()
+    task.status = DeletionTask.DONE
+    task.finished = timezone.now()
+    task.save(update_fields=['status', 'finished'])
+    logger.info('%s удален, строк: %s', task, task.rows)
+
+    return True
+
+
+def process_deletions(chunk_size=DELETION_CHUNK_SIZE,
+                      pause=DELETION_CHUNK_PAUSE):
+    """Выполняет все незавершенные задачи удаления."""
+    tasks = DeletionTask.objects.exclude(status=DeletionTask.DONE)
+    done = 0
+    for task in tasks:
+        done += run_task(task, chunk_size, pause)
+
+    return done
+
+
+class DeletionWorker:
+    """Фоновый поток, выполняющий задачи удаления по сигналу wake()."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def wake(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run,
+                    name='deletion',
+                    daemon=True,
+                )
+                self.thread.start()
+        self.event.set()
+
+    def run(self):
+        # Чтения потока идут в основную базу: реплики могут отставать.
+        pin_to_primary()
+        while True:
+            self.event.wait()
+            self.event.clear()
+            try:
+                process_deletions()
+            except Exception:
+                logger.exception('Ошибка фонового удаления')
+            finally:
+                connections.close_all()
+
+
+deleter = DeletionWorker()
@@ -0,0 +1,86 @@
+import csv
+import json
+
+from .constants import EXPORT_CHUNK_SIZE
+from .models import Comment, Follow, Group, Post
+from .sharding import per_shard
+
+# Поля выгрузки: колонка и lookup, колонки совпадают с форматом
+# команды import_yatube.
+EXPORT_FIELDS = {
+    'group': (Group, (
+        ('title', 'title'),
+        ('slug', 'slug'),
+        ('description', 'description'),
+    )),
+    'post': (Post, (
+        ('text', 'text'),
+        ('pub_date', 'pub_date'),
+        ('author', 'author__username'),
+        ('group', 'group__slug'),
+        ('image', 'image'),
+    )),
+    'comment': (Comment, (
+        ('post', 'post_id'),
+        ('author', 'author__username'),
+        ('text', 'text'),
+        ('created', 'created'),
+    )),
+    'follow': (Follow, (
+        ('user', 'user__username'),
+        ('author', 'author__username'),
+    )),
+}
+
+
+class Echo:
+    """Псевдо-файл для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(model_name, chunk_size=EXPORT_CHUNK_SIZE):
+    """Выдает строки модели словарями, порциями по диапазону ключей.
+
+    Записи и комментарии выгружаются из всех шардов по очереди.
+    """
+    model, fields = EXPORT_FIELDS[model_name]
+    columns = ('id', *(column for column, _ in fields))
+    rows = model.objects.order_by('pk').values_list(
+        'id', *(lookup for _, lookup in fields)
+    )
+    if model in (Post, Comment):
+        shards = per_shard(rows)
+    else:
+        shards = [rows]
+    for rows in shards:
+        last_pk = 0
+        while True:
+            chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            for row in chunk:
+                yield dict(zip(columns, row))
+            last_pk = chunk[-1][0]
+
+
+def iter_ndjson(model_names, chunk_size=EXPORT_CHUNK_SIZE):
+    """Выгрузка моделей в NDJSON, по строке на объект."""
+    for model_name in model_names:
+        for row in iter_rows(model_name, chunk_size):
+            yield json.dumps(
+                {'model': model_name, **row},
+                ensure_ascii=False,
+                default=str,
+            ) + '\n'
+
+
+def iter_csv(model_name, chunk_size=EXPORT_CHUNK_SIZE):
+    """Выгрузка одной модели в CSV с заголовком."""
+    _, fields = EXPORT_FIELDS[model_name]
+    columns = ('id', *(column for column, _ in fields))
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in iter_rows(model_name, chunk_size):
+        yield writer.writerow(row[column] for column in columns)
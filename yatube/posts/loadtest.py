@@ -0,0 +1,172 @@
+import http.client
+import math
+import statistics
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.contrib.sessions.backends.db import SessionStore
+from django.urls import reverse
+
+
+def scenario_index(rng, data):
+    return 'GET', reverse('posts:index') + f'?page={rng.randint(1, 5)}', None
+
+
+def scenario_group_posts(rng, data):
+    slug = rng.choice(data['groups'])
+    return 'GET', reverse('posts:group_posts', kwargs={'slug': slug}), None
+
+
+def scenario_profile(rng, data):
+    username = rng.choice(data['usernames'])
+    return 'GET', reverse('posts:profile', kwargs={'username': username}), None
+
+
+def scenario_post_detail(rng, data):
+    post_id = rng.choice(data['posts'])
+    return 'GET', reverse(
+        'posts:post_detail', kwargs={'post_id': post_id},
+    ), None
+
+
+def scenario_follow_index(rng, data):
+    return 'GET', reverse('posts:follow_index'), None
+
+
+def scenario_post_create(rng, data):
+    return 'POST', reverse('posts:post_create'), {
+        'text': f'нагрузочный тест {rng.random()}',
+        'group': rng.choice(data['group_ids'] + [''])
+        if data['group_ids'] else '',
+    }
+
+
+def scenario_add_comment(rng, data):
+    post_id = rng.choice(data['posts'])
+    return 'POST', reverse(
+        'posts:add_comment', kwargs={'post_id': post_id},
+    ), {'text': 'нагрузочный комментарий'}
+
+
+def scenario_follow(rng, data):
+    view = rng.choice(('posts:profile_follow', 'posts:profile_unfollow'))
+    username = rng.choice(data['usernames'])
+    return 'GET', reverse(view, kwargs={'username': username}), None
+
+
+# Сценарий и данные, без которых он не может выполняться.
+SCENARIOS = {
+    'index': (scenario_index, ()),
+    'group_posts': (scenario_group_posts, ('groups',)),
+    'profile': (scenario_profile, ('usernames',)),
+    'post_detail': (scenario_post_detail, ('posts',)),
+    'follow_index': (scenario_follow_index, ()),
+    'post_create': (scenario_post_create, ()),
+    'add_comment': (scenario_add_comment, ('posts',)),
+    'follow': (scenario_follow, ('usernames',)),
+}
+
+
+def parse_mix(value):
+    """Смесь нагрузки из строки вида 'index=30,post_detail=20'."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f'Неизвестный сценарий: {name}.')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу для отсортированных values."""
+    if not values:
+        return None
+    return values[max(math.ceil(share * len(values)) - 1, 0)]
+
+
+def summarize(samples, seconds):
+    """Сводка по замерам (время, число запросов к БД, успех)."""
+    latencies = sorted(sample[0] for sample in samples)
+    queries = [sample[1] for sample in samples if sample[1] is not None]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(not sample[2] for sample in samples),
+        'throughput': round(len(samples) / seconds, 2),
+        'queries_per_request': (
+            round(statistics.mean(queries), 2) if queries else None
+        ),
+    }
+    for name, share in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        value = percentile(latencies, share)
+        summary[name] = None if value is None else round(value * 1000, 2)
+    return summary
+
+
+def compare(result, baseline, tolerance):
+    """Регрессии относительно базового прогона: список строк."""
+    regressions = []
+    for name, current in result['views'].items():
+        previous = baseline.get('views', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50', 'p95', 'p99', 'queries_per_request'):
+            old, new = previous.get(metric), current.get(metric)
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(f'{name}.{metric}: {old} -> {new}')
+        old, new = previous['throughput'], current['throughput']
+        if old and new < old * (1 - tolerance):
+            regressions.append(f'{name}.throughput: {old} -> {new}')
+        if current['errors'] > previous['errors']:
+            regressions.append(
+                f'{name}.errors: {previous["errors"]} -> {current["errors"]}'
+            )
+    return regressions
+
+
+def session_cookie(user):
+    """Сессия вошедшего пользователя, как у Client.force_login."""
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return session.session_key
+
+
+class HttpClient:
+    """Клиент HTTP с постоянным соединением и cookie сессии и CSRF."""
+
+    def __init__(self, base_url, session_key):
+        url = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(url.hostname, url.port)
+        self.cookies = SimpleCookie()
+        self.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        # Страница входа выдает cookie csrftoken для POST-запросов.
+        self.request('GET', reverse('users:login'))
+
+    def request(self, method, path, data=None):
+        headers = {'Cookie': '; '.join(
+            f'{key}={morsel.value}' for key, morsel in self.cookies.items()
+        )}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            if settings.CSRF_COOKIE_NAME in self.cookies:
+                headers['X-CSRFToken'] = (
+                    self.cookies[settings.CSRF_COOKIE_NAME].value
+                )
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in response.headers.get_all('Set-Cookie') or ():
+            self.cookies.load(header)
+        return response.status, response.headers
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.archive import archive_cutoff, archive_posts
+from posts.constants import ARCHIVE_AFTER_DAYS, BULK_CHUNK_SIZE
+from posts.utils import invalidate_feed_cache
+
+
+class Command(BaseCommand):
+    help = 'Перенос старых записей и комментариев к ним в архив.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=ARCHIVE_AFTER_DAYS,
+            help='Архивировать записи старше этого числа дней.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=BULK_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        posts, comments = archive_posts(
+            archive_cutoff(options['days']), options['chunk_size'],
+        )
+        if posts:
+            invalidate_feed_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f'В архив перенесено записей: {posts}, комментариев: '
+            f'{comments} за {time.monotonic() - started:.1f} с.'
+        ))
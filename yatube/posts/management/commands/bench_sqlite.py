@@ -0,0 +1,106 @@
+import random
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+PROFILES = {
+    'default': ({
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 0,
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'temp_store': 'DEFAULT',
+    }, 0),
+    'tuned': None,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Смешанная нагрузка чтения и записи на страницы Yatube с профилем '
+        'SQLite по умолчанию и с SQLITE_PRAGMAS и CONN_MAX_AGE из '
+        'настроек. Запускайте на копии базы данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        PROFILES['tuned'] = (settings.SQLITE_PRAGMAS, settings.CONN_MAX_AGE)
+        user, _ = User.objects.get_or_create(username='bench_sqlite')
+        post = Post.objects.create(author=user, text='бенчмарк')
+        try:
+            for profile in PROFILES:
+                self.run_profile(profile, user, post, options)
+                Comment.objects.filter(post=post).delete()
+        finally:
+            self.use_profile('tuned')
+            post.delete()
+
+    def use_profile(self, profile):
+        pragmas, conn_max_age = PROFILES[profile]
+        settings.SQLITE_PRAGMAS = pragmas
+        connections.databases['default']['CONN_MAX_AGE'] = conn_max_age
+        connection.close()
+        # Режим журнала хранится в файле базы, его нужно переключить явно.
+        journal_mode = pragmas.get('journal_mode', 'DELETE')
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+        connection.close()
+
+    def run_profile(self, profile, user, post, options):
+        self.use_profile(profile)
+        read_urls = (
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+            reverse('posts:profile', kwargs={'username': user.username}),
+            reverse('posts:follow_index'),
+        )
+        write_url = reverse('posts:add_comment', kwargs={'post_id': post.id})
+        latencies, errors = [], []
+        deadline = time.monotonic() + options['seconds']
+
+        def worker():
+            client = Client()
+            client.force_login(user)
+            try:
+                while time.monotonic() < deadline:
+                    started = time.monotonic()
+                    if random.random() < options['write_ratio']:
+                        client.post(write_url, {'text': 'нагрузка'})
+                    else:
+                        client.get(random.choice(read_urls))
+                    latencies.append(time.monotonic() - started)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        latencies.sort()
+        self.stdout.write(
+            f'{profile}: {len(latencies) / options["seconds"]:.0f} '
+            f'запросов/с, p50 {statistics.median(latencies) * 1000:.1f} мс, '
+            f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} мс, '
+            f'ошибок: {len(errors)}'
+        )
@@ -0,0 +1,67 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts.models import Comment, Post
+from posts.write_behind import WriteBehindQueue
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Пропускная способность записи комментариев параллельными '
+        'пользователями: по одной транзакции и через write-behind. '
+        'Запускайте на копии базы данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--comments', type=int, default=200,
+                            help='Комментариев на поток.')
+
+    def handle(self, *args, **options):
+        user, _ = User.objects.get_or_create(username='bench_commenter')
+        post = Post.objects.create(author=user, text='бенчмарк')
+        try:
+            for mode in ('direct', 'write_behind'):
+                self.run_mode(mode, user, post, options)
+        finally:
+            post.delete()
+
+    def run_mode(self, mode, user, post, options):
+        write_behind = WriteBehindQueue()
+        errors = []
+
+        def commenter():
+            try:
+                for _ in range(options['comments']):
+                    comment = Comment(post=post, author=user, text='текст')
+                    if mode == 'direct':
+                        comment.save()
+                    else:
+                        write_behind.submit(comment)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=commenter)
+            for _ in range(options['threads'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        written = post.comments.count()
+        post.comments.all().delete()
+        self.stdout.write(
+            f'{mode}: {written} комментариев за {elapsed:.2f} с, '
+            f'{written / elapsed:.0f} в секунду, ошибок: {len(errors)}'
+        )
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmarks import BENCHMARKS, compare, run_benchmarks
+from posts.constants import BENCHMARK_REPEAT, BENCHMARK_TOLERANCE
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарки горячих функций и шаблонов: пагинатор, шаблон '
+        'записи, формы, фильтр addclass, контекстный процессор year. '
+        '--baseline сравнивает с сохраненным прогоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*', metavar='name',
+            help=f'Бенчмарки из: {", ".join(BENCHMARKS)}. По умолчанию все.',
+        )
+        parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT)
+        parser.add_argument(
+            '--number', type=int,
+            help='Вызовов в повторе; по умолчанию подбирается автоматически.',
+        )
+        parser.add_argument('--output', help='Файл для JSON результата.')
+        parser.add_argument('--baseline', help='JSON прошлого прогона.')
+        parser.add_argument(
+            '--tolerance', type=float, default=BENCHMARK_TOLERANCE,
+        )
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные бенчмарки: {", ".join(sorted(unknown))}.'
+            )
+        result = run_benchmarks(names, options['repeat'], options['number'])
+        for name, row in result['benchmarks'].items():
+            self.stdout.write(
+                f'{name:<20} {row["min_us"]:>12.3f} мкс '
+                f'(медиана {row["median_us"]:.3f}, '
+                f'{row["repeat"]}x{row["number"]})'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(result, output, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = compare(
+                    result, json.load(baseline), options['tolerance'],
+                )
+            if regressions:
+                raise CommandError(
+                    'Замедления:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Замедлений нет.'))
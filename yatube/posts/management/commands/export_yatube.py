@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.constants import EXPORT_CHUNK_SIZE
+from posts.export import EXPORT_FIELDS, iter_csv, iter_ndjson
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка групп, постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'models', nargs='*', metavar='model',
+            help=f'Модели из: {", ".join(EXPORT_FIELDS)}. По умолчанию все.',
+        )
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'), default='ndjson',
+        )
+        parser.add_argument('--output', help='Файл (по умолчанию stdout).')
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        models = options['models'] or list(EXPORT_FIELDS)
+        unknown = set(models) - set(EXPORT_FIELDS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные модели: {", ".join(sorted(unknown))}.'
+            )
+        if options['format'] == 'csv':
+            if len(models) != 1:
+                raise CommandError('В CSV выгружается ровно одна модель.')
+            lines = iter_csv(models[0], options['chunk_size'])
+        else:
+            lines = iter_ndjson(models, options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(lines)
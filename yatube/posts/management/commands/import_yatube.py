@@ -0,0 +1,410 @@
+import csv
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from posts.constants import IMPORT_BATCH_SIZE
+from posts.models import (ArchivedPost, Comment, Follow, Group, Post,
+                          PostTicket)
+from posts.seed import explicit_dates
+from posts.sharding import (allocate_post_id, is_sharded, per_shard,
+                            shard_for_author)
+
+User = get_user_model()
+
+MODELS = {
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+
+# Обязательные колонки и колонки, проверяемые полями моделей.
+REQUIRED = {
+    'group': ('title', 'slug'),
+    'post': ('text', 'author'),
+    'comment': ('post', 'author', 'text'),
+    'follow': ('user', 'author'),
+}
+FIELDS = {
+    'group': {
+        'title': Group._meta.get_field('title'),
+        'slug': Group._meta.get_field('slug'),
+    },
+    'post': {
+        'id': Post._meta.pk,
+        'text': Post._meta.get_field('text'),
+        'pub_date': Post._meta.get_field('pub_date'),
+    },
+    'comment': {
+        'post': Post._meta.pk,
+        'text': Comment._meta.get_field('text'),
+        'created': Comment._meta.get_field('created'),
+    },
+    'follow': {},
+}
+
+
+def store_image(path):
+    """Копирует файл картинки в хранилище, возвращает имя в хранилище."""
+    if not path:
+        return ''
+    with open(path, 'rb') as image:
+        return default_storage.save(
+            os.path.join('posts', os.path.basename(path)),
+            File(image),
+        )
+
+
+class IdMap:
+    """Кеш соответствия естественных ключей (username, slug) и id."""
+
+    def __init__(self, queryset, field):
+        self.queryset = queryset
+        self.field = field
+        self.ids = {}
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key and key not in self.ids}
+        if missing:
+            self.ids.update(
+                self.queryset.filter(
+                    **{f'{self.field}__in': missing}
+                ).values_list(self.field, 'id')
+            )
+
+    def get(self, key):
+        return self.ids.get(key)
+
+
+def parse_json(line):
+    """Объект из строки JSONL, None для испорченной строки."""
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None
+    return row if isinstance(row, dict) else None
+
+
+def read_rows(path, file_format, model):
+    """Построчно читает JSONL или CSV, не загружая файл в память.
+
+    Выдает номер записи в файле, модель и строку (None, если строку не
+    удалось разобрать).
+    """
+    with open(path, encoding='utf-8', newline='') as source:
+        if file_format == 'csv':
+            rows = csv.DictReader(source)
+        else:
+            rows = (parse_json(line) for line in source if line.strip())
+        for number, row in enumerate(rows, start=1):
+            if row is None:
+                yield number, model, None
+            else:
+                yield number, row.pop('model', None) or model, row
+
+
+def clean_row(model, row):
+    """Проверяет строку и приводит значения к типам полей.
+
+    Ошибка - ValidationError с названием колонки.
+    """
+    for column in REQUIRED[model]:
+        if row.get(column) in (None, ''):
+            raise ValidationError(f'нет {column}')
+        if column not in FIELDS[model]:
+            row[column] = str(row[column])
+    for column, field in FIELDS[model].items():
+        if row.get(column) in (None, ''):
+            continue
+        try:
+            value = field.clean(row[column], None)
+        except ValidationError:
+            raise ValidationError(f'некорректное {column}')
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        row[column] = value
+    return row
+
+
+class Command(BaseCommand):
+    help = 'Потоковый импорт групп, постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--format', choices=('jsonl', 'csv'))
+        parser.add_argument('--model', choices=tuple(MODELS))
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--image-workers', type=int, default=0,
+            help='Число процессов для копирования картинок.',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        self.users = IdMap(User.objects.all(), 'username')
+        self.groups = IdMap(Group.objects.all(), 'slug')
+        self.batches = {model: [] for model in MODELS}
+        self.imported = self.skipped = 0
+        self.reasons = Counter()
+        self.executor = None
+        if options['image_workers']:
+            self.executor = ProcessPoolExecutor(options['image_workers'])
+        self.started = time.monotonic()
+        try:
+            for path in options['paths']:
+                file_format = options['format'] or (
+                    'csv' if path.endswith('.csv') else 'jsonl'
+                )
+                for number, model, row in read_rows(
+                    path, file_format, options['model']
+                ):
+                    self.add(f'{path}:{number}', model, row)
+            self.flush()
+        finally:
+            if self.executor:
+                self.executor.shutdown()
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {self.imported}, пропущено {self.skipped} '
+            f'за {elapsed:.1f} с ({self.imported / (elapsed or 1):.0f} '
+            f'строк/с).'
+        ))
+        for reason, count in self.reasons.most_common():
+            self.stdout.write(f'  {reason}: {count}')
+
+    def add(self, source, model, row):
+        """Проверяет строку и добавляет в порцию, полную порцию сохраняет."""
+        if row is None:
+            self.skip(source, 'строка не разобрана')
+            return
+        if model not in self.batches:
+            raise CommandError(f'Неизвестная модель: {model}')
+        try:
+            row = clean_row(model, row)
+        except ValidationError as error:
+            self.skip(source, error.messages[0])
+            return
+        row['source'] = source
+        self.batches[model].append(row)
+        if len(self.batches[model]) >= self.batch_size:
+            self.flush()
+
+    def skip(self, source, reason):
+        """Учитывает пропущенную строку, source - файл и номер записи."""
+        self.skipped += 1
+        self.reasons[reason] += 1
+        if self.verbosity > 1:
+            self.stderr.write(f'{source}: {reason}')
+
+    def keep(self, rows, check, reason):
+        """Строки, прошедшие check, остальные пропускаются с reason."""
+        kept = []
+        for row in rows:
+            if check(row):
+                kept.append(row)
+            else:
+                self.skip(row['source'], reason)
+        return kept
+
+    def flush(self):
+        """Сохраняет накопленные порции в порядке зависимостей."""
+        for model in MODELS:
+            rows, self.batches[model] = self.batches[model], []
+            if not rows:
+                continue
+            objects = getattr(self, f'build_{model}s')(rows)
+            with explicit_dates(
+                Post._meta.get_field('pub_date'),
+                Comment._meta.get_field('created'),
+            ):
+                self.save(model, objects)
+            self.imported += len(objects)
+            if self.verbosity > 1:
+                elapsed = time.monotonic() - self.started
+                self.stdout.write(
+                    f'{model}: {self.imported} строк, '
+                    f'{self.imported / (elapsed or 1):.0f} строк/с'
+                )
+
+    def save(self, model, objects):
+        """Записи и комментарии - в шарды авторов, группы - во все шарды.
+
+        bulk_create не вызывает сигналов, поэтому маршрутизация и
+        копирование групп, которые делают ShardRouter и replicate,
+        повторены здесь.
+        """
+        databases = defaultdict(list)
+        for obj in objects:
+            if model == 'post':
+                databases[shard_for_author(obj.author_id)].append(obj)
+            elif model == 'comment':
+                databases[self.post_shards[obj.post_id]].append(obj)
+            else:
+                databases['default'].append(obj)
+        for db, db_objects in databases.items():
+            with transaction.atomic(using=db):
+                MODELS[model].objects.using(db).bulk_create(
+                    db_objects,
+                    batch_size=self.batch_size,
+                    ignore_conflicts=model == 'follow',
+                )
+        if model == 'group' and objects and is_sharded():
+            groups = list(Group.objects.filter(
+                slug__in=[group.slug for group in objects],
+            ))
+            for alias in settings.POST_SHARDS[1:]:
+                Group.objects.using(alias).bulk_create(
+                    groups, ignore_conflicts=True,
+                )
+
+    def free_post_ids(self, rows):
+        """Строки, id которых еще не заняты записями.
+
+        При шардировании номера из файла резервируются в PostTicket,
+        чтобы allocate_post_id не выдал их новым записям.
+        """
+        ids = {row['id'] for row in rows if row.get('id')}
+        if is_sharded():
+            taken = set(PostTicket.objects.filter(
+                pk__in=ids,
+            ).values_list('pk', flat=True))
+        else:
+            taken = {
+                *Post.objects.filter(pk__in=ids).values_list('pk', flat=True),
+                *ArchivedPost.objects.filter(pk__in=ids).values_list(
+                    'pk', flat=True,
+                ),
+            }
+
+        def free(row):
+            if not row.get('id'):
+                return True
+            if row['id'] in taken:
+                return False
+            taken.add(row['id'])
+            return True
+
+        rows = self.keep(rows, free, 'id записи занят')
+        if is_sharded():
+            PostTicket.objects.bulk_create(
+                PostTicket(pk=row['id']) for row in rows if row.get('id')
+            )
+        return rows
+
+    def build_groups(self, rows):
+        self.groups.resolve(row['slug'] for row in rows)
+        slugs = set()
+
+        def new(row):
+            if self.groups.get(row['slug']) or row['slug'] in slugs:
+                return False
+            slugs.add(row['slug'])
+            return True
+
+        rows = self.keep(rows, new, 'группа с таким slug уже есть')
+        return [
+            Group(
+                title=row['title'],
+                slug=row['slug'],
+                description=row.get('description') or '',
+            )
+            for row in rows
+        ]
+
+    def build_posts(self, rows):
+        self.users.resolve(row['author'] for row in rows)
+        self.groups.resolve(row.get('group') for row in rows)
+        rows = self.keep(
+            rows, lambda row: self.users.get(row['author']),
+            'неизвестный автор',
+        )
+        rows = self.free_post_ids(rows)
+        paths = [row.get('image') or '' for row in rows]
+        if self.executor:
+            images = list(self.executor.map(store_image, paths))
+        else:
+            images = [store_image(path) for path in paths]
+        now = timezone.now()
+        posts = [
+            Post(
+                id=row.get('id') or None,
+                text=row['text'],
+                pub_date=row.get('pub_date') or now,
+                author_id=self.users.get(row['author']),
+                group_id=self.groups.get(row.get('group')),
+                image=image,
+            ).prerender()
+            for row, image in zip(rows, images)
+        ]
+        if is_sharded():
+            for post in posts:
+                allocate_post_id(Post, post)
+        return posts
+
+    def build_comments(self, rows):
+        self.users.resolve(row['author'] for row in rows)
+        self.post_shards = {}
+        for queryset in per_shard(Post.objects.filter(
+            pk__in={row['post'] for row in rows}
+        )):
+            self.post_shards.update(
+                (pk, shard_for_author(author_id))
+                for pk, author_id in queryset.values_list('pk', 'author_id')
+            )
+        rows = self.keep(
+            rows, lambda row: self.users.get(row['author']),
+            'неизвестный автор',
+        )
+        rows = self.keep(
+            rows, lambda row: row['post'] in self.post_shards,
+            'нет записи',
+        )
+        now = timezone.now()
+        return [
+            Comment(
+                post_id=row['post'],
+                author_id=self.users.get(row['author']),
+                text=row['text'],
+                created=row.get('created') or now,
+            )
+            for row in rows
+        ]
+
+    def build_follows(self, rows):
+        self.users.resolve(row['user'] for row in rows)
+        self.users.resolve(row['author'] for row in rows)
+        rows = self.keep(
+            rows,
+            lambda row: (
+                self.users.get(row['user']) and self.users.get(row['author'])
+            ),
+            'неизвестный пользователь',
+        )
+        rows = self.keep(
+            rows, lambda row: row['user'] != row['author'],
+            'подписка на себя',
+        )
+        return [
+            Follow(
+                user_id=self.users.get(row['user']),
+                author_id=self.users.get(row['author']),
+            )
+            for row in rows
+        ]
@@ -0,0 +1,289 @@
+import json
+import os
+import random
+import resource
+import threading
+import time
+import uuid
+from socketserver import ThreadingMixIn
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.db.models import Q
+from django.test import Client
+
+from core.queries import QueryRecorder
+from posts.constants import (LOADTEST_MIX, LOADTEST_SAMPLE_SIZE,
+                             LOADTEST_TOLERANCE)
+from posts.loadtest import (SCENARIOS, HttpClient, compare, parse_mix,
+                            session_cookie, summarize)
+from posts.models import Comment, Follow, Group, Post
+from posts.utils import bulk_delete_chunked, invalidate_feed_cache
+
+User = get_user_model()
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def rss_mb(pid='self'):
+    """Текущая память процесса (VmRSS) в МБ."""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест страниц Yatube со смесью сценариев: в процессе '
+        'через тестовый клиент или по HTTP на WSGI-сервер. Результат - '
+        'JSON с p50/p95/p99, пропускной способностью, запросами к БД и '
+        'памятью; --baseline сравнивает с прошлым прогоном.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000. '
+                 'Сервер должен работать с одноразовой копией базы: после '
+                 'теста популярность откатывается к снимку, сделанному до '
+                 'него, вместе с изменениями реальных пользователей.',
+        )
+        parser.add_argument(
+            '--serve', action='store_true',
+            help='Поднять многопоточный WSGI-сервер в этом процессе.',
+        )
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument(
+            '--mix',
+            default=','.join(f'{k}={v}' for k, v in LOADTEST_MIX.items()),
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--pids', default='',
+            help='pid воркеров сервера через запятую для замера памяти.',
+        )
+        parser.add_argument('--output', help='Файл для JSON результата.')
+        parser.add_argument('--baseline', help='JSON прошлого прогона.')
+        parser.add_argument(
+            '--tolerance', type=float, default=LOADTEST_TOLERANCE,
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не удалять пользователей теста и их записи, комментарии '
+                 'и подписки, не откатывать популярность.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+        data = self.sample_data()
+        mix = {
+            name: weight for name, weight in mix.items()
+            if all(data[key] for key in SCENARIOS[name][1])
+        }
+        if not mix:
+            raise CommandError('Нет данных ни для одного сценария.')
+        # Новые пользователи на каждый прогон: удаляются только они.
+        run = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(username=f'loadtest_{run}_{number}')
+            for number in range(options['concurrency'])
+        ]
+        scores = self.trending_scores(data)
+        server = None
+        target = options['url'] or 'client'
+        if options['url'] and not options['keep']:
+            self.stderr.write(
+                'Популярность будет откачена к снимку до теста: --url '
+                'должен указывать на сервер с одноразовой базой.'
+            )
+        if options['serve']:
+            server = ThreadingServer(('127.0.0.1', 0), QuietHandler)
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            target = f'http://127.0.0.1:{server.server_port}'
+        try:
+            samples = self.run_load(target, users, mix, data, options)
+        finally:
+            if server:
+                server.shutdown()
+            if not options['keep']:
+                self.cleanup(users, scores)
+        result = self.report(target, mix, samples, options)
+        text = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(text)
+        self.stdout.write(text)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = compare(
+                    result, json.load(baseline), options['tolerance'],
+                )
+            if regressions:
+                raise CommandError(
+                    'Регрессии:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+
+    def sample_data(self):
+        size = LOADTEST_SAMPLE_SIZE
+        groups = list(Group.objects.values_list('slug', 'id')[:size])
+        return {
+            'posts': list(Post.objects.order_by('-id').values_list(
+                'id', flat=True,
+            )[:size]),
+            'usernames': list(User.objects.exclude(
+                username__startswith='loadtest_',
+            ).values_list('username', flat=True)[:size]),
+            'groups': [slug for slug, _ in groups],
+            'group_ids': [group_id for _, group_id in groups],
+        }
+
+    def trending_scores(self, data):
+        """Популярность строк, которые могут поднять сценарии теста.
+
+        Комментарии поднимают записи из выборки, подписки - последнюю
+        запись автора из выборки; вместе с записями поднимаются группы.
+        """
+        posts = Post.objects.filter(
+            Q(pk__in=data['posts'])
+            | Q(author__username__in=data['usernames'])
+        )
+        return [
+            (queryset, dict(queryset.values_list('pk', 'trending_score')))
+            for queryset in (posts, Group.objects.all())
+        ]
+
+    def run_load(self, target, users, mix, data, options):
+        samples = {name: [] for name in mix}
+        deadline = time.monotonic() + options['seconds']
+        if len(users) == 1:
+            # Без потоков: так команда работает и внутри транзакции теста.
+            self.work(target, 0, users[0], mix, data, options['seed'],
+                      deadline, samples)
+            return samples
+        failures = []
+
+        def run(number, user):
+            try:
+                self.work(target, number, user, mix, data, options['seed'],
+                          deadline, samples)
+            except Exception as error:
+                failures.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=run, args=(number, user))
+            for number, user in enumerate(users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if failures:
+            raise CommandError(f'Ошибка в потоке нагрузки: {failures[0]!r}')
+
+        return samples
+
+    def work(self, target, number, user, mix, data, seed, deadline, samples):
+        """Цикл одного клиента: сценарии по весам до истечения времени."""
+        rng = random.Random(f'{seed}:{number}')
+        names, weights = list(mix), list(mix.values())
+        if target == 'client':
+            client = Client()
+            client.force_login(user)
+        else:
+            client = HttpClient(target, session_cookie(user))
+        try:
+            while time.monotonic() < deadline:
+                name = rng.choices(names, weights)[0]
+                method, path, payload = SCENARIOS[name][0](rng, data)
+                started = time.perf_counter()
+                status, queries = self.send(client, method, path, payload)
+                samples[name].append((
+                    time.perf_counter() - started, queries, status < 400,
+                ))
+        finally:
+            if target != 'client':
+                client.close()
+
+    def send(self, client, method, path, payload):
+        """Отправляет запрос, возвращает статус и число запросов к БД."""
+        if isinstance(client, HttpClient):
+            status, headers = client.request(method, path, payload)
+            queries = headers.get('X-Query-Count')
+            return status, queries and int(queries)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            if method == 'POST':
+                response = client.post(path, payload)
+            else:
+                response = client.get(path)
+        return response.status_code, recorder.queries
+
+    def report(self, target, mix, samples, options):
+        seconds = options['seconds']
+        everything = [sample for rows in samples.values() for sample in rows]
+        memory = {'self': rss_mb()}
+        for pid in filter(None, options['pids'].split(',')):
+            memory[pid.strip()] = rss_mb(pid.strip())
+        return {
+            'target': target if target == 'client' else 'http',
+            'concurrency': options['concurrency'],
+            'seconds': seconds,
+            'mix': mix,
+            'total': summarize(everything, seconds),
+            'views': {
+                name: summarize(rows, seconds)
+                for name, rows in samples.items()
+            },
+            'memory_mb': memory,
+            'max_rss_mb': round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1,
+            ),
+            'pid': os.getpid(),
+        }
+
+    def cleanup(self, users, scores):
+        """Удаляет следы теста и возвращает популярность к исходной.
+
+        Удаляются только пользователи, созданные этим прогоном. Для
+        популярности восстанавливается снимок до теста: события теста
+        нельзя отделить от событий других клиентов той же базы.
+        """
+        for queryset in (
+            Comment.objects.filter(author__in=users),
+            Post.objects.filter(author__in=users),
+            Follow.objects.filter(user__in=users),
+        ):
+            bulk_delete_chunked(queryset)
+        for queryset, before in scores:
+            after = queryset.values_list('pk', 'trending_score')
+            for pk, score in after:
+                if pk in before and before[pk] != score:
+                    queryset.model.objects.filter(pk=pk).update(
+                        trending_score=before[pk],
+                    )
+        # Каскадом удаляются и отметки FollowChange, и рекомендации.
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        invalidate_feed_cache()
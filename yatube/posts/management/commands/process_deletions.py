@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.constants import DELETION_CHUNK_PAUSE, DELETION_CHUNK_SIZE
+from posts.deletion import process_deletions
+
+
+class Command(BaseCommand):
+    help = 'Удаление пользователей и групп из очереди порциями.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=DELETION_CHUNK_SIZE,
+        )
+        parser.add_argument(
+            '--pause', type=float, default=DELETION_CHUNK_PAUSE,
+            help='Пауза между порциями, секунды.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        done = process_deletions(options['chunk_size'], options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач удаления: {done} '
+            f'за {time.monotonic() - started:.1f} с.'
+        ))
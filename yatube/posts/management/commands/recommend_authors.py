@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.constants import RECOMMENDATIONS_BATCH_SIZE, RECOMMENDATIONS_TOP_K
+from posts.recommendations import (refresh_changed_recommendations,
+                                   refresh_recommendations)
+
+
+class Command(BaseCommand):
+    help = 'Расчет рекомендаций "на кого подписаться" по графу подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Только пользователи с изменившимися подписками.',
+        )
+        parser.add_argument(
+            '--top-k', type=int, default=RECOMMENDATIONS_TOP_K,
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RECOMMENDATIONS_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['incremental']:
+            refreshed = refresh_changed_recommendations(
+                options['top_k'], options['batch_size'],
+            )
+        else:
+            refreshed = refresh_recommendations(
+                top_k=options['top_k'], batch_size=options['batch_size'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации пересчитаны для {refreshed} пользователей '
+            f'за {time.monotonic() - started:.1f} с.'
+        ))
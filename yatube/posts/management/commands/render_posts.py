@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.constants import BULK_CHUNK_SIZE
+from posts.models import ArchivedPost, Post
+from posts.utils import chunked_pks, invalidate_feed_cache, render_post_text
+
+RENDERED_FIELDS = ('text_html', 'excerpt')
+
+
+def render_chunk(model, alias, chunk):
+    """Рендерит HTML и отрывки порции записей одной транзакцией."""
+    objects = model.objects.using(alias)
+    posts = [
+        model(pk=pk, text=text, **dict(zip(
+            RENDERED_FIELDS, render_post_text(text),
+        )))
+        for pk, text in objects.filter(pk__in=chunk).values_list('pk', 'text')
+    ]
+    with transaction.atomic(using=alias):
+        objects.bulk_update(posts, RENDERED_FIELDS)
+    return len(posts)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет HTML текста и отрывки записей, сохраненных до их '
+        'появления, в том числе в шардах и архиве.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перерендерить все записи, а не только незаполненные.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=BULK_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        targets = [(Post, alias) for alias in settings.POST_SHARDS]
+        targets.append((ArchivedPost, 'default'))
+        total = 0
+        for model, alias in targets:
+            queryset = model.objects.using(alias)
+            if not options['all']:
+                queryset = queryset.filter(text_html='')
+            for chunk in chunked_pks(queryset, options['chunk_size']):
+                total += render_chunk(model, alias, chunk)
+                self.stdout.write(f'{model.__name__} ({alias}): {total}')
+        if total:
+            invalidate_feed_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f'Отрендерено записей: {total} за '
+            f'{time.monotonic() - started:.1f} с.'
+        ))
@@ -0,0 +1,241 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.constants import (SEED_CHUNK_SIZE, SEED_COMMENTS_PER_POST,
+                             SEED_DAYS, SEED_FOLLOWS_PER_USER, SEED_GROUPS,
+                             SEED_PENDING_PER_WORKER, SEED_POSTS, SEED_USERS)
+from posts.models import Comment, Follow, Group, Post
+from posts.seed import (explicit_dates, follows_chunk, groups_chunk,
+                        posts_chunk, users_chunk)
+from posts.utils import invalidate_feed_cache
+
+User = get_user_model()
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def chunks(total, chunk_size):
+    """Номер, начало и размер каждой порции."""
+    for index, first in enumerate(range(0, total, chunk_size)):
+        yield index, first, min(chunk_size, total - first)
+
+
+class Command(BaseCommand):
+    help = (
+        'Синтетические данные продакшен-масштаба: пользователи, группы, '
+        'записи, комментарии и подписки со степенным распределением. '
+        'Результат определяется --seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=SEED_USERS)
+        parser.add_argument('--groups', type=int, default=SEED_GROUPS)
+        parser.add_argument('--posts', type=int, default=SEED_POSTS)
+        parser.add_argument(
+            '--comments', type=float, default=SEED_COMMENTS_PER_POST,
+            help='Среднее число комментариев к записи.',
+        )
+        parser.add_argument(
+            '--follows', type=float, default=SEED_FOLLOWS_PER_USER,
+            help='Среднее число подписок пользователя.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=SEED_DAYS,
+            help='Записи распределяются по этому числу дней до --until.',
+        )
+        parser.add_argument(
+            '--until',
+            help='Дата последней записи (ISO), по умолчанию сейчас. '
+                 'Для повторяемых дат задайте явно.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессы для генерации текста; запись идет в основном.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=SEED_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        until = timezone.now()
+        if options['until']:
+            until = (
+                parse_datetime(options['until'])
+                or parse_datetime(f'{options["until"]}T00:00')
+            )
+            if until is None:
+                raise CommandError('--until: ожидается дата ISO 8601.')
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        self.options = options
+        started = time.monotonic()
+        workers = options['workers']
+        executor = ProcessPoolExecutor(workers) if workers > 1 else None
+        self.executor = executor
+        self.window = workers * SEED_PENDING_PER_WORKER
+        try:
+            self.users = self.seed_users()
+            self.groups = self.seed_groups()
+            posts, comments = self.seed_posts(until)
+            follows = self.seed_follows()
+        finally:
+            if executor:
+                executor.shutdown()
+        invalidate_feed_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {options["users"]}, групп '
+            f'{options["groups"]}, записей {posts}, комментариев '
+            f'{comments}, подписок {follows} за '
+            f'{time.monotonic() - started:.1f} с.'
+        ))
+
+    def run(self, func, tasks):
+        """Порции генерируются параллельно и приходят в исходном порядке.
+
+        В работе и в ожидании записи не больше window порций: отправлять
+        все задачи сразу значит держать в памяти весь набор данных, если
+        база пишет медленнее, чем генерируют процессы.
+        """
+        if self.executor is None:
+            yield from (func(*task) for task in tasks)
+            return
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= self.window:
+                yield pending.popleft().result()
+            pending.append(self.executor.submit(func, *task))
+        while pending:
+            yield pending.popleft().result()
+
+    def progress(self, kind, done, total):
+        self.stdout.write(f'{kind}: {done}/{total}')
+
+    def seed_users(self):
+        total = self.options['users']
+        seed, size = self.options['seed'], self.options['chunk_size']
+        first_id = next_id(User)
+        # Один хеш на всех: хеширование пароля - самая медленная часть.
+        password = make_password('yatube', salt=f'seed{seed}')
+        tasks = [
+            (seed, index, first, count)
+            for index, first, count in chunks(total, size)
+        ]
+        for (_, _, first, count), rows in zip(
+            tasks, self.run(users_chunk, tasks),
+        ):
+            User.objects.bulk_create(
+                User(
+                    id=first_id + first + number,
+                    username=username,
+                    first_name=first_name,
+                    last_name=last_name,
+                    password=password,
+                )
+                for number, (username, first_name, last_name)
+                in enumerate(rows)
+            )
+            self.progress('Пользователи', first + count, total)
+
+        return range(first_id, first_id + total)
+
+    def seed_groups(self):
+        total = self.options['groups']
+        seed, size = self.options['seed'], self.options['chunk_size']
+        first_id = next_id(Group)
+        tasks = [
+            (seed, index, first_id + first, count)
+            for index, first, count in chunks(total, size)
+        ]
+        for (_, _, first, count), rows in zip(
+            tasks, self.run(groups_chunk, tasks),
+        ):
+            Group.objects.bulk_create(
+                Group(id=first + number, title=title, slug=slug,
+                      description=description)
+                for number, (title, slug, description) in enumerate(rows)
+            )
+
+        return range(first_id, first_id + total)
+
+    def seed_posts(self, until):
+        total = self.options['posts']
+        seed, size = self.options['seed'], self.options['chunk_size']
+        span = timedelta(days=self.options['days'])
+        begin = until - span
+        first_id = next_id(Post)
+        tasks = [
+            (
+                seed, index, count, len(self.users), len(self.groups),
+                begin + span * first / total, span * count / total,
+                self.options['comments'],
+            )
+            for index, first, count in chunks(total, size)
+        ]
+        posts = comments = 0
+        with explicit_dates(
+            Post._meta.get_field('pub_date'),
+            Comment._meta.get_field('created'),
+        ):
+            for post_rows, comment_rows in self.run(posts_chunk, tasks):
+                with transaction.atomic():
+                    Post.objects.bulk_create(
+                        Post(
+                            id=first_id + posts + number,
+                            text=text,
+                            pub_date=pub_date,
+                            author_id=self.users[author],
+                            group_id=(
+                                None if group is None else self.groups[group]
+                            ),
+                        ).prerender()
+                        for number, (text, pub_date, author, group)
+                        in enumerate(post_rows)
+                    )
+                    Comment.objects.bulk_create(
+                        Comment(
+                            post_id=first_id + posts + number,
+                            author_id=self.users[author],
+                            text=text,
+                            created=created,
+                        )
+                        for number, author, text, created in comment_rows
+                    )
+                posts += len(post_rows)
+                comments += len(comment_rows)
+                self.progress('Записи', posts, total)
+
+        return posts, comments
+
+    def seed_follows(self):
+        seed, size = self.options['seed'], self.options['chunk_size']
+        users = len(self.users)
+        tasks = [
+            (seed, index, first, count, users, self.options['follows'])
+            for index, first, count in chunks(users, size)
+        ]
+        follows = 0
+        for rows in self.run(follows_chunk, tasks):
+            Follow.objects.bulk_create(
+                (Follow(user_id=self.users[user], author_id=self.users[author])
+                 for user, author in rows),
+                ignore_conflicts=True,
+            )
+            follows += len(rows)
+
+        return follows
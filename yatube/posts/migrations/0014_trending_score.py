@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='trending_score',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='Популярность'),
+        ),
+    ]
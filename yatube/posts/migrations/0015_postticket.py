@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTicket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Номер записи',
+                'verbose_name_plural': 'Номера записей',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('user', 'Пользователь'), ('group', 'Группа')], max_length=10, verbose_name='Объект')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Обработано строк')),
+            ],
+            options={
+                'verbose_name': 'Удаление',
+                'verbose_name_plural': 'Удаления',
+                'ordering': ('created',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='deletiontask',
+            constraint=models.UniqueConstraint(fields=('target', 'object_id'), name='unique_deletion_task'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-19 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_text_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='followchange',
+            name='changed',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменено'),
+        ),
+    ]
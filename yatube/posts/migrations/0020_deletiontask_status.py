@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-19 12:05
+
+from django.db import migrations, models
+
+
+def mark_finished_done(apps, schema_editor):
+    DeletionTask = apps.get_model('posts', 'DeletionTask')
+    DeletionTask.objects.filter(finished__isnull=False).update(status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_followchange_changed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deletiontask',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Последняя порция'),
+        ),
+        migrations.AddField(
+            model_name='deletiontask',
+            name='status',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершено')], db_index=True, default='pending', max_length=10, verbose_name='Состояние'),
+        ),
+        migrations.RunPython(mark_finished_done, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,28 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router
+from django.utils import timezone
 
-from .constants import CHARS_PER_STR_VIEW
+from .constants import CHARS_PER_STR_VIEW, POST_EXCERPT_CHARS
+from .utils import render_post_text
 
 User = get_user_model()
 
 
+class RoutedManager(models.Manager):
+    """Менеджер, чей create() отдает выбор базы роутеру по объекту.
+
+    Обычный create() вызывает save(using=...), и шардированная модель
+    попадала бы в базу по умолчанию, а не в шард автора.
+    """
+
+    def create(self, **kwargs):
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
 class Group(models.Model):
     """Группы для постов."""
 
@@ -20,6 +37,13 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание',
     )
+    trending_score = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Популярность',
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -36,6 +60,17 @@ class Post(models.Model):
         verbose_name='Текст',
         help_text='Текст нового поста',
     )
+    text_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Текст в HTML',
+    )
+    excerpt = models.CharField(
+        max_length=POST_EXCERPT_CHARS,
+        blank=True,
+        editable=False,
+        verbose_name='Отрывок',
+    )
     pub_date = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата',
@@ -60,6 +95,15 @@ class Post(models.Model):
         blank=True,
         verbose_name='Картинка',
     )
+    trending_score = models.FloatField(
+        null=True,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Популярность',
+    )
+
+    objects = RoutedManager()
 
     class Meta:
         ordering = ('-pub_date',)
@@ -69,6 +113,19 @@ class Post(models.Model):
     def __str__(self):
         return self.text[:CHARS_PER_STR_VIEW]
 
+    def prerender(self):
+        """Рендерит HTML текста и отрывок для шаблонов.
+
+        save() делает это сам; bulk_create его обходит, поэтому массовые
+        вставки вызывают prerender() явно.
+        """
+        self.text_html, self.excerpt = render_post_text(self.text)
+        return self
+
+    def save(self, *args, **kwargs):
+        self.prerender()
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     """Комментарии."""
@@ -94,12 +151,38 @@ class Comment(models.Model):
         verbose_name='Дата',
     )
 
+    objects = RoutedManager()
+
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
 
+class FollowManager(models.Manager):
+    """Менеджер подписок с вставкой, сообщающей, была ли строка новой."""
+
+    def insert(self, follow):
+        """Один INSERT, игнорирующий конфликт с unique_follow.
+
+        Возвращает True, только если строка добавлена: так повторную
+        подписку видно по самой вставке, без запроса exists() перед ней,
+        и два параллельных запроса не посчитают подписку новой дважды.
+        """
+        db = self._db or router.db_for_write(self.model, instance=follow)
+        connection = connections[db]
+        ops = connection.ops
+        sql = (
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{ops.quote_name(self.model._meta.db_table)} '
+            f'(user_id, author_id) VALUES (%s, %s) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [follow.user_id, follow.author_id])
+            return cursor.rowcount == 1
+
+
 class Follow(models.Model):
     """"Подписки."""
 
@@ -114,6 +197,8 @@ class Follow(models.Model):
         related_name='following',
     )
 
+    objects = FollowManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -121,3 +206,240 @@ class Follow(models.Model):
                 name='unique_follow',
             ),
         ]
+
+
+class Recommendation(models.Model):
+    """Рекомендованные пользователю авторы."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    score = models.FloatField(
+        verbose_name='Оценка',
+    )
+
+    class Meta:
+        ordering = ('-score',)
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_recommendation',
+            ),
+        ]
+
+
+class FollowChangeManager(models.Manager):
+    """Менеджер отметок с вставкой или обновлением одним запросом."""
+
+    def mark(self, user_ids):
+        """Отмечает пользователей текущим временем одним upsert.
+
+        INSERT ... ON CONFLICT DO UPDATE (SQLite 3.24+, PostgreSQL):
+        между вставкой и обновлением отдельными запросами отметку мог
+        удалить идущий пересчет.
+        """
+        if not user_ids:
+            return
+        db = self._db or router.db_for_write(self.model)
+        connection = connections[db]
+        ops = connection.ops
+        changed = ops.adapt_datetimefield_value(timezone.now())
+        sql = (
+            f'INSERT INTO {ops.quote_name(self.model._meta.db_table)} '
+            f'(user_id, changed) VALUES '
+            f'{", ".join(["(%s, %s)"] * len(user_ids))} '
+            f'ON CONFLICT (user_id) DO UPDATE SET changed = excluded.changed'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [
+                value for user_id in user_ids for value in (user_id, changed)
+            ])
+
+
+class FollowChange(models.Model):
+    """Пользователи, чьи подписки изменились после расчета рекомендаций."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    changed = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменено',
+    )
+
+    objects = FollowChangeManager()
+
+
+class PostTicket(models.Model):
+    """Сквозная нумерация постов при шардировании по авторам."""
+
+    class Meta:
+        verbose_name = 'Номер записи'
+        verbose_name_plural = 'Номера записей'
+
+
+class ArchivedPost(models.Model):
+    """Записи старше срока архивации (холодное хранилище).
+
+    id сохраняется при переносе, поэтому адреса записей не меняются.
+    """
+
+    id = models.IntegerField(
+        primary_key=True,
+    )
+    text = models.TextField(
+        verbose_name='Текст',
+    )
+    text_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Текст в HTML',
+    )
+    excerpt = models.CharField(
+        max_length=POST_EXCERPT_CHARS,
+        blank=True,
+        editable=False,
+        verbose_name='Отрывок',
+    )
+    pub_date = models.DateTimeField(
+        db_index=True,
+        verbose_name='Дата',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор',
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name='archived_posts',
+        blank=True,
+        null=True,
+        verbose_name='Группа',
+    )
+    image = models.ImageField(
+        upload_to='posts/',
+        blank=True,
+        verbose_name='Картинка',
+    )
+
+    class Meta:
+        ordering = ('-pub_date', '-id')
+        verbose_name = 'Архивная запись'
+        verbose_name_plural = 'Архивные записи'
+
+    def __str__(self):
+        return self.text[:CHARS_PER_STR_VIEW]
+
+
+class ArchivedComment(models.Model):
+    """Комментарии к архивным записям."""
+
+    id = models.IntegerField(
+        primary_key=True,
+    )
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+        verbose_name='Автор',
+    )
+    text = models.TextField(
+        verbose_name='Текст',
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата',
+    )
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+
+
+class DeletionTask(models.Model):
+    """Отложенное удаление пользователя или группы порциями в фоне."""
+
+    USER = 'user'
+    GROUP = 'group'
+    TARGETS = (
+        (USER, 'Пользователь'),
+        (GROUP, 'Группа'),
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Завершено'),
+    )
+
+    target = models.CharField(
+        max_length=10,
+        choices=TARGETS,
+        verbose_name='Объект',
+    )
+    object_id = models.PositiveIntegerField(
+        verbose_name='id объекта',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        db_index=True,
+        verbose_name='Состояние',
+    )
+    heartbeat = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последняя порция',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создано',
+    )
+    finished = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Завершено',
+    )
+    rows = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Обработано строк',
+    )
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'Удаление'
+        verbose_name_plural = 'Удаления'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['target', 'object_id'],
+                name='unique_deletion_task',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.get_target_display()} {self.object_id}'
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import deque
+
+from .constants import FEED_EVENTS_HISTORY, FEED_EVENTS_MAX_STREAMS
+
+
+class Broker:
+    """Локальный брокер событий в памяти процесса.
+
+    Хранит последние события с порядковыми номерами; подписчик ждет
+    события с номером больше последнего увиденного. Заменяет внешний
+    брокер (например, Redis pub/sub) в разработке и на одном процессе.
+    """
+
+    def __init__(self, history=FEED_EVENTS_HISTORY):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=history)
+        self.last = 0
+
+    def publish(self, event):
+        """Публикует событие, возвращает его номер."""
+        with self.condition:
+            self.last += 1
+            self.events.append((self.last, event))
+            self.condition.notify_all()
+            return self.last
+
+    def since(self, seq):
+        """События с номером больше seq."""
+        with self.condition:
+            return [item for item in self.events if item[0] > seq]
+
+    def wait(self, seq, timeout, match=None):
+        """Ждет до timeout секунд событий с номером больше seq.
+
+        Возвращает номер последнего просмотренного события и список
+        событий, подходящих под match.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.last > seq,
+                    max(deadline - time.monotonic(), 0),
+                )
+            events = self.since(seq)
+            if events:
+                seq = events[-1][0]
+            matching = [
+                event for _, event in events if match is None or match(event)
+            ]
+            if matching or time.monotonic() >= deadline:
+                return seq, matching
+
+
+broker = Broker()
+# Потоки SSE процесса: каждый занимает поток WSGI до FEED_EVENTS_TIMEOUT.
+stream_slots = threading.BoundedSemaphore(FEED_EVENTS_MAX_STREAMS)
+
+
+def publish_post(post):
+    """Событие о новой записи для лент."""
+    return broker.publish({
+        'id': post.id,
+        'author_id': post.author_id,
+        'group_id': post.group_id,
+    })
@@ -0,0 +1,168 @@
+import heapq
+import random
+from array import array
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .constants import (RECOMMENDATIONS_BATCH_SIZE,
+                        RECOMMENDATIONS_COFOLLOW_SAMPLE,
+                        RECOMMENDATIONS_COFOLLOW_WEIGHT,
+                        RECOMMENDATIONS_FOF_WEIGHT,
+                        RECOMMENDATIONS_MAX_FANOUT, RECOMMENDATIONS_TOP_K)
+from .models import Follow, FollowChange, Recommendation
+
+CHUNK_SIZE = 10000
+
+
+class Adjacency:
+    """Граф подписок в формате CSR.
+
+    Соседи вершины i лежат в indices[indptr[i]:indptr[i + 1]]. Вершины -
+    сжатые номера пользователей, ids[i] - исходный id пользователя.
+    """
+
+    def __init__(self, index, edges):
+        self.indptr = array('l', [0] * (len(index) + 1))
+        self.indices = array('l')
+        for source, target in edges:
+            self.indptr[index[source] + 1] += 1
+            self.indices.append(index[target])
+        for i in range(len(index)):
+            self.indptr[i + 1] += self.indptr[i]
+
+    def neighbours(self, vertex, limit=None, rng=None):
+        """Соседи вершины, при limit - не больше limit случайных из rng."""
+        start, end = self.indptr[vertex], self.indptr[vertex + 1]
+        if limit is None or end - start <= limit:
+            return self.indices[start:end]
+        return [
+            self.indices[i]
+            for i in sorted(rng.sample(range(start, end), limit))
+        ]
+
+    def degree(self, vertex):
+        return self.indptr[vertex + 1] - self.indptr[vertex]
+
+
+class FollowGraph:
+    """Граф подписок: кто на кого подписан и кто на кого подписан."""
+
+    def __init__(self):
+        ids = set()
+        for user_id, author_id in self.edges('user_id'):
+            ids.add(user_id)
+            ids.add(author_id)
+        self.ids = array('l', sorted(ids))
+        self.index = {user_id: i for i, user_id in enumerate(self.ids)}
+        self.following = Adjacency(self.index, self.edges('user_id'))
+        self.followers = Adjacency(
+            self.index,
+            ((author, user) for user, author in self.edges('author_id')),
+        )
+
+    @staticmethod
+    def edges(order):
+        """Ребра графа, отсортированные по вершине-источнику."""
+        return Follow.objects.order_by(order, 'pk').values_list(
+            'user_id', 'author_id',
+        ).iterator(chunk_size=CHUNK_SIZE)
+
+    def scores(self, user_id):
+        """Оценки авторов для пользователя.
+
+        Друзья друзей: авторы, на которых подписаны авторы пользователя.
+        Совместные подписки: авторы, на которых подписаны другие
+        подписчики тех же авторов, с весом обратно пропорциональным
+        популярности общего автора. Обход соседей ограничен константами
+        RECOMMENDATIONS_MAX_FANOUT и RECOMMENDATIONS_COFOLLOW_SAMPLE, чтобы
+        время расчета не зависело от популярности авторов. Соседи сверх
+        ограничения выбираются случайно, а не самые ранние по порядку
+        подписки; seed - id пользователя, поэтому пересчет без изменений
+        графа дает те же оценки.
+        """
+        vertex = self.index.get(user_id)
+        if vertex is None:
+            return {}
+        rng = random.Random(user_id)
+        scores = defaultdict(float)
+        following = self.following.neighbours(vertex)
+        for author in following:
+            for candidate in self.following.neighbours(
+                author, RECOMMENDATIONS_MAX_FANOUT, rng
+            ):
+                scores[candidate] += RECOMMENDATIONS_FOF_WEIGHT
+            weight = (
+                RECOMMENDATIONS_COFOLLOW_WEIGHT
+                / self.followers.degree(author)
+            )
+            for follower in self.followers.neighbours(
+                author, RECOMMENDATIONS_COFOLLOW_SAMPLE, rng
+            ):
+                if follower == vertex:
+                    continue
+                for candidate in self.following.neighbours(
+                    follower, RECOMMENDATIONS_MAX_FANOUT, rng
+                ):
+                    scores[candidate] += weight
+        for excluded in (vertex, *following):
+            scores.pop(excluded, None)
+
+        return scores
+
+    def top(self, user_id, top_k=RECOMMENDATIONS_TOP_K):
+        """Лучшие top_k авторов пользователя: пары (id автора, оценка)."""
+        best = heapq.nlargest(
+            top_k, self.scores(user_id).items(), key=lambda item: item[1],
+        )
+        return [(self.ids[vertex], score) for vertex, score in best]
+
+
+def refresh_recommendations(user_ids=None, top_k=RECOMMENDATIONS_TOP_K,
+                            batch_size=RECOMMENDATIONS_BATCH_SIZE):
+    """Пересчитывает рекомендации пользователей порциями.
+
+    Без user_ids пересчитываются все подписчики графа. Возвращает число
+    пересчитанных пользователей.
+    """
+    graph = FollowGraph()
+    if user_ids is None:
+        user_ids = [
+            user_id for i, user_id in enumerate(graph.ids)
+            if graph.following.degree(i)
+        ]
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        recommendations = [
+            Recommendation(user_id=user_id, author_id=author_id, score=score)
+            for user_id in batch
+            for author_id, score in graph.top(user_id, top_k)
+        ]
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=batch).delete()
+            Recommendation.objects.bulk_create(recommendations)
+
+    return len(user_ids)
+
+
+def refresh_changed_recommendations(top_k=RECOMMENDATIONS_TOP_K,
+                                    batch_size=RECOMMENDATIONS_BATCH_SIZE):
+    """Пересчитывает рекомендации пользователей с изменившимися подписками.
+
+    Удаляются только отметки не новее снимка: пользователь, отмеченный
+    во время расчета, будет пересчитан в следующий раз.
+    """
+    snapshot = timezone.now()
+    marks = FollowChange.objects.filter(changed__lte=snapshot)
+    changed = list(marks.values_list('user_id', flat=True))
+    refreshed = refresh_recommendations(changed, top_k, batch_size)
+    marks.delete()
+
+    return refreshed
+
+
+def mark_follows_changed(*user_ids):
+    """Отмечает пользователей для инкрементального пересчета."""
+    FollowChange.objects.mark(list(dict.fromkeys(user_ids)))
@@ -0,0 +1,134 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from faker import Faker
+
+from .constants import SEED_POWER_LAW_EXPONENT
+
+# Доля записей без группы.
+NO_GROUP_SHARE = 0.3
+# Доля комментариев автора записи в обсуждении.
+AUTHOR_REPLY_SHARE = 0.2
+
+
+def chunk_random(seed, kind, index):
+    """Генераторы порции: зависят только от seed, вида и номера порции.
+
+    Поэтому результат не зависит от числа воркеров и порядка их работы.
+    """
+    rng = random.Random(f'{seed}:{kind}:{index}')
+    fake = Faker('ru_RU')
+    fake.seed_instance(rng.getrandbits(32))
+    return rng, fake
+
+
+def power_law_index(rng, size, exponent=SEED_POWER_LAW_EXPONENT):
+    """Индекс 0..size-1, вероятность ранга k ~ 1 / k ** exponent.
+
+    Обратная функция распределения непрерывного степенного закона на
+    [1, size + 1): 0 - самый популярный индекс.
+    """
+    if exponent == 1:
+        rank = (size + 1) ** rng.random()
+    else:
+        power = 1 - exponent
+        rank = (
+            ((size + 1) ** power - 1) * rng.random() + 1
+        ) ** (1 / power)
+    return min(int(rank) - 1, size - 1)
+
+
+def average_count(rng, average):
+    """Случайное число с экспоненциальным распределением и средним average."""
+    return round(rng.expovariate(1 / average)) if average > 0 else 0
+
+
+def users_chunk(seed, index, first, count):
+    """Пользователи [first, first + count): username, имя, фамилия."""
+    rng, fake = chunk_random(seed, 'user', index)
+    return [
+        (f'{fake.user_name()}{number}', fake.first_name(), fake.last_name())
+        for number in range(first, first + count)
+    ]
+
+
+def groups_chunk(seed, index, first, count):
+    """Группы: название, slug, описание."""
+    rng, fake = chunk_random(seed, 'group', index)
+    return [
+        (
+            fake.sentence(nb_words=3).rstrip('.')[:200],
+            f'group-{number}',
+            fake.paragraph(nb_sentences=3),
+        )
+        for number in range(first, first + count)
+    ]
+
+
+def posts_chunk(seed, index, count, users, groups, start, span,
+                comments_per_post):
+    """Записи порции и комментарии к ним.
+
+    Авторы и группы выбираются по степенному закону, даты записей
+    возрастают вместе с номером порции, комментарии приходят после
+    записи с экспоненциальными паузами. Авторы и группы - индексы,
+    id подставляет вызывающий код.
+    """
+    rng, fake = chunk_random(seed, 'post', index)
+    dates = sorted(
+        start + span * rng.random() for _ in range(count)
+    )
+    posts, comments = [], []
+    for number, pub_date in enumerate(dates):
+        group = None
+        if groups and rng.random() >= NO_GROUP_SHARE:
+            group = power_law_index(rng, groups)
+        posts.append((
+            fake.paragraph(nb_sentences=rng.randint(1, 8)),
+            pub_date,
+            power_law_index(rng, users),
+            group,
+        ))
+        created = pub_date
+        for _ in range(average_count(rng, comments_per_post)):
+            created += timedelta(minutes=rng.expovariate(1 / 30))
+            # Активные пользователи комментируют чаще, автор отвечает.
+            if rng.random() < AUTHOR_REPLY_SHARE:
+                commenter = posts[-1][2]
+            else:
+                commenter = power_law_index(rng, users)
+            comments.append((
+                number,
+                commenter,
+                fake.sentence(nb_words=rng.randint(3, 20)),
+                created,
+            ))
+
+    return posts, comments
+
+
+def follows_chunk(seed, index, first, count, users, follows_per_user):
+    """Подписки пользователей [first, first + count) на популярных авторов."""
+    rng, _ = chunk_random(seed, 'follow', index)
+    follows = set()
+    for user in range(first, first + count):
+        for _ in range(average_count(rng, follows_per_user)):
+            author = power_law_index(rng, users)
+            if author != user:
+                follows.add((user, author))
+
+    return sorted(follows)
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Временно отключает auto_now_add, чтобы сохранить даты из генератора."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in saved:
+            field.auto_now_add = auto_now_add
@@ -0,0 +1,162 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404
+
+from .models import Comment, Group, Post, PostTicket
+
+User = get_user_model()
+
+
+def is_sharded():
+    return len(settings.POST_SHARDS) > 1
+
+
+def shard_for_author(author_id):
+    """База, в которой лежат посты и комментарии к ним автора."""
+    return settings.POST_SHARDS[author_id % len(settings.POST_SHARDS)]
+
+
+class ShardRouter:
+    """Шардирование постов по автору, комментариев - вместе с постом.
+
+    Записи маршрутизируются по instance, чтения через связанные
+    менеджеры (author.posts, post.comments) - по объекту-владельцу.
+    Запросы без подсказок не маршрутизируются и обходят шарды явно через
+    sharded_posts и get_post_or_404.
+
+    База, из которой загружен пост, используется только если это шард
+    (для чтений - еще и реплика): запись поста, прочитанного с реплики,
+    идет в шард автора, а не на реплику.
+    """
+
+    def shard(self, model, instance, databases):
+        if instance is None:
+            return None
+        if model is Post:
+            if isinstance(instance, User):
+                return shard_for_author(instance.pk)
+            if isinstance(instance, Post):
+                return self.post_shard(instance, databases)
+        if model is Comment and isinstance(instance, (Post, Comment)):
+            post = instance if isinstance(instance, Post) else instance.post
+            return self.post_shard(post, databases)
+        return None
+
+    def post_shard(self, post, databases):
+        if post._state.db in databases:
+            return post._state.db
+        return shard_for_author(post.author_id)
+
+    def db_for_read(self, model, **hints):
+        return self.shard(model, hints.get('instance'), {
+            *settings.POST_SHARDS, *settings.REPLICA_DATABASES,
+        })
+
+    def db_for_write(self, model, **hints):
+        return self.shard(
+            model, hints.get('instance'), settings.POST_SHARDS,
+        )
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Пользователи и группы копируются во все шарды.
+        if {obj1._state.db, obj2._state.db} <= set(settings.POST_SHARDS):
+            return True
+        return None
+
+
+class ShardedPostList:
+    """Посты со всех шардов по убыванию pub_date для Paginator.
+
+    Для среза [start:stop] из каждого шарда читается не больше stop
+    записей, которые сливаются по дате (scatter-gather). Для строк
+    values_list порядок задает key.
+    """
+
+    def __init__(self, queryset, key=None):
+        self.key = key or (lambda post: (post.pub_date, post.id))
+        self.querysets = [
+            queryset.order_by('-pub_date', '-id').using(alias)
+            for alias in settings.POST_SHARDS
+        ]
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        merged = heapq.merge(
+            *(queryset[:key.stop] for queryset in self.querysets),
+            key=self.key,
+            reverse=True,
+        )
+        return list(islice(merged, key.start, key.stop))
+
+
+def sharded_posts(queryset, key=None):
+    """Лента постов: queryset как есть или слияние шардов."""
+    if not is_sharded():
+        return queryset
+    return ShardedPostList(queryset, key)
+
+
+def per_shard(queryset):
+    """queryset как есть или его копии для каждого шарда."""
+    if not is_sharded():
+        return [queryset]
+    return [queryset.using(alias) for alias in settings.POST_SHARDS]
+
+
+def get_post_or_404(queryset, post_id):
+    """Пост по id из того шарда, где он лежит."""
+    for alias in settings.POST_SHARDS:
+        post = queryset.using(alias).filter(id=post_id).first()
+        if post is not None:
+            return post
+    raise Http404
+
+
+def allocate_post_id(sender, instance, raw=False, **kwargs):
+    """Выдает новому посту id, уникальный для всех шардов."""
+    if instance.pk is None and not raw:
+        instance.pk = PostTicket.objects.using('default').create().pk
+
+
+def replicate(sender, instance, raw=False, **kwargs):
+    """Копирует пользователя или группу из основной базы во все шарды."""
+    if raw or instance._state.db != 'default':
+        return
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in sender._meta.concrete_fields
+        if not field.primary_key
+    }
+    for alias in settings.POST_SHARDS:
+        if alias != 'default':
+            sender._base_manager.using(alias).update_or_create(
+                pk=instance.pk, defaults=values,
+            )
+
+
+def replicate_delete(sender, instance, **kwargs):
+    """Удаляет копии пользователя или группы из шардов."""
+    if instance._state.db != 'default':
+        return
+    for alias in settings.POST_SHARDS:
+        if alias != 'default':
+            sender._base_manager.using(alias).filter(pk=instance.pk).delete()
+
+
+def connect_signals():
+    from django.db.models.signals import post_delete, post_save, pre_save
+
+    pre_save.connect(allocate_post_id, sender=Post)
+    for model in (User, Group):
+        post_save.connect(replicate, sender=model)
+        post_delete.connect(replicate_delete, sender=model)
@@ -0,0 +1,210 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management import call_command
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..constants import DELETION_STALE_AFTER
+from ..deletion import claim_task, process_deletions, schedule_deletion
+from ..models import Comment, DeletionTask, Follow, Group, Post
+from ..utils import chunked_pks
+
+User = get_user_model()
+
+
+class AdminBulkActionsTest(TestCase):
+    """Массовые действия в админ-зоне."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@yatube.ru',
+            password='admin',
+        )
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='тестовая группа',
+            slug='test_slug',
+            description='тестовое описание',
+        )
+
+    def setUp(self):
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+        self.spam_posts = Post.objects.bulk_create(
+            Post(author=self.spammer, text='спам') for _ in range(5)
+        )
+        self.post = Post.objects.create(author=self.user, text='текст')
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.spammer, text='спам')
+            for _ in range(3)
+        )
+
+    def run_action(self, model_name, action, pks, **data):
+        return self.admin_client.post(
+            reverse(f'admin:posts_{model_name}_changelist'),
+            {'action': action, ACTION_CHECKBOX_NAME: pks, **data},
+        )
+
+    def test_chunked_pks_covers_queryset(self):
+        """chunked_pks выдает все ключи порциями заданного размера."""
+        chunks = list(chunked_pks(Post.objects.all(), chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 2])
+        self.assertCountEqual(
+            sum(chunks, []),
+            Post.objects.values_list('pk', flat=True),
+        )
+
+    def test_reassign_group(self):
+        """Выбранные записи переносятся в указанную группу."""
+        pks = Post.objects.values_list('pk', flat=True)
+        self.run_action('post', 'reassign_group', list(pks),
+                        group=self.group.pk)
+        self.assertEqual(self.group.posts.count(), len(pks))
+
+    def test_reassign_to_missing_group(self):
+        """Несуществующая группа дает сообщение об ошибке, а не 500."""
+        request = RequestFactory().post('/', {'group': '0'})
+        request.user = self.admin
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        admin.site._registry[Post].reassign_group(request, Post.objects.all())
+        self.assertEqual(
+            [message.level for message in get_messages(request)],
+            [messages.ERROR],
+        )
+        self.assertFalse(Post.objects.filter(group__isnull=False).exists())
+
+    def test_delete_posts_by_author(self):
+        """Удаляются все записи авторов выбранной записи."""
+        self.run_action(
+            'post', 'delete_by_author', [Post.objects.filter(
+                author=self.spammer).first().pk],
+        )
+        self.assertFalse(self.spammer.posts.exists())
+        self.assertTrue(self.user.posts.exists())
+
+    def test_purge_comments(self):
+        """Удаляются комментарии к выбранным записям."""
+        self.run_action('post', 'purge_comments', [self.post.pk])
+        self.assertFalse(self.post.comments.exists())
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+
+    def test_delete_comments_by_author(self):
+        """Удаляются все комментарии авторов выбранного комментария."""
+        self.run_action(
+            'comment', 'delete_by_author', [Comment.objects.first().pk],
+        )
+        self.assertFalse(Comment.objects.exists())
+
+    def test_delete_user_scheduled(self):
+        """Удаление пользователя в админке ставит задачу и блокирует вход."""
+        self.admin_client.post(
+            reverse('admin:auth_user_delete', args=(self.spammer.pk,)),
+            {'post': 'yes'},
+        )
+        self.spammer.refresh_from_db()
+        self.assertFalse(self.spammer.is_active)
+        self.assertTrue(DeletionTask.objects.filter(
+            target=DeletionTask.USER, object_id=self.spammer.pk,
+        ).exists())
+        self.assertEqual(Post.objects.filter(author=self.spammer).count(), 5)
+
+    def test_delete_user_requires_content_permissions(self):
+        """Без права удалять записи и комментарии удаление запрещено."""
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        staff.user_permissions.set(Permission.objects.filter(
+            codename__in=['delete_user', 'view_user', 'delete_comment'],
+        ))
+        self.admin_client.force_login(staff)
+        url = reverse('admin:auth_user_delete', args=(self.spammer.pk,))
+        response = self.admin_client.get(url)
+        self.assertEqual(
+            response.context['perms_lacking'], {Post._meta.verbose_name},
+        )
+        response = self.admin_client.post(url, {'post': 'yes'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(DeletionTask.objects.exists())
+
+
+class ProcessDeletionsCommandTest(TestCase):
+    """Фоновое удаление порциями командой process_deletions."""
+
+    def setUp(self):
+        self.spammer = User.objects.create_user(username='spammer')
+        self.user = User.objects.create_user(username='test_user')
+        self.group = Group.objects.create(
+            title='тестовая группа',
+            slug='test_slug',
+            description='тестовое описание',
+        )
+        self.spam_post = Post.objects.create(
+            author=self.spammer, text='спам', group=self.group,
+        )
+        self.post = Post.objects.create(
+            author=self.user, text='текст', group=self.group,
+        )
+        Comment.objects.create(
+            post=self.post, author=self.spammer, text='спам',
+        )
+        Comment.objects.create(
+            post=self.spam_post, author=self.user, text='ответ',
+        )
+        Follow.objects.create(user=self.user, author=self.spammer)
+
+    def process(self):
+        call_command(
+            'process_deletions', chunk_size=1, pause=0, stdout=StringIO(),
+        )
+
+    def test_user_content_deleted_in_chunks(self):
+        """Записи, комментарии и подписки удаляются, затем сам автор."""
+        task = schedule_deletion(self.spammer)
+        self.process()
+        task.refresh_from_db()
+        self.assertIsNotNone(task.finished)
+        self.assertEqual(task.rows, 4)
+        self.assertFalse(User.objects.filter(pk=self.spammer.pk).exists())
+        self.assertEqual(list(Post.objects.all()), [self.post])
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+
+    def test_claimed_task_not_run_twice(self):
+        """Задачу, захваченную другим исполнителем, процесс пропускает."""
+        task = schedule_deletion(self.spammer)
+        self.assertTrue(claim_task(task))
+        self.assertFalse(claim_task(task))
+        self.assertEqual(process_deletions(pause=0), 0)
+        self.assertTrue(User.objects.filter(pk=self.spammer.pk).exists())
+
+    def test_stale_task_reclaimed(self):
+        """Брошенную задачу подхватывает следующий запуск."""
+        task = schedule_deletion(self.spammer)
+        claim_task(task)
+        DeletionTask.objects.filter(pk=task.pk).update(
+            heartbeat=timezone.now() - timedelta(
+                seconds=DELETION_STALE_AFTER + 1,
+            ),
+        )
+        self.assertEqual(process_deletions(pause=0), 1)
+        task.refresh_from_db()
+        self.assertEqual(task.status, DeletionTask.DONE)
+        self.assertFalse(User.objects.filter(pk=self.spammer.pk).exists())
+
+    def test_group_posts_detached(self):
+        """Записи удаляемой группы остаются, но без группы."""
+        schedule_deletion(self.group)
+        self.process()
+        self.assertFalse(Group.objects.exists())
+        self.assertEqual(Post.objects.filter(group__isnull=True).count(), 2)
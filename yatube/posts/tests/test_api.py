@@ -0,0 +1,189 @@
+import base64
+import json
+from datetime import timedelta
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..archive import archive_cutoff, archive_posts
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    """JSON API лент и записей."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='тестовая группа',
+            slug='test_slug',
+            description='тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'пост {i}', group=cls.group)
+            for i in range(5)
+        )
+        cls.post = Post.objects.create(author=cls.reader, text='свой пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='комментарий',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def collect_ids(self, url):
+        """id всех записей ленты, пройденной курсором до конца."""
+        ids = []
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next'] and (
+                url.split('&cursor=')[0] + f'&cursor={data["next"]}'
+            )
+        return ids
+
+    def test_cursor_pagination_walks_all_posts(self):
+        """Курсор обходит все записи без повторов."""
+        ids = self.collect_ids(reverse('posts:api_index') + '?limit=2')
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)),
+        )
+
+    def test_malformed_cursor(self):
+        """Испорченный курсор возвращает 400, а не ошибку сервера."""
+        for value in (
+            ['2020-01-01T00:00', 'x'], ['2020-01-01T00:00', None],
+            ['x', 1], [1, 1], 'x',
+        ):
+            with self.subTest(value=value):
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(value).encode(),
+                ).decode()
+                response = self.client.get(
+                    reverse('posts:api_index'), {'cursor': cursor},
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST,
+                )
+        response = self.client.get(reverse('posts:api_index'), {'cursor': '!'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_sparse_fieldsets(self):
+        """Параметр fields ограничивает поля ответа."""
+        data = self.client.get(
+            reverse('posts:api_group_posts', kwargs={'slug': 'test_slug'}),
+            {'fields': 'id,author'},
+        ).json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+        self.assertEqual(data['results'][0]['author'], 'author')
+
+    def test_unknown_field(self):
+        """Неизвестное поле возвращает 400."""
+        response = self.client.get(
+            reverse('posts:api_index'), {'fields': 'password'},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_profile_and_follow_feeds(self):
+        """Ленты пользователя и подписок."""
+        profile = self.client.get(
+            reverse('posts:api_profile', kwargs={'username': 'reader'})
+        ).json()
+        self.assertEqual(
+            [row['text'] for row in profile['results']], ['свой пост'],
+        )
+        follow = self.authorized_client.get(
+            reverse('posts:api_follow_index')
+        ).json()
+        self.assertEqual(len(follow['results']), 5)
+        self.assertEqual(
+            self.client.get(reverse('posts:api_follow_index')).status_code,
+            HTTPStatus.UNAUTHORIZED,
+        )
+
+    def test_not_found_is_json(self):
+        """Неизвестные группа, автор и запись - 404 в формате JSON."""
+        for url in (
+            reverse('posts:api_group_posts', kwargs={'slug': 'missing'}),
+            reverse('posts:api_profile', kwargs={'username': 'missing'}),
+            reverse('posts:api_post_detail', kwargs={'post_id': 0}),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('error', response.json())
+
+    def test_post_detail_with_comments(self):
+        """Запись отдается вместе с комментариями."""
+        data = self.client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': self.post.id})
+        ).json()
+        self.assertEqual(data['post']['text'], 'свой пост')
+        self.assertEqual(data['comments'][0]['author'], 'author')
+        response = self.client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_posts_batch_keeps_order_and_reports_missing(self):
+        """Пакетный запрос сохраняет порядок и сообщает о пропусках."""
+        ids = list(Post.objects.values_list('id', flat=True)[:3])
+        requested = [ids[2], 0, ids[0], ids[1]]
+        # Второй запрос ищет в архиве не найденный id 0.
+        with self.assertNumQueries(2):
+            data = self.client.get(
+                reverse('posts:api_posts_batch'),
+                {'ids': ','.join(map(str, requested)), 'fields': 'id,text'},
+            ).json()
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [ids[2], ids[0], ids[1]],
+        )
+        self.assertEqual(data['missing'], [0])
+
+    def test_archived_posts_fall_through(self):
+        """Архивные записи видны в лентах, по id и в пакетном запросе."""
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=timezone.now() - timedelta(days=400),
+        )
+        archive_posts(archive_cutoff())
+        profile = self.client.get(
+            reverse('posts:api_profile', kwargs={'username': 'reader'})
+        ).json()
+        self.assertEqual(
+            [row['text'] for row in profile['results']], ['свой пост'],
+        )
+        ids = self.collect_ids(reverse('posts:api_index') + '?limit=4')
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(ids[-1], self.post.id)
+        data = self.client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': self.post.id})
+        ).json()
+        self.assertEqual(data['post']['text'], 'свой пост')
+        self.assertEqual(data['comments'][0]['text'], 'комментарий')
+        data = self.client.get(
+            reverse('posts:api_posts_batch'), {'ids': self.post.id},
+        ).json()
+        self.assertEqual(data['results'][0]['author'], 'reader')
+
+    def test_posts_batch_limit(self):
+        """Слишком длинный список id возвращает 400."""
+        response = self.client.get(
+            reverse('posts:api_posts_batch'),
+            {'ids': ','.join(map(str, range(1000)))},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
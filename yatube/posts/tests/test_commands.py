@@ -0,0 +1,566 @@
+import json
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import benchmarks
+from ..archive import HotColdList
+from ..deletion import run_task, schedule_deletion
+from ..loadtest import compare, percentile
+from ..management.commands.seed_yatube import Command as SeedCommand
+from ..recommendations import Adjacency, mark_follows_changed
+from ..models import (ArchivedComment, ArchivedPost, Comment, Follow,
+                      FollowChange, Group, Post)
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportCommandTest(TestCase):
+    """Потоковый импорт командой import_yatube."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def write_file(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_jsonl_all_models(self):
+        """Из JSONL создаются группы, посты, комментарии и подписки."""
+        rows = (
+            {'model': 'group', 'title': 'группа', 'slug': 'group',
+             'description': 'описание'},
+            {'model': 'post', 'id': 100, 'text': 'пост', 'author': 'author',
+             'group': 'group'},
+            {'model': 'post', 'text': 'без автора', 'author': 'nobody'},
+            {'model': 'comment', 'post': 100, 'author': 'reader',
+             'text': 'комментарий'},
+            {'model': 'follow', 'user': 'reader', 'author': 'author'},
+            {'model': 'follow', 'user': 'reader', 'author': 'author'},
+        )
+        path = self.write_file(
+            'data.jsonl', '\n'.join(json.dumps(row) for row in rows),
+        )
+        call_command('import_yatube', path, batch_size=2, stdout=StringIO())
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.group, Group.objects.get(slug='group'))
+        self.assertEqual(post.author, self.author)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertTrue(Comment.objects.filter(post=post).exists())
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_malformed_rows_skipped(self):
+        """Некорректные строки пропускаются и попадают в отчет."""
+        rows = (
+            {'model': 'group', 'title': 'группа', 'slug': 'group',
+             'description': 'описание'},
+            {'model': 'group', 'title': 'дубль', 'slug': 'group'},
+            {'model': 'post', 'author': 'author'},
+            {'model': 'post', 'id': 'x', 'text': 'пост', 'author': 'author'},
+            {'model': 'comment', 'post': 'x', 'author': 'reader',
+             'text': 'комментарий'},
+        )
+        path = self.write_file(
+            'data.jsonl',
+            '\n'.join(json.dumps(row) for row in rows) + '\n{oops\n',
+        )
+        out = StringIO()
+        call_command('import_yatube', path, stdout=out)
+        self.assertEqual(Group.objects.get().title, 'группа')
+        self.assertFalse(Post.objects.exists())
+        self.assertIn('Импортировано 1, пропущено 5', out.getvalue())
+        for reason in ('нет text', 'некорректное id', 'некорректное post',
+                       'строка не разобрана', 'группа с таким slug'):
+            with self.subTest(reason=reason):
+                self.assertIn(reason, out.getvalue())
+
+    def test_exported_dates_kept(self):
+        """Даты записей и комментариев берутся из файла."""
+        rows = (
+            {'model': 'post', 'id': 100, 'text': 'пост', 'author': 'author',
+             'pub_date': '2020-01-02 03:04:05+00:00'},
+            {'model': 'comment', 'post': 100, 'author': 'reader',
+             'text': 'комментарий', 'created': '2020-01-03T00:00:00'},
+        )
+        path = self.write_file(
+            'data.jsonl', '\n'.join(json.dumps(row) for row in rows),
+        )
+        call_command('import_yatube', path, stdout=StringIO())
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments.get().created.year, 2020)
+
+    def test_import_csv_posts_with_images(self):
+        """Из CSV создаются посты, картинки копируются в хранилище."""
+        image = self.write_file('small.gif', 'GIF89a')
+        path = self.write_file(
+            'posts.csv',
+            'text,author,image\n'
+            f'первый,author,{image}\n'
+            'второй,author,\n',
+        )
+        call_command(
+            'import_yatube', path, model='post', image_workers=2,
+            stdout=StringIO(),
+        )
+        self.assertEqual(self.author.posts.count(), 2)
+        self.assertEqual(
+            self.author.posts.exclude(image='').get().image,
+            'posts/small.gif',
+        )
+
+
+class ExportCommandTest(TestCase):
+    """Потоковая выгрузка командой export_yatube."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='группа', slug='group', description='описание',
+        )
+        Post.objects.bulk_create(
+            Post(text=f'пост {i}', author=cls.author, group=cls.group)
+            for i in range(5)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_export_ndjson_in_chunks(self):
+        """Выгрузка NDJSON содержит все строки в формате импорта."""
+        out = StringIO()
+        call_command('export_yatube', 'post', 'follow', chunk_size=2,
+                     stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]['author'], 'author')
+        self.assertEqual(rows[0]['group'], 'group')
+        self.assertEqual(
+            rows[-1],
+            {'model': 'follow', 'id': Follow.objects.get().id,
+             'user': 'reader', 'author': 'author'},
+        )
+
+    def test_export_all_models_by_default(self):
+        """Без аргументов выгружаются все модели."""
+        out = StringIO()
+        call_command('export_yatube', stdout=out)
+        models = [
+            json.loads(line)['model'] for line in out.getvalue().splitlines()
+        ]
+        self.assertEqual(
+            sorted(set(models)), ['follow', 'group', 'post'],
+        )
+        self.assertEqual(len(models), 7)
+
+    def test_export_unknown_model(self):
+        """Неизвестная модель - ошибка команды."""
+        with self.assertRaises(CommandError):
+            call_command('export_yatube', 'user', stdout=StringIO())
+
+    def test_export_csv(self):
+        """Выгрузка CSV начинается с заголовка и содержит все строки."""
+        out = StringIO()
+        call_command('export_yatube', 'group', format='csv', stdout=out)
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            ['id,title,slug,description',
+             f'{self.group.id},группа,group,описание'],
+        )
+
+
+class RecommendAuthorsCommandTest(TestCase):
+    """Расчет рекомендаций командой recommend_authors."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'friend', 'fof', 'neighbour', 'cofollow')
+        }
+        for user, author in (
+            ('reader', 'friend'),
+            ('friend', 'fof'),
+            ('neighbour', 'friend'),
+            ('neighbour', 'cofollow'),
+        ):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author],
+            )
+
+    def recommended(self, name):
+        return list(self.users[name].recommendations.values_list(
+            'author__username', flat=True,
+        ))
+
+    def test_friends_of_friends_and_cofollows(self):
+        """Рекомендуются авторы друзей и авторы соседей по подпискам."""
+        call_command('recommend_authors', stdout=StringIO())
+        self.assertEqual(self.recommended('reader'), ['fof', 'cofollow'])
+        self.assertNotIn('friend', self.recommended('neighbour'))
+
+    def test_incremental_refresh(self):
+        """Инкрементальный расчет затрагивает только отмеченных."""
+        FollowChange.objects.create(user=self.users['reader'])
+        call_command('recommend_authors', incremental=True, stdout=StringIO())
+        self.assertTrue(self.recommended('reader'))
+        self.assertFalse(self.recommended('neighbour'))
+        self.assertFalse(FollowChange.objects.exists())
+
+    def test_mark_during_refresh_kept(self):
+        """Отметка, поставленная во время расчета, не удаляется."""
+        FollowChange.objects.create(user=self.users['reader'])
+        FollowChange.objects.create(user=self.users['neighbour'])
+        FollowChange.objects.filter(user=self.users['neighbour']).update(
+            changed=timezone.now() + timedelta(minutes=1),
+        )
+        call_command('recommend_authors', incremental=True, stdout=StringIO())
+        self.assertEqual(
+            list(FollowChange.objects.values_list('user_id', flat=True)),
+            [self.users['neighbour'].pk],
+        )
+
+    def test_mark_upsert(self):
+        """Отметка ставится и обновляется одним запросом."""
+        reader, neighbour = self.users['reader'], self.users['neighbour']
+        FollowChange.objects.create(user=reader)
+        FollowChange.objects.filter(user=reader).update(
+            changed=timezone.now() - timedelta(days=1),
+        )
+        with self.assertNumQueries(1):
+            mark_follows_changed(reader.pk, neighbour.pk, reader.pk)
+        hour_ago = timezone.now() - timedelta(hours=1)
+        self.assertEqual(
+            FollowChange.objects.filter(changed__gt=hour_ago).count(), 2,
+        )
+
+    def test_capped_neighbours_sampled(self):
+        """Соседи сверх ограничения выбираются случайно, а не первые."""
+        graph = Adjacency(
+            {vertex: vertex for vertex in range(101)},
+            ((0, target) for target in range(1, 101)),
+        )
+        samples = [
+            list(graph.neighbours(0, 10, random.Random(seed)))
+            for seed in range(5)
+        ]
+        self.assertEqual(
+            samples[0], list(graph.neighbours(0, 10, random.Random(0))),
+        )
+        self.assertTrue(all(len(set(sample)) == 10 for sample in samples))
+        self.assertGreater(len({tuple(sample) for sample in samples}), 1)
+        self.assertNotIn(list(range(1, 11)), samples)
+
+
+class ArchivePostsCommandTest(TestCase):
+    """Перенос старых записей в архив командой archive_posts."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.posts = [
+            Post.objects.create(author=self.author, text=f'пост {i}')
+            for i in range(5)
+        ]
+        Comment.objects.create(
+            post=self.posts[0], author=self.author, text='комментарий',
+        )
+        Post.objects.filter(
+            pk__in=[post.pk for post in self.posts[:3]],
+        ).update(pub_date=timezone.now() - timedelta(days=400))
+
+    def test_old_posts_moved_with_comments(self):
+        """Старые записи и их комментарии переезжают в архив порциями."""
+        call_command('archive_posts', chunk_size=2, stdout=StringIO())
+        self.assertEqual(
+            set(ArchivedPost.objects.values_list('id', flat=True)),
+            {post.pk for post in self.posts[:3]},
+        )
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(
+            ArchivedComment.objects.get().post_id, self.posts[0].pk,
+        )
+        self.assertFalse(Comment.objects.exists())
+
+    def test_views_fall_through_to_archive(self):
+        """Лента и страница записи читают архив при промахе."""
+        call_command('archive_posts', stdout=StringIO())
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.posts[0].pk})
+        )
+        self.assertTrue(response.context['is_archived'])
+        self.assertEqual(response.context['comments'][0].text, 'комментарий')
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'})
+        )
+        page = response.context['page_obj']
+        self.assertEqual(page.paginator.count, 5)
+        self.assertEqual(
+            [post.pk for post in page],
+            [post.pk for post in self.posts[3:][::-1] + self.posts[2::-1]],
+        )
+
+    def cold_count(self):
+        return HotColdList(
+            self.author.posts.all(), self.author.archived_posts.all(),
+            count_key='profile',
+        ).count()
+
+    def test_cold_count_cached(self):
+        """Число архивных записей не пересчитывается на каждом запросе."""
+        call_command('archive_posts', stdout=StringIO())
+        self.assertEqual(self.cold_count(), 5)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cold_count(), 5)
+        call_command('archive_posts', days=-1, stdout=StringIO())
+        self.assertEqual(self.cold_count(), 5)
+
+    def test_follow_feed_count_follows_subscriptions(self):
+        """Подписка и отписка сразу меняют число записей ленты подписок."""
+        call_command('archive_posts', stdout=StringIO())
+        reader = User.objects.create_user(username='reader')
+        client = Client()
+        client.force_login(reader)
+
+        def count():
+            return client.get(
+                reverse('posts:follow_index'),
+            ).context['page_obj'].paginator.count
+
+        self.assertEqual(count(), 0)
+        client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(count(), 5)
+        client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': 'author'})
+        )
+        self.assertEqual(count(), 0)
+
+    def test_deletion_resets_cold_count(self):
+        """Удаление автора сбрасывает закешированное число архивных."""
+        call_command('archive_posts', stdout=StringIO())
+        self.assertEqual(self.cold_count(), 5)
+        task = schedule_deletion(self.author)
+        run_task(task, pause=0)
+        self.assertEqual(HotColdList(
+            Post.objects.filter(author_id=self.author.pk),
+            ArchivedPost.objects.filter(author_id=self.author.pk),
+            count_key='profile',
+        ).count(), 0)
+
+
+class RenderPostsCommandTest(TestCase):
+    """Заполнение HTML текста записей командой render_posts."""
+
+    def test_backfill_hot_and_archived(self):
+        """Незаполненные записи и архив получают HTML и отрывки."""
+        author = User.objects.create_user(username='author')
+        for i in range(3):
+            Post.objects.create(author=author, text=f'пост\n{i}')
+        call_command('archive_posts', days=-1, stdout=StringIO())
+        Post.objects.create(author=author, text='новый\nпост')
+        Post.objects.update(text_html='', excerpt='')
+        ArchivedPost.objects.update(text_html='', excerpt='')
+        call_command('render_posts', chunk_size=2, stdout=StringIO())
+        self.assertEqual(
+            Post.objects.get().text_html, 'новый<br>пост',
+        )
+        self.assertCountEqual(
+            ArchivedPost.objects.values_list('text_html', 'excerpt'),
+            [(f'пост<br>{i}', f'пост\n{i}') for i in range(3)],
+        )
+
+
+class SeedCommandTest(TestCase):
+    """Генерация синтетических данных командой seed_yatube."""
+
+    def seed(self, **options):
+        call_command(
+            'seed_yatube', users=20, groups=3, posts=40, comments=2,
+            follows=3, chunk_size=15, until='2024-06-01', stdout=StringIO(),
+            **options,
+        )
+        return list(Post.objects.order_by('pub_date').values_list(
+            'text', 'pub_date', 'author__username', 'group__slug',
+        ))
+
+    def test_counts_and_dates(self):
+        """Создаются все объекты, даты записей в заданном интервале."""
+        posts = self.seed(seed=1, workers=1)
+        self.assertEqual(len(posts), 40)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Follow.objects.exists())
+        self.assertLessEqual(posts[-1][1].isoformat(), '2024-06-01')
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+
+    def test_deterministic_by_seed(self):
+        """Одинаковый seed дает одинаковые данные при любом числе воркеров."""
+        first = self.seed(seed=7, workers=1)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertEqual(self.seed(seed=7, workers=2), first)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.assertNotEqual(self.seed(seed=8, workers=1), first)
+
+    def test_pending_chunks_bounded(self):
+        """Задачи отправляются окном, а не все сразу."""
+        sent = []
+
+        def tasks():
+            for number in range(10):
+                sent.append(number)
+                yield (number,)
+
+        command = SeedCommand()
+        command.window = 3
+        with ThreadPoolExecutor(2) as command.executor:
+            results = command.run(lambda number: number * 2, tasks())
+            self.assertEqual(next(results), 0)
+            self.assertEqual(len(sent), 4)
+            self.assertEqual(list(results), list(range(2, 20, 2)))
+
+
+class LoadtestCommandTest(TestCase):
+    """Нагрузочный тест командой loadtest."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='группа', slug='group', description='описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='пост', group=cls.group,
+        )
+
+    def test_result_json(self):
+        """Результат содержит сводку по всем сценариям и память."""
+        output = os.path.join(tempfile.mkdtemp(), 'result.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command(
+            'loadtest', seconds=0.3, concurrency=1, output=output,
+            stdout=StringIO(),
+        )
+        with open(output) as file:
+            result = json.load(file)
+        self.assertEqual(set(result['views']), set(result['mix']))
+        self.assertIn('post_detail', result['views'])
+        self.assertGreater(result['total']['requests'], 0)
+        self.assertEqual(result['total']['errors'], 0)
+        self.assertIsNotNone(result['max_rss_mb'])
+
+    def test_cleanup_undoes_side_effects(self):
+        """После теста не остается пользователей, отметок и популярности."""
+        call_command(
+            'loadtest', seconds=0.3, concurrency=1,
+            mix='follow=1,add_comment=1', stdout=StringIO(),
+        )
+        self.assertFalse(
+            User.objects.filter(username__startswith='loadtest_').exists()
+        )
+        self.assertFalse(FollowChange.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertIsNone(self.post.trending_score)
+        self.assertIsNone(self.group.trending_score)
+        self.assertEqual(list(Post.objects.all()), [self.post])
+
+    def test_existing_accounts_kept(self):
+        """Аккаунты с именами как у теста не используются и не удаляются."""
+        user = User.objects.create_user(username='loadtest_0')
+        call_command(
+            'loadtest', seconds=0.3, concurrency=1, mix='follow=1',
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            list(User.objects.filter(username__startswith='loadtest_')),
+            [user],
+        )
+        self.assertFalse(user.follower.exists())
+
+    def test_compare_with_baseline(self):
+        """Рост задержки сверх допуска и падение RPS - регрессии."""
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+        baseline = {'views': {'index': {
+            'p50': 10, 'p95': 20, 'p99': 30, 'queries_per_request': 3,
+            'throughput': 100, 'errors': 0,
+        }}}
+        result = {'views': {'index': {
+            'p50': 11, 'p95': 40, 'p99': 30, 'queries_per_request': 3,
+            'throughput': 50, 'errors': 0,
+        }}}
+        self.assertEqual(
+            compare(result, baseline, 0.2),
+            ['index.p95: 20 -> 40', 'index.throughput: 100 -> 50'],
+        )
+
+
+class BenchmarkCommandTest(TestCase):
+    """Микробенчмарки командой benchmark."""
+
+    def test_all_benchmarks_saved(self):
+        """Результат содержит замеры всех бенчмарков."""
+        output = os.path.join(tempfile.mkdtemp(), 'result.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        with self.assertNumQueries(0):
+            call_command(
+                'benchmark', repeat=1, number=1, output=output,
+                stdout=StringIO(),
+            )
+        with open(output) as file:
+            result = json.load(file)
+        self.assertEqual(
+            set(result['benchmarks']), set(benchmarks.BENCHMARKS),
+        )
+        self.assertGreater(result['benchmarks']['post_template']['min_us'], 0)
+
+    def test_compare_with_baseline(self):
+        """Замедление сверх допуска считается регрессией."""
+        baseline = {'benchmarks': {'year': {'min_us': 1.0},
+                                   'addclass': {'min_us': 10.0}}}
+        result = {'benchmarks': {'year': {'min_us': 1.1},
+                                 'addclass': {'min_us': 15.0}}}
+        self.assertEqual(
+            benchmarks.compare(result, baseline, 0.15),
+            ['addclass: 10.0 -> 15.0 мкс (+50%)'],
+        )
@@ -34,6 +34,22 @@ class PostGroupModelTest(TestCase):
             with self.subTest(object=object):
                 self.assertEqual(str(object), expected_name)
 
+    def test_post_text_prerendered(self):
+        """При сохранении текст рендерится в HTML и отрывок."""
+        post = Post.objects.create(
+            text='<b>первая</b>\nвторая строка длинной записи',
+            author=self.user,
+        )
+        self.assertEqual(
+            post.text_html,
+            '&lt;b&gt;первая&lt;/b&gt;<br>вторая строка длинной записи',
+        )
+        self.assertEqual(post.excerpt, '<b>первая</b>\nвторая строка д…')
+        post.text = 'новый текст'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'новый текст')
+
     def test_group_verbose_names(self):
         """verbose_name в полях модели group совпадает с ожидаемым."""
         group_field_verboses = {
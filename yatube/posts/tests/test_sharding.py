@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..export import iter_rows
+from ..models import Comment, Post, PostTicket
+from ..sharding import ShardRouter, is_sharded, shard_for_author
+from ..trending import bump_post, trending_posts
+from ..write_behind import WriteBehindQueue
+
+User = get_user_model()
+
+
+@override_settings(POST_SHARDS=['default', 'shard_1'])
+class ShardRouterTest(TestCase):
+    """Выбор шарда для постов и комментариев."""
+
+    def setUp(self):
+        self.router = ShardRouter()
+
+    def test_posts_routed_by_author(self):
+        """Пост пишется в шард автора, его комментарии - туда же."""
+        author = User(pk=3)
+        post = Post(author=author)
+        comment = Comment(post=post, author=User(pk=4))
+        self.assertEqual(shard_for_author(3), 'shard_1')
+        self.assertEqual(self.router.db_for_write(Post, instance=post),
+                         'shard_1')
+        self.assertEqual(self.router.db_for_write(Comment, instance=comment),
+                         'shard_1')
+        self.assertEqual(self.router.db_for_read(Post, instance=author),
+                         'shard_1')
+
+    @override_settings(REPLICA_DATABASES=['replica_0'])
+    def test_write_after_replica_read_goes_to_shard(self):
+        """Пост, прочитанный с реплики, пишется в шард автора."""
+        post = Post(pk=1, author=User(pk=3))
+        comment = Comment(post=post, author=User(pk=4))
+        post._state.db = 'replica_0'
+        self.assertEqual(self.router.db_for_write(Post, instance=post),
+                         'shard_1')
+        self.assertEqual(self.router.db_for_write(Comment, instance=comment),
+                         'shard_1')
+        self.assertEqual(self.router.db_for_read(Comment, instance=post),
+                         'replica_0')
+
+    def test_unsharded_models_not_routed(self):
+        """Остальные модели остаются на других роутерах."""
+        self.assertIsNone(self.router.db_for_read(User, instance=User(pk=3)))
+        self.assertIsNone(self.router.db_for_read(Post))
+
+
+@skipUnless(is_sharded(), 'Нужно DATABASE_SHARDS с несколькими базами.')
+class ShardedViewsTest(TestCase):
+    """Ленты и записи при нескольких шардах.
+
+    Запуск: DATABASE_SHARDS=/tmp/shard_1.sqlite3 python manage.py test
+    """
+
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(len(settings.POST_SHARDS))
+        ]
+        self.posts = [
+            Post.objects.create(author=author, text=f'пост {author}')
+            for author in self.authors * 6
+        ]
+
+    def test_posts_spread_across_shards(self):
+        """Посты лежат в шардах своих авторов."""
+        for post in self.posts:
+            self.assertEqual(
+                post._state.db, shard_for_author(post.author_id),
+            )
+        self.assertEqual(
+            len({post.pk for post in self.posts}), len(self.posts),
+        )
+
+    def test_index_merges_shards_by_date(self):
+        """Главная страница сливает шарды по дате публикации."""
+        response = self.client.get(reverse('posts:index'))
+        page = list(response.context['page_obj'])
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         len(self.posts))
+        self.assertEqual(page, self.posts[::-1][:len(page)])
+
+    def test_detail_and_comment_on_any_shard(self):
+        """Запись и комментарий к ней находятся в шарде автора."""
+        post = self.posts[1]
+        client = Client()
+        client.force_login(self.authors[0])
+        client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            {'text': 'комментарий'},
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertEqual(response.context['post'], post)
+        self.assertEqual(
+            response.context['comments'][0].text, 'комментарий',
+        )
+
+    def test_write_behind_comment_in_post_shard(self):
+        """Отложенный комментарий пишется в шард записи."""
+        post = next(
+            post for post in self.posts if post._state.db != 'default'
+        )
+        entry = {
+            'obj': Comment(post=post, author=self.authors[0], text='текст'),
+            'done': threading.Event(),
+            'error': None,
+        }
+        WriteBehindQueue().commit([entry])
+        self.assertIsNone(entry['error'])
+        self.assertTrue(Comment.objects.using(post._state.db).filter(
+            post_id=post.id,
+        ).exists())
+
+    def shard_post(self):
+        return next(
+            post for post in self.posts if post._state.db != 'default'
+        )
+
+    def test_api_merges_shards(self):
+        """API лент и выборки по id читает все шарды."""
+        url = reverse('posts:api_index')
+        data = self.client.get(url, {'limit': len(self.posts)}).json()
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [post.id for post in self.posts[::-1]],
+        )
+        data = self.client.get(reverse('posts:api_posts_batch'), {
+            'ids': ','.join(str(post.id) for post in self.posts),
+        }).json()
+        self.assertEqual(data['missing'], [])
+        post = self.shard_post()
+        data = self.client.get(reverse(
+            'posts:api_profile', kwargs={'username': post.author.username},
+        )).json()
+        self.assertIn(post.id, [row['id'] for row in data['results']])
+
+    def test_trending_post_on_shard(self):
+        """Событие записи из шарда учитывается в ее шарде."""
+        post = self.shard_post()
+        bump_post(post, 1)
+        self.assertEqual(trending_posts(), [post])
+
+    def test_export_all_shards(self):
+        """Выгрузка содержит записи всех шардов."""
+        self.assertCountEqual(
+            [row['id'] for row in iter_rows('post')],
+            [post.id for post in self.posts],
+        )
+
+    def test_import_to_author_shard(self):
+        """Импорт пишет записи в шард автора и резервирует их номера."""
+        author = next(
+            author for author in self.authors
+            if shard_for_author(author.pk) != 'default'
+        )
+        rows = (
+            {'model': 'post', 'id': 1000, 'text': 'пост',
+             'author': author.username},
+            {'model': 'post', 'text': 'без номера', 'author': author.username},
+            {'model': 'comment', 'post': 1000, 'author': author.username,
+             'text': 'комментарий'},
+        )
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        path = os.path.join(tmp_dir, 'data.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(json.dumps(row) for row in rows))
+        call_command('import_yatube', path, stdout=StringIO())
+        shard = Post.objects.using(shard_for_author(author.pk))
+        self.assertTrue(shard.filter(pk=1000, comments__isnull=False))
+        post = shard.get(text='без номера')
+        self.assertEqual(
+            PostTicket.objects.filter(pk__in=(1000, post.pk)).count(), 2,
+        )
+
+    def test_admin_lists_selected_shard(self):
+        """Админка показывает и меняет записи выбранного шарда."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@yatube.ru', password='admin',
+        )
+        client = Client()
+        client.force_login(admin)
+        post = self.shard_post()
+        url = reverse('admin:posts_post_changelist')
+        response = client.get(url, {'shard': post._state.db})
+        self.assertIn(post, response.context['cl'].result_list)
+        client.post(url + f'?shard={post._state.db}', {
+            'action': 'delete_by_author',
+            ACTION_CHECKBOX_NAME: [post.pk],
+        })
+        self.assertFalse(Post.objects.using(post._state.db).filter(
+            author_id=post.author_id,
+        ).exists())
@@ -1,5 +1,9 @@
+import math
 import shutil
 import tempfile
+import threading
+from datetime import timedelta
+from http import HTTPStatus
 from unittest import expectedFailure
 
 from django import forms
@@ -7,11 +11,19 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from django.utils import timezone
 
-from ..constants import POSTS_PER_PAGE
-from ..models import Comment, Follow, Group, Post
+from ..constants import (FEED_EVENTS_BUSY_RETRY, POSTS_PER_PAGE,
+                         TRENDING_HALF_LIFE)
+from ..models import (Comment, Follow, FollowChange, Group, Post,
+                      Recommendation)
+from ..pubsub import broker, stream_slots
+from ..trending import bump, event_score, log2_add
+from ..utils import invalidate_feed_cache
+from ..write_behind import WriteBehindQueue, save_object
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -379,6 +391,20 @@ class CacheTest(TestCase):
             response_after_cache_clear.content
         )
 
+    def test_invalidate_feed_cache_keeps_other_keys(self):
+        """Сброс лент обновляет главную, но не трогает другие ключи."""
+        cache.clear()
+        user = User.objects.create_user(username='test_user')
+        post = Post.objects.create(author=user, text='текст для кеширования')
+        cached = self.client.get(reverse('posts:index')).content
+        cache.set('sorl-thumbnail||image||abc', 'миниатюра')
+        post.delete()
+        invalidate_feed_cache()
+        self.assertNotEqual(
+            self.client.get(reverse('posts:index')).content, cached,
+        )
+        self.assertEqual(cache.get('sorl-thumbnail||image||abc'), 'миниатюра')
+
 
 class FollowTest(TestCase):
     """Корректная работа подписок на авторов."""
@@ -502,3 +528,335 @@ class FollowTest(TestCase):
         self.assertFalse(following_not_expected)
         self.assertTrue(following_expected)
         self.assertIsInstance(following_expected, bool)
+
+    def test_follow_marks_recommendations_stale(self):
+        """Подписка отмечает пользователя для пересчета рекомендаций."""
+        self.authorized_client_not_subscriber.get(
+            reverse(
+                'posts:profile_follow',
+                kwargs={'username': self.user_author.username}
+            )
+        )
+        self.assertTrue(
+            FollowChange.objects.filter(user=self.user_authorized).exists()
+        )
+
+    def test_follow_index_shows_recommendations(self):
+        """Рекомендации передаются в контекст страницы подписок."""
+        Recommendation.objects.create(
+            user=self.user_authorized, author=self.user_author, score=1,
+        )
+        response = self.authorized_client_not_subscriber.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(
+            response.context['recommendations'][0].author,
+            self.user_author,
+        )
+
+    def test_follow_twice_is_idempotent(self):
+        """Повторная подписка не создает дубликат и не падает."""
+        for _ in range(2):
+            self.authorized_client_old_subscriber.get(
+                reverse(
+                    'posts:profile_follow',
+                    kwargs={'username': self.user_author.username}
+                )
+            )
+        self.assertEqual(self.user_old_subscriber.follower.count(), 1)
+
+    def test_insert_reports_new_row(self):
+        """Вставка подписки сама сообщает, была ли строка новой."""
+        follow = Follow(user=self.user_authorized, author=self.user_author)
+        self.assertTrue(Follow.objects.insert(follow))
+        self.assertFalse(Follow.objects.insert(follow))
+        self.assertEqual(self.user_authorized.follower.count(), 1)
+
+    def test_unfollow_missing_author(self):
+        """Отписка от несуществующего автора не вызывает ошибку."""
+        response = self.authorized_client_old_subscriber.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': 'missing'}
+            )
+        )
+        self.assertRedirects(response, reverse('posts:index'))
+
+    def test_bulk_follow_and_unfollow(self):
+        """Подписка и отписка на нескольких авторов одним запросом."""
+        authors = [
+            User.objects.create_user(username=f'bulk_{i}') for i in range(3)
+        ]
+        usernames = [author.username for author in authors]
+        response = self.authorized_client_not_subscriber.post(
+            reverse('posts:follow_bulk'),
+            {'action': 'follow', 'author': usernames + ['missing']},
+        )
+        self.assertEqual(response.json()['authors'], usernames)
+        self.assertEqual(response.json()['missing'], ['missing'])
+        self.assertEqual(self.user_authorized.follower.count(), 3)
+        self.authorized_client_not_subscriber.post(
+            reverse('posts:follow_bulk'),
+            {'action': 'unfollow', 'author': usernames[:2]},
+        )
+        self.assertEqual(
+            list(self.user_authorized.follower.values_list(
+                'author__username', flat=True)),
+            usernames[2:],
+        )
+
+
+class ExportViewTest(TestCase):
+    """Потоковая выгрузка данных для администратора."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.staff = User.objects.create_user(
+            username='staff_user',
+            is_staff=True,
+        )
+        Post.objects.create(author=cls.user, text='тестовый текст')
+
+    def test_export_available_only_for_staff(self):
+        """Выгрузка доступна только сотрудникам."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('posts:export', kwargs={'model_name': 'post'})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_export_streams_ndjson(self):
+        """Выгрузка отдается потоком NDJSON."""
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(
+            reverse('posts:export', kwargs={'model_name': 'post'})
+        )
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('тестовый текст', lines[0])
+
+    def test_export_unknown_model(self):
+        """Неизвестная модель возвращает 404."""
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(
+            reverse('posts:export', kwargs={'model_name': 'user'})
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(WRITE_BEHIND_ENABLED=True)
+class WriteBehindTest(TransactionTestCase):
+    """Отложенная запись комментариев и подписок."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.user = User.objects.create_user(username='test_user')
+        self.post = Post.objects.create(author=self.author, text='текст')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_comment_visible_after_redirect(self):
+        """Комментарий виден автору сразу после перенаправления."""
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'отложенный комментарий'},
+            follow=True,
+        )
+        self.assertEqual(
+            response.context['comments'][0].text,
+            'отложенный комментарий',
+        )
+
+    def test_follow_is_written(self):
+        """Подписка сохраняется через очередь отложенной записи."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        self.assertTrue(
+            Follow.objects.filter(user=self.user, author=self.author).exists()
+        )
+
+    def test_repeated_follow_not_created(self):
+        """Очередь сообщает, что повторная подписка не новая."""
+        follow = Follow(user=self.user, author=self.author)
+        self.assertTrue(save_object(follow))
+        self.assertFalse(save_object(follow))
+
+    def test_bad_entry_fails_alone(self):
+        """Ошибка одной строки не роняет остальные записи порции."""
+        batch = [
+            {'obj': obj, 'done': threading.Event(), 'error': None}
+            for obj in (
+                Comment(post=self.post, author=self.user, text='хороший'),
+                Comment(post_id=self.post.id + 100, author=self.user,
+                        text='к удаленной записи'),
+                Follow(user=self.user, author=self.author),
+            )
+        ]
+        WriteBehindQueue().commit(batch)
+        self.assertEqual(
+            [entry['error'] is None for entry in batch], [True, False, True],
+        )
+        self.assertTrue(all(entry['done'].is_set() for entry in batch))
+        self.assertEqual(Comment.objects.get().text, 'хороший')
+        self.assertTrue(Follow.objects.exists())
+
+
+class TrendingTest(TestCase):
+    """Популярные записи и группы."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.group = Group.objects.create(
+            title='тестовая группа',
+            slug='test_slug',
+            description='тестовое описание',
+        )
+        cls.quiet_post = Post.objects.create(author=cls.user, text='тихо')
+        cls.hot_post = Post.objects.create(
+            author=cls.user, text='обсуждают', group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_log2_add(self):
+        """Сложение в логарифмической шкале."""
+        self.assertAlmostEqual(log2_add(None, 3), 3)
+        self.assertAlmostEqual(log2_add(3, 3), 4)
+        self.assertAlmostEqual(log2_add(1000, 1), 1000)
+
+    def test_bump_single_update(self):
+        """Событие учитывается одним UPDATE, как в log2_add."""
+        now = timezone.now()
+        for _ in range(3):
+            with self.assertNumQueries(1):
+                bump(Post, self.quiet_post.pk, 2)
+        self.quiet_post.refresh_from_db()
+        expected = event_score(2, now) + math.log2(3)
+        self.assertAlmostEqual(
+            self.quiet_post.trending_score, expected, places=3,
+        )
+
+    def test_later_events_weigh_more(self):
+        """Событие через период полураспада весит вдвое больше."""
+        now = timezone.now()
+        later = now + timedelta(seconds=TRENDING_HALF_LIFE)
+        self.assertAlmostEqual(
+            event_score(1, later) - event_score(1, now), 1,
+        )
+
+    def test_commented_post_is_trending(self):
+        """Комментарии поднимают пост и его группу в популярном."""
+        for post in (self.quiet_post, self.hot_post, self.hot_post):
+            self.authorized_client.post(
+                reverse('posts:add_comment', kwargs={'post_id': post.id}),
+                data={'text': 'комментарий'},
+            )
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            response.context['posts'], [self.hot_post, self.quiet_post],
+        )
+        self.assertEqual(response.context['groups'], [self.group])
+
+    def test_repeated_follow_not_bumped(self):
+        """Повторная подписка не поднимает автора в популярном."""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='пост')
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': 'author'},
+        )
+        self.authorized_client.get(follow_url)
+        post.refresh_from_db()
+        score = post.trending_score
+        self.assertIsNotNone(score)
+        self.authorized_client.get(follow_url)
+        self.authorized_client.post(
+            reverse('posts:follow_bulk'), {'author': ['author']},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.trending_score, score)
+
+
+class FeedEventsTest(TestCase):
+    """События о новых записях лент."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.other_client = Client()
+        self.other_client.force_login(self.other)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.since = broker.last
+
+    def create_post(self, client, text):
+        client.post(reverse('posts:post_create'), data={'text': text})
+        return Post.objects.get(text=text)
+
+    def test_long_poll_returns_new_posts(self):
+        """Long-poll возвращает записи, созданные после since."""
+        post = self.create_post(self.author_client, 'новая запись')
+        data = self.client.get(
+            reverse('posts:feed_events'),
+            {'poll': 1, 'since': self.since, 'fragments': 1},
+        ).json()
+        self.assertEqual(data['ids'], [post.id])
+        self.assertIn('новая запись', data['html'][0])
+
+    def test_follow_feed_filters_authors(self):
+        """Лента подписок получает события только своих авторов."""
+        self.create_post(self.other_client, 'чужая запись')
+        post = self.create_post(self.author_client, 'запись автора')
+        data = self.reader_client.get(
+            reverse('posts:feed_events'),
+            {'poll': 1, 'since': self.since, 'feed': 'follow'},
+        ).json()
+        self.assertEqual(data['ids'], [post.id])
+
+    def test_event_stream(self):
+        """Server-Sent Events отдают событие с номером и данными."""
+        post = self.create_post(self.author_client, 'запись для потока')
+        response = self.client.get(
+            reverse('posts:feed_events'),
+            {'since': self.since, 'timeout': 0.1},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('event: new_posts', content)
+        self.assertIn(f'"ids": [{post.id}]', content)
+
+    def test_streams_capped(self):
+        """Сверх FEED_EVENTS_MAX_STREAMS клиент сразу получает retry."""
+        taken = 0
+        while stream_slots.acquire(blocking=False):
+            taken += 1
+        try:
+            response = self.client.get(
+                reverse('posts:feed_events'), {'timeout': 0.1},
+            )
+            content = b''.join(response.streaming_content).decode()
+        finally:
+            for _ in range(taken):
+                stream_slots.release()
+        self.assertEqual(
+            content, f'retry: {FEED_EVENTS_BUSY_RETRY * 1000}\n\n',
+        )
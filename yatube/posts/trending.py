@@ -0,0 +1,108 @@
+import heapq
+import math
+from itertools import chain
+
+from django.core.cache import cache
+from django.db import router
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Coalesce, Greatest, Least, Log, Power
+from django.utils import timezone
+
+from .constants import (TRENDING_CACHE_TIME, TRENDING_EPOCH,
+                        TRENDING_GROUPS_COUNT, TRENDING_HALF_LIFE,
+                        TRENDING_POSTS_COUNT)
+from .models import Group, Post
+from .sharding import per_shard, shard_for_author
+
+# Популярность - сумма весов событий, затухающих вдвое за
+# TRENDING_HALF_LIFE. Вместо затухания всех сумм со временем вес события
+# увеличивается на 2 ** ((t - TRENDING_EPOCH) / TRENDING_HALF_LIFE), а
+# хранится log2 суммы. Порядок строк по такому значению не меняется со
+# временем, поэтому событие обновляет одну строку, а лента популярного
+# читается по индексу trending_score.
+
+
+def event_score(weight, when=None):
+    """log2 вклада события с весом weight, произошедшего в момент when."""
+    when = when or timezone.now()
+    return (
+        math.log2(weight)
+        + (when - TRENDING_EPOCH).total_seconds() / TRENDING_HALF_LIFE
+    )
+
+
+def log2_add(score, other):
+    """log2(2 ** score + 2 ** other) без переполнения."""
+    if score is None:
+        return other
+    high, low = max(score, other), min(score, other)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def bump(model, pk, weight, using=None):
+    """Учитывает событие с весом weight для строки model с ключом pk.
+
+    То же, что log2_add, но одним UPDATE: чтение и запись в отдельных
+    запросах приводили бы к взаимоблокировке писателей SQLite. using -
+    база строки, для постов - шард автора.
+    """
+    if pk is None:
+        return
+    score = Value(event_score(weight), output_field=FloatField())
+    two = Value(2.0, output_field=FloatField())
+    high = Greatest(F('trending_score'), score)
+    low = Least(F('trending_score'), score)
+    model.objects.using(using).filter(pk=pk).update(trending_score=Coalesce(
+        high + Log(two, Value(1.0) + Power(two, low - high)),
+        score,
+    ))
+
+
+def bump_post(post, weight):
+    """Учитывает событие для поста и его группы."""
+    bump(Post, post.pk, weight, router.db_for_write(Post, instance=post))
+    bump(Group, post.group_id, weight)
+
+
+def bump_author(author_id, weight):
+    """Учитывает событие автора для его последнего поста."""
+    post = Post.objects.using(shard_for_author(author_id)).filter(
+        author_id=author_id,
+    ).only('pk', 'author_id', 'group_id').first()
+    if post:
+        bump_post(post, weight)
+
+
+def trending_posts(count=TRENDING_POSTS_COUNT):
+    """Самые популярные посты, порядок кешируется на TRENDING_CACHE_TIME.
+
+    При шардировании лучшие count постов каждого шарда сливаются по
+    trending_score.
+    """
+    ids = cache.get('trending_posts')
+    if ids is None:
+        scores = heapq.nlargest(count, chain.from_iterable(
+            queryset.filter(trending_score__isnull=False).order_by(
+                '-trending_score',
+            ).values_list('trending_score', 'pk')[:count]
+            for queryset in per_shard(Post.objects.all())
+        ))
+        ids = [pk for _, pk in scores]
+        cache.set('trending_posts', ids, TRENDING_CACHE_TIME)
+    posts = {}
+    for queryset in per_shard(Post.objects.select_related('author', 'group')):
+        posts.update(queryset.in_bulk(ids))
+
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+def hot_groups(count=TRENDING_GROUPS_COUNT):
+    """Самые популярные группы, кешируются на TRENDING_CACHE_TIME."""
+    groups = cache.get('hot_groups')
+    if groups is None:
+        groups = list(Group.objects.filter(
+            trending_score__isnull=False,
+        ).order_by('-trending_score')[:count])
+        cache.set('hot_groups', groups, TRENDING_CACHE_TIME)
+
+    return groups
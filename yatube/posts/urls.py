@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
@@ -27,4 +27,14 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('', views.index, name='index'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('trending/', views.trending, name='trending'),
+    path('feed/events/', views.feed_events, name='feed_events'),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
+    path('export/<str:model_name>/', views.export, name='export'),
+    path('api/posts/', api.index, name='api_index'),
+    path('api/posts/batch/', api.posts_batch, name='api_posts_batch'),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_posts'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
 ]
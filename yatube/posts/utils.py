@@ -1,6 +1,19 @@
+import logging
+import uuid
+
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.db import router, transaction
+from django.middleware.cache import CacheMiddleware
+from django.template.defaultfilters import linebreaksbr
+from django.utils.decorators import decorator_from_middleware_with_args
+from django.utils.text import Truncator
+
+from .constants import BULK_CHUNK_SIZE, POST_EXCERPT_CHARS, POSTS_PER_PAGE
+
+logger = logging.getLogger(__name__)
 
-from .constants import POSTS_PER_PAGE
+FEED_VERSION_KEY = 'feed_cache_version'
 
 
 def divider_per_page(request, post_list):
@@ -9,3 +22,130 @@ def divider_per_page(request, post_list):
     page_namber = request.GET.get('page')
 
     return paginator.get_page(page_namber)
+
+
+def chunked_pks(queryset, chunk_size=BULK_CHUNK_SIZE):
+    """Выдает первичные ключи queryset порциями по chunk_size.
+
+    Порции выбираются по диапазону ключей (keyset), поэтому генератор
+    корректно работает и тогда, когда строки удаляются между порциями.
+    """
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        chunk_qs = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+        chunk = list(chunk_qs[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1]
+
+
+def write_db(queryset):
+    """База, явно выбранная для queryset, иначе база записи по роутеру."""
+    return queryset._db or router.db_for_write(queryset.model)
+
+
+def bulk_update_chunked(queryset, chunk_size=BULK_CHUNK_SIZE, progress=None,
+                        **values):
+    """Массовый UPDATE порциями, каждая в своей транзакции.
+
+    После каждой порции вызывается progress(число строк порции), если
+    он передан. Возвращает количество обновленных строк и число порций.
+    """
+    model = queryset.model
+    db = write_db(queryset)
+    objects = model.objects.using(db)
+    rows = chunks = 0
+    for chunk in chunked_pks(queryset.using(db), chunk_size):
+        with transaction.atomic(using=db):
+            updated = objects.filter(pk__in=chunk).update(**values)
+        rows += updated
+        chunks += 1
+        logger.info('%s: обновлено %s строк', model.__name__, rows)
+        if progress is not None:
+            progress(updated)
+
+    return rows, chunks
+
+
+def bulk_delete_chunked(queryset, chunk_size=BULK_CHUNK_SIZE, progress=None):
+    """Массовый DELETE порциями, каждая в своей транзакции.
+
+    После каждой порции вызывается progress(число строк порции), если
+    он передан. Возвращает количество удаленных строк модели и число
+    порций.
+    """
+    model = queryset.model
+    db = write_db(queryset)
+    objects = model.objects.using(db)
+    rows = chunks = 0
+    for chunk in chunked_pks(queryset.using(db), chunk_size):
+        with transaction.atomic(using=db):
+            _, deleted = objects.filter(pk__in=chunk).delete()
+        deleted = deleted.get(model._meta.label, 0)
+        rows += deleted
+        chunks += 1
+        logger.info('%s: удалено %s строк', model.__name__, rows)
+        if progress is not None:
+            progress(deleted)
+
+    return rows, chunks
+
+
+def render_post_text(text):
+    """HTML тела записи и отрывок для заголовка.
+
+    Совпадают с выводом фильтров linebreaksbr и truncatechars, которые
+    шаблоны раньше применяли к тексту на каждом рендере.
+    """
+    return (
+        linebreaksbr(text, autoescape=True),
+        Truncator(text).chars(POST_EXCERPT_CHARS),
+    )
+
+
+def cache_version(key):
+    """Версия группы ключей кеша, хранящаяся под key.
+
+    Если ключ версии вытеснен или кеш очищен, выдается новая версия:
+    старые ключи группы больше не читаются.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """Сбрасывает все ключи группы сменой ее версии."""
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+class FeedCacheMiddleware(CacheMiddleware):
+    """cache_page, в префикс ключей которого входит версия лент."""
+
+    @property
+    def key_prefix(self):
+        return f'{self._key_prefix}.{cache_version(FEED_VERSION_KEY)}'
+
+    @key_prefix.setter
+    def key_prefix(self, value):
+        self._key_prefix = value
+
+
+def feed_cache_page(timeout, key_prefix):
+    """cache_page для лент, сбрасываемый invalidate_feed_cache()."""
+    return decorator_from_middleware_with_args(FeedCacheMiddleware)(
+        cache_timeout=timeout, key_prefix=key_prefix,
+    )
+
+
+def invalidate_feed_cache():
+    """Сброс закешированных лент после массовых изменений.
+
+    Меняется только версия лент: популярное, число архивных записей и
+    метаданные миниатюр в том же кеше остаются.
+    """
+    bump_cache_version(FEED_VERSION_KEY)
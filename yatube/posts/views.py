@@ -1,21 +1,52 @@
+import json
+import time
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
-
-from .constants import CACHE_TIME_INDEX_PAGE
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_POST
+
+from .archive import (HotColdList, get_post_or_archived,
+                      invalidate_cold_counts)
+from .constants import (BULK_FOLLOW_LIMIT, CACHE_TIME_INDEX_PAGE,
+                        FEED_EVENTS_BUSY_RETRY, FEED_EVENTS_KEEPALIVE,
+                        FEED_EVENTS_TIMEOUT,
+                        RECOMMENDATIONS_SHOWN, TRENDING_COMMENT_WEIGHT,
+                        TRENDING_FOLLOW_WEIGHT, TRENDING_POST_WEIGHT)
+from .export import EXPORT_FIELDS, iter_csv, iter_ndjson
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
-from .utils import divider_per_page
+from .models import ArchivedPost, Follow, Group, Post
+from .pubsub import broker, publish_post, stream_slots
+from .recommendations import mark_follows_changed
+from .sharding import get_post_or_404, is_sharded, sharded_posts
+from .trending import bump_author, bump_post, hot_groups, trending_posts
+from .utils import divider_per_page, feed_cache_page
+from .write_behind import save_object
 
 User = get_user_model()
 
 
-@cache_page(CACHE_TIME_INDEX_PAGE, key_prefix="index_page")
+def recommended_authors(user):
+    """Рекомендованные пользователю авторы для показа на странице."""
+    return user.recommendations.select_related(
+        'author'
+    )[:RECOMMENDATIONS_SHOWN]
+
+
+@feed_cache_page(CACHE_TIME_INDEX_PAGE, key_prefix='index_page')
 def index(request):
     """Отображение главной страницы."""
     template = 'posts/index.html'
-    post_list = Post.objects.select_related('group', 'author')
+    post_list = HotColdList(
+        sharded_posts(Post.objects.select_related('group', 'author')),
+        ArchivedPost.objects.select_related('group', 'author'),
+        count_key='index',
+    )
     page_obj = divider_per_page(request, post_list)
     context = {
         'page_obj': page_obj,
@@ -24,11 +55,28 @@ def index(request):
     return render(request, template, context)
 
 
+def trending(request):
+    """Отображение популярных записей и групп."""
+    template = 'posts/trending.html'
+    context = {
+        'posts': trending_posts(),
+        'groups': hot_groups(),
+    }
+
+    return render(request, template, context)
+
+
 def group_posts(request, slug):
     """Отображение страниц с группами."""
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.select_related('author')
+    post_list = HotColdList(
+        sharded_posts(
+            Post.objects.filter(group=group).select_related('author')
+        ),
+        group.archived_posts.select_related('author'),
+        count_key=f'group:{group.pk}',
+    )
     page_obj = divider_per_page(request, post_list)
     context = {
         'group': group,
@@ -42,16 +90,31 @@ def profile(request, username):
     """Отображение страницы пользователя."""
     template = 'posts/profile.html'
     author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('group')
+    post_list = HotColdList(
+        author.posts.select_related('group'),
+        author.archived_posts.select_related('group'),
+        count_key=f'profile:{author.pk}',
+    )
     page_obj = divider_per_page(request, post_list)
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author,
     ).exists()
+    follow_counts = Follow.objects.filter(
+        Q(user=author) | Q(author=author)
+    ).aggregate(
+        follows=Count('pk', filter=Q(user=author)),
+        followers=Count('pk', filter=Q(author=author)),
+    )
+    recommendations = None
+    if request.user == author:
+        recommendations = recommended_authors(request.user)
     context = {
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        'follow_counts': follow_counts,
+        'recommendations': recommendations,
     }
 
     return render(request, template, context)
@@ -60,16 +123,17 @@ def profile(request, username):
 def post_detail(request, post_id):
     """Отображение страницы записи(поста)."""
     template = 'posts/post_detail.html'
-    post = get_object_or_404(
+    post = get_post_or_archived(
         Post.objects.select_related('author', 'group'),
-        id=post_id,
+        post_id,
     )
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     form = CommentForm()
     context = {
         'post': post,
         'comments': comments,
         'form': form,
+        'is_archived': isinstance(post, ArchivedPost),
     }
 
     return render(request, template, context)
@@ -88,6 +152,8 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        bump_post(post, TRENDING_POST_WEIGHT)
+        publish_post(post)
         result = redirect('posts:profile', request.user.username)
 
     return result
@@ -97,9 +163,9 @@ def post_create(request):
 def post_edit(request, post_id):
     """Отображение страницы редактирования собственной записи."""
     template = 'posts/create_post.html'
-    post = get_object_or_404(
+    post = get_post_or_404(
         Post.objects.select_related('author', 'group'),
-        id=post_id,
+        post_id,
     )
     form = PostForm(
         request.POST or None,
@@ -124,16 +190,14 @@ def post_edit(request, post_id):
 @login_required
 def add_comment(request, post_id):
     """Добавление комментария."""
-    post = get_object_or_404(
-        Post,
-        id=post_id,
-    )
+    post = get_post_or_404(Post.objects.all(), post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid:
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        save_object(comment)
+        bump_post(post, TRENDING_COMMENT_WEIGHT)
 
     return redirect('posts:post_detail', post_id=post_id)
 
@@ -142,11 +206,29 @@ def add_comment(request, post_id):
 def follow_index(request):
     """Страница с постами автров, на которых подписан пользователь."""
     template = 'posts/follow.html'
-    posts_list = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
+    if is_sharded():
+        # Подписки лежат в default, посты - в шардах авторов.
+        posts_list = sharded_posts(Post.objects.filter(
+            author_id__in=list(request.user.follower.values_list(
+                'author_id', flat=True,
+            )),
+        ).select_related('author', 'group'))
+    else:
+        posts_list = Post.objects.filter(
+            author__following__user=request.user
+        ).select_related('author', 'group')
+    posts_list = HotColdList(
+        posts_list,
+        ArchivedPost.objects.filter(
+            author__following__user=request.user
+        ).select_related('author', 'group'),
+        count_key=f'follow:{request.user.pk}',
+    )
     page_obj = divider_per_page(request, posts_list)
-    context = {'page_obj': page_obj}
+    context = {
+        'page_obj': page_obj,
+        'recommendations': recommended_authors(request.user),
+    }
 
     return render(request, template, context)
 
@@ -155,17 +237,17 @@ def follow_index(request):
 def profile_follow(request, username):
     """Подписаться на автора."""
     author = get_object_or_404(
-        User,
+        User.objects.only('id'),
         username=username,
     )
-    if request.user != author and not Follow.objects.filter(
+    if request.user != author and save_object(Follow(
         user=request.user,
         author=author,
-    ).exists():
-        Follow.objects.create(
-            user=request.user,
-            author=author,
-        )
+    )):
+        # Популярность растет только от новых подписок.
+        mark_follows_changed(request.user.pk)
+        invalidate_cold_counts(f'follow:{request.user.pk}')
+        bump_author(author.pk, TRENDING_FOLLOW_WEIGHT)
 
     return redirect('posts:profile', username)
 
@@ -175,7 +257,153 @@ def profile_unfollow(request, username):
     """Отписаться от автора."""
     Follow.objects.filter(
         user=request.user,
-        author=User.objects.get(username=username)
+        author__username=username,
     ).delete()
+    mark_follows_changed(request.user.pk)
+    invalidate_cold_counts(f'follow:{request.user.pk}')
 
     return redirect('posts:index')
+
+
+@require_POST
+@login_required
+def follow_bulk(request):
+    """Подписаться на авторов или отписаться от них одним запросом."""
+    action = request.POST.get('action', 'follow')
+    usernames = set(request.POST.getlist('author'))
+    if action not in ('follow', 'unfollow'):
+        return JsonResponse({'error': 'Неизвестное действие.'}, status=400)
+    if len(usernames) > BULK_FOLLOW_LIMIT:
+        return JsonResponse(
+            {'error': f'Не больше {BULK_FOLLOW_LIMIT} авторов за раз.'},
+            status=400,
+        )
+    authors = dict(User.objects.filter(
+        username__in=usernames,
+    ).exclude(pk=request.user.pk).values_list('username', 'id'))
+    with transaction.atomic():
+        if action == 'follow':
+            # Популярность растет только от новых подписок.
+            for author_id in authors.values():
+                if Follow.objects.insert(
+                    Follow(user=request.user, author_id=author_id),
+                ):
+                    bump_author(author_id, TRENDING_FOLLOW_WEIGHT)
+        else:
+            Follow.objects.filter(
+                user=request.user,
+                author_id__in=authors.values(),
+            ).delete()
+        mark_follows_changed(request.user.pk)
+    invalidate_cold_counts(f'follow:{request.user.pk}')
+
+    return JsonResponse({
+        'action': action,
+        'authors': sorted(authors),
+        'missing': sorted(usernames - set(authors)),
+    })
+
+
+@staff_member_required
+def export(request, model_name):
+    """Потоковая выгрузка модели в NDJSON или CSV для администратора."""
+    if model_name not in EXPORT_FIELDS:
+        raise Http404
+    if request.GET.get('format') == 'csv':
+        content, content_type = iter_csv(model_name), 'text/csv'
+        extension = 'csv'
+    else:
+        content = iter_ndjson((model_name,))
+        content_type, extension = 'application/x-ndjson', 'ndjson'
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="{model_name}.{extension}"'
+    )
+
+    return response
+
+
+def feed_update(request, events):
+    """Данные события ленты: число и id новых записей, карточки записей."""
+    ids = [event['id'] for event in events]
+    update = {'count': len(ids), 'ids': ids}
+    if request.GET.get('fragments'):
+        posts = Post.objects.select_related('author', 'group').filter(
+            id__in=ids,
+        )
+        update['html'] = [
+            render_to_string(
+                'posts/includes/post.html', {'post': post}, request,
+            )
+            for post in posts
+        ]
+
+    return update
+
+
+def feed_stream(request, seq, timeout, match):
+    """Тело SSE: события ленты после seq до истечения timeout."""
+    # Место занимается при чтении тела: не начатый поток его не держит.
+    if not stream_slots.acquire(blocking=False):
+        yield f'retry: {FEED_EVENTS_BUSY_RETRY * 1000}\n\n'
+        return
+    try:
+        deadline = time.monotonic() + timeout
+        yield 'retry: 1000\n\n'
+        while time.monotonic() < deadline:
+            seq, events = broker.wait(
+                seq,
+                min(FEED_EVENTS_KEEPALIVE, deadline - time.monotonic()),
+                match,
+            )
+            if events:
+                data = json.dumps(feed_update(request, events))
+                yield f'id: {seq}\nevent: new_posts\ndata: {data}\n\n'
+            else:
+                yield ': ping\n\n'
+    finally:
+        stream_slots.release()
+
+
+def feed_events(request):
+    """Новые записи лент через Server-Sent Events или long-poll.
+
+    ?feed=follow ограничивает события авторами из подписок, ?poll=1
+    возвращает JSON после первого подходящего события или по таймауту.
+    Одновременных потоков не больше FEED_EVENTS_MAX_STREAMS: сверх этого
+    клиент сразу получает retry и переподключается позже.
+    """
+    match = None
+    if request.GET.get('feed') == 'follow':
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Требуется вход.'}, status=401)
+        authors = set(
+            request.user.follower.values_list('author_id', flat=True)
+        )
+
+        def match(event):
+            return event['author_id'] in authors
+    try:
+        since = int(
+            request.GET.get('since')
+            or request.META.get('HTTP_LAST_EVENT_ID')
+            or broker.last
+        )
+        timeout = min(
+            float(request.GET.get('timeout', FEED_EVENTS_TIMEOUT)),
+            FEED_EVENTS_TIMEOUT,
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный запрос.'}, status=400)
+
+    if request.GET.get('poll'):
+        last, events = broker.wait(since, timeout, match)
+        return JsonResponse({'last': last, **feed_update(request, events)})
+
+    response = StreamingHttpResponse(
+        feed_stream(request, since, timeout, match),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+
+    return response
@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .constants import (WRITE_BEHIND_INTERVAL, WRITE_BEHIND_MAX_BATCH,
+                        WRITE_BEHIND_TIMEOUT)
+from .models import Follow
+
+
+class WriteBehindQueue:
+    """Очередь отложенной записи мелких вставок.
+
+    Фоновый поток собирает поступившие объекты в течение interval секунд
+    и сохраняет их одной транзакцией (group commit). Отправитель ждет
+    фиксации своей порции, поэтому сразу после submit видит свою запись;
+    для подписки submit возвращает, была ли она новой.
+    """
+
+    def __init__(self, interval=WRITE_BEHIND_INTERVAL,
+                 max_batch=WRITE_BEHIND_MAX_BATCH):
+        self.interval = interval
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, obj, timeout=WRITE_BEHIND_TIMEOUT):
+        """Ставит объект в очередь и ждет фиксации его порции."""
+        self.start()
+        entry = {
+            'obj': obj, 'done': threading.Event(), 'error': None,
+            'created': None,
+        }
+        self.queue.put(entry)
+        if not entry['done'].wait(timeout):
+            raise TimeoutError('Порция не зафиксирована вовремя.')
+        if entry['error']:
+            raise entry['error']
+        return entry['created']
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run,
+                    name='write-behind',
+                    daemon=True,
+                )
+                self.thread.start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.commit(batch)
+
+    def commit(self, batch):
+        """Сохраняет порцию одной транзакцией, по bulk_create на модель.
+
+        Если порция не сохранилась, объекты сохраняются по одному: ошибку
+        получает только отправитель плохой строки, например комментария
+        к уже удаленной записи.
+        """
+        try:
+            self.save(batch)
+        except Exception:
+            for entry in batch:
+                for connection in connections.all():
+                    connection.close_if_unusable_or_obsolete()
+                try:
+                    self.save([entry])
+                except Exception as error:
+                    entry['error'] = error
+        finally:
+            for entry in batch:
+                entry['done'].set()
+
+    def save(self, entries):
+        """bulk_create по модели и базе: комментарий идет в шард поста.
+
+        Подписки вставляются по одной в той же транзакции, чтобы знать,
+        какие из них новые.
+        """
+        groups = {}
+        for entry in entries:
+            obj = entry['obj']
+            db = router.db_for_write(type(obj), instance=obj)
+            groups.setdefault((type(obj), db), []).append(entry)
+        with ExitStack() as stack:
+            for db in {db for _, db in groups}:
+                stack.enter_context(transaction.atomic(using=db))
+            for (model, db), group in groups.items():
+                if model is Follow:
+                    for entry in group:
+                        entry['created'] = Follow.objects.db_manager(
+                            db,
+                        ).insert(entry['obj'])
+                else:
+                    model.objects.using(db).bulk_create(
+                        entry['obj'] for entry in group
+                    )
+
+
+write_behind = WriteBehindQueue()
+
+
+def save_object(obj):
+    """Сохраняет комментарий или подписку с учетом WRITE_BEHIND_ENABLED.
+
+    Подписка сохраняется одним INSERT, повтор которого игнорируется
+    ограничением unique_follow; для нее возвращается True, если строка
+    добавлена.
+    """
+    if settings.WRITE_BEHIND_ENABLED:
+        return write_behind.submit(obj)
+    if isinstance(obj, Follow):
+        return Follow.objects.insert(obj)
+    obj.save()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -33,6 +34,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TracingMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -40,6 +45,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.TemplateTimingMiddleware',
+    'core.middleware.TracingViewMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -49,8 +58,17 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Загрузчики с замером времени рендеринга шаблонов; без DEBUG
+            # шаблоны кешируются, как у стандартного cached.Loader.
+            'loaders': [(
+                'core.template_timing.Loader' if DEBUG
+                else 'core.template_timing.CachedLoader',
+                [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ],
+            )],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -65,13 +83,61 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
+CONN_MAX_AGE = int(os.getenv('CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
     }
 }
 
+# Реплики только для чтения: пути к файлам SQLite через запятую.
+REPLICA_DATABASES = []
+for number, name in enumerate(
+    filter(None, os.getenv('DATABASE_REPLICAS', '').split(','))
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(alias)
+
+# Шарды постов и комментариев: пути к файлам SQLite через запятую,
+# default - всегда первый шард.
+POST_SHARDS = ['default']
+for number, name in enumerate(
+    filter(None, os.getenv('DATABASE_SHARDS', '').split(',')), start=1
+):
+    alias = f'shard_{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+    }
+    POST_SHARDS.append(alias)
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+
+REPLICA_PIN_SECONDS = 5
+
+# Профиль соединений SQLite для продакшена, отключается SQLITE_TUNING=0.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+} if os.getenv('SQLITE_TUNING', '1') == '1' else {}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -118,9 +184,105 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.InstrumentedLocMemCache',
     }
 }
 
+THUMBNAIL_KVSTORE = 'core.thumbnails.CacheKVStore'
+THUMBNAIL_BACKEND = 'core.thumbnails.TimedThumbnailBackend'
+
+# Метрики /metrics: каждый воркер сбрасывает свои значения в METRICS_DIR.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics'),
+)
+METRICS_FLUSH_INTERVAL = 1
+
+# Профили запросов по заголовку X-Profile, не больше PROFILE_MAX_FILES.
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'yatube-profiles'),
+)
+PROFILE_MAX_FILES = 50
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_TOKEN_MAX_AGE = 24 * 60 * 60
+
+# Время рендеринга шаблонов: в /metrics и заголовок X-Template-Timing.
+TEMPLATE_TIMING_ENABLED = True
+TEMPLATE_TIMING_HEADER = os.getenv('TEMPLATE_TIMING_HEADER') == '1'
+
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+
+WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED') == '1'
+
+# Бюджет запросов к БД на запрос, core.middleware.QueryBudgetMiddleware.
+QUERY_BUDGET_ENABLED = DEBUG or os.getenv('QUERY_BUDGET_ENABLED') == '1'
+QUERY_BUDGET_DEFAULT = 20
+QUERY_BUDGETS = {
+    'posts:index': 8,
+    'posts:group_posts': 8,
+    'posts:profile': 12,
+    'posts:post_detail': 8,
+    'posts:follow_index': 8,
+    'posts:trending': 6,
+}
+# С какого повтора одной формы запроса он считается N+1.
+QUERY_REPEAT_THRESHOLD = 5
+
+# Журнал медленных запросов с планами: файл с ротацией и админка.
+SLOW_QUERY_ENABLED = os.getenv('SLOW_QUERY_ENABLED', '1') == '1'
+SLOW_QUERY_THRESHOLD = float(os.getenv('SLOW_QUERY_THRESHOLD', 100))
+SLOW_QUERY_MAX_RECORDS = 5000
+SLOW_QUERY_LOG = os.getenv(
+    'SLOW_QUERY_LOG',
+    os.path.join(tempfile.gettempdir(), 'yatube-slow-queries.log'),
+)
+
+# Трейсы запросов в формате OTLP/JSON, доля запросов в выборке.
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '1') == '1'
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 0.01))
+TRACING_MAX_SPANS = 1000
+TRACING_SERVICE_NAME = 'yatube'
+TRACING_FILE = os.getenv(
+    'TRACING_FILE', os.path.join(tempfile.gettempdir(), 'yatube-traces.jsonl'),
+)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'encoding': 'utf-8',
+        },
+        'traces': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': TRACING_FILE,
+            'maxBytes': 50 * 1024 * 1024,
+            'backupCount': 3,
+            'delay': True,
+            'encoding': 'utf-8',
+        },
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.tracing': {
+            'handlers': ['traces'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Удаление пользователей и групп фоновым потоком; без него задачи
+# выполняет команда process_deletions.
+DELETION_IN_BACKGROUND = os.getenv('DELETION_IN_BACKGROUND') == '1'